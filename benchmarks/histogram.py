@@ -0,0 +1,83 @@
+"""Scaling of the histogram binning engine with the number of samples
+and the number of bins. Run it as
+
+	python benchmarks/histogram.py --max-samples 1e9
+
+Sizes up to --in-memory-samples are binned with `traces.Histogram` from
+a single array, larger sizes are filled in chunks into a
+`StreamingHistogram`, reusing the same chunk, so memory stays bounded.
+Then it compares uniform bins, non uniform bins and integer samples,
+and the scaling with the number of processes given by `workers`.
+"""
+
+from grafica.traces import Histogram
+from grafica.binning import StreamingHistogram
+import numpy as np
+import argparse
+import os
+import time
+
+def time_it(func, repeat=3):
+	best = float('inf')
+	for _ in range(repeat):
+		start = time.perf_counter()
+		func()
+		best = min(best, time.perf_counter()-start)
+	return best
+
+def time_histogram(n_samples, n_bins, in_memory_samples, chunk):
+	bin_edges = np.linspace(-4, 4, n_bins+1)
+	if n_samples <= in_memory_samples:
+		samples = chunk[:n_samples] if n_samples <= len(chunk) else np.random.randn(n_samples)
+		return time_it(lambda: Histogram(samples, color=(0,0,0), bins=bin_edges), repeat=3)
+	def fill():
+		histogram = StreamingHistogram(bins=bin_edges)
+		for _ in range(n_samples//len(chunk)):
+			histogram.fill(chunk)
+	return time_it(fill, repeat=1)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--max-samples', type=float, default=1e8)
+	parser.add_argument('--max-bins', type=float, default=1e6)
+	parser.add_argument('--in-memory-samples', type=float, default=1e8)
+	parser.add_argument('--workers', type=int, nargs='*', default=[1,2,4,8,16,32])
+	args = parser.parse_args()
+	
+	chunk = np.random.randn(10**7)
+	sizes = [10**p for p in range(5, 10) if 10**p <= args.max_samples]
+	bins = [10**p for p in range(1, 7) if 10**p <= args.max_bins]
+	
+	print('Time in seconds to histogram N samples into B bins')
+	print(f'{"N":>12}' + ''.join(f'{f"B={b:.0e}":>12}' for b in bins))
+	for n_samples in sizes:
+		row = f'{n_samples:>12.0e}'
+		for n_bins in bins:
+			row += f'{time_histogram(n_samples, n_bins, args.in_memory_samples, chunk):>12.4f}'
+		print(row, flush=True)
+	
+	n_samples = min(sizes[-1], int(args.in_memory_samples))
+	print(f'\nUniform bins vs non uniform bins vs integer samples, N={n_samples:.0e}')
+	bin_edges = np.linspace(-4, 4, 1001)
+	samples = np.random.randn(n_samples)
+	integer_samples = np.random.randint(0, 4096, n_samples).astype(np.int16) # E.g. ADC counts.
+	for name, samples, binning in [
+		('uniform bins', samples, bin_edges),
+		('non uniform bins', samples, np.sort(np.random.uniform(-4, 4, 1001))),
+		('integer samples', integer_samples, np.linspace(0, 4096, 1001)),
+		("bins='auto'", samples, 'auto'),
+		("integer samples, bins='auto'", integer_samples, 'auto'),
+	]:
+		print(f'{name:>30}: {time_it(lambda: Histogram(samples, color=(0,0,0), bins=binning)):.4f} s')
+	
+	n_samples = sizes[-1]
+	print(f'\nThroughput at N={n_samples:.0e}, B={bins[0]:.0e}: {n_samples/time_histogram(n_samples, bins[0], args.in_memory_samples, chunk)/1e6:.1f} M samples/s')
+	
+	n_samples = min(sizes[-1], int(args.in_memory_samples))
+	samples = np.random.randn(n_samples)
+	print(f'\nScaling with the number of processes, N={n_samples:.0e}, B=1e+03 (this machine has {os.cpu_count()} cores)')
+	serial_time = None
+	for workers in args.workers:
+		elapsed = time_it(lambda: Histogram(samples, color=(0,0,0), bins=bin_edges, workers=workers), repeat=1)
+		serial_time = elapsed if serial_time is None else serial_time
+		print(f'{f"workers={workers}":>30}: {elapsed:.4f} s, speedup {serial_time/elapsed:.2f}')
@@ -0,0 +1,45 @@
+"""Time to `import grafica` and to create the first figure of each
+plotter, each one measured in a new Python process. Run it as
+
+	python benchmarks/import_time.py --repeat 5 --max-import-seconds 0.5
+
+It prints the median over <repeat> processes and exits with an error if
+importing takes longer than <max-import-seconds>, so it can be used to
+catch changes that make the import slow again. `import grafica` must not
+import plotly, matplotlib nor scipy, they are imported when they are
+first used (see FigureManager.BUILT_IN_PLOTTERS).
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+CASES = {
+	'import grafica': 'import grafica',
+	'first plotly figure': 'import grafica; grafica.new("plotly")',
+	'first matplotlib figure': 'import grafica; grafica.new("matplotlib_headless")',
+	'first KDE': 'import grafica; grafica.new("plotly").KDE([1,2,3,4])',
+}
+
+def time_in_new_process(code):
+	output = subprocess.run(
+		[sys.executable, '-c', f'import time; start = time.perf_counter(); {code}; print(time.perf_counter() - start)'],
+		check = True,
+		capture_output = True,
+		text = True,
+	)
+	return float(output.stdout.split()[-1])
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--repeat', type=int, default=5)
+	parser.add_argument('--max-import-seconds', type=float, default=None)
+	args = parser.parse_args()
+	
+	medians = {}
+	for name, code in CASES.items():
+		medians[name] = statistics.median(time_in_new_process(code) for _ in range(args.repeat))
+		print(f'{name:>24}: {medians[name]:.3f} s', flush=True)
+	if args.max_import_seconds is not None and medians['import grafica'] > args.max_import_seconds:
+		sys.exit(f'`import grafica` took {medians["import grafica"]:.3f} s, more than {args.max_import_seconds} s.')
@@ -0,0 +1,47 @@
+"""Time to draw and save many small Matplotlib figures. Run it as
+
+	python benchmarks/matplotlib_headless.py --n-figures 100 --threads 4
+
+It times MatplotlibFigure, which goes through pyplot, and
+HeadlessMatplotlibFigure serially and with a pool of threads. Only the
+headless figures can be saved from several threads, with pyplot the
+threads would share its global state. With Python builds that have the
+GIL, the threads only help as much as Matplotlib releases it while
+rasterizing, so the gain depends on the number of cores.
+"""
+
+from grafica.MatplotlibFigure import MatplotlibFigure, HeadlessMatplotlibFigure
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+def time_it(func):
+	start = time.perf_counter()
+	func()
+	return time.perf_counter() - start
+
+def draw_and_save(plotter, idx, directory):
+	x = np.linspace(0, 1, 999)
+	figure = plotter()
+	figure.set(title=f'Figure {idx}', xlabel='x', ylabel='y')
+	figure.scatter(x, np.sin(idx*x), label='sin')
+	figure.histogram(np.random.randn(9999), label='histogram')
+	figure.save(file_name=str(Path(directory)/f'figure_{idx}'))
+	figure.close()
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--n-figures', type=int, default=100)
+	parser.add_argument('--threads', type=int, default=4)
+	args = parser.parse_args()
+	
+	with tempfile.TemporaryDirectory() as directory:
+		for plotter in [MatplotlibFigure, HeadlessMatplotlibFigure]:
+			seconds = time_it(lambda: [draw_and_save(plotter, idx, directory) for idx in range(args.n_figures)])
+			print(f'{plotter.__name__}, serial: {seconds/args.n_figures*1e3:.1f} ms per figure', flush=True)
+		with ThreadPoolExecutor(max_workers=args.threads) as executor:
+			seconds = time_it(lambda: list(executor.map(lambda idx: draw_and_save(HeadlessMatplotlibFigure, idx, directory), range(args.n_figures))))
+		print(f'HeadlessMatplotlibFigure, {args.threads} threads: {seconds/args.n_figures*1e3:.1f} ms per figure')
@@ -0,0 +1,51 @@
+"""Size and time to write the HTML of a PlotlyFigure with the arrays
+encoded as JSON text (the default), as base64 typed arrays and as
+base64 typed arrays downcast to float32. Run it as
+
+	python benchmarks/plotly_html.py --sizes 1e4 1e5 1e6
+
+Each figure has a scatter and an error band with the given number of
+points, and a histogram of that many samples.
+"""
+
+from grafica.PlotlyFigure import PlotlyFigure
+import numpy as np
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+MODES = {
+	'JSON': dict(),
+	'typed arrays': dict(typed_arrays=True),
+	'typed arrays, float32': dict(typed_arrays=True, float32=True),
+}
+
+def build_figure(n_points):
+	x = np.linspace(0, 1, n_points)
+	y = np.cumsum(np.random.randn(n_points))
+	figure = PlotlyFigure()
+	figure.scatter(x, y, label='scatter')
+	figure.errorband(x, y+9, lower=abs(y)/9, higher=abs(y)/9, label='error band')
+	figure.histogram(np.random.randn(n_points), label='histogram')
+	figure.plotly_figure # Add the traces now, so this is not timed when saving.
+	return figure
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--sizes', type=float, nargs='*', default=[1e4,1e5,1e6])
+	args = parser.parse_args()
+	
+	print(f'{"points":>10}{"mode":>24}{"save (s)":>12}{"HTML (MB)":>12}{"ratio":>8}')
+	with tempfile.TemporaryDirectory() as directory:
+		for n_points in [int(_) for _ in args.sizes]:
+			figure = build_figure(n_points)
+			json_size = None
+			for mode, options in MODES.items():
+				file_name = Path(directory)/'figure.html'
+				start = time.perf_counter()
+				figure.save(file_name=str(file_name), **options)
+				elapsed = time.perf_counter() - start
+				size = file_name.stat().st_size
+				json_size = size if json_size is None else json_size
+				print(f'{n_points:>10.0e}{mode:>24}{elapsed:>12.3f}{size/1e6:>12.2f}{json_size/size:>8.1f}', flush=True)
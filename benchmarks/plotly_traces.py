@@ -0,0 +1,58 @@
+"""Time to build a PlotlyFigure as a function of the number of traces.
+Run it as
+
+	python benchmarks/plotly_traces.py --n-traces 10 1000 10000
+
+For each number of traces it times building a figure with that many
+scatter traces and with that many histograms (4 Plotly traces each)
+until the go.Figure is complete, i.e. including the access to
+`plotly_figure`. As a reference it also times adding the same scatter
+traces one by one with `go.Figure.add_trace` and then setting the color
+and width through `figure['data'][-1]`, which is how they were added
+before.
+"""
+
+from grafica.PlotlyFigure import PlotlyFigure
+import plotly.graph_objects as go
+import numpy as np
+import argparse
+import time
+
+def time_it(func):
+	start = time.perf_counter()
+	func()
+	return time.perf_counter() - start
+
+def build_scatters(n_traces, x):
+	figure = PlotlyFigure()
+	for i in range(n_traces):
+		figure.scatter(x, x*i, label=f'{i}')
+	return figure.plotly_figure
+
+def build_histograms(n_traces, samples):
+	figure = PlotlyFigure()
+	for i in range(n_traces):
+		figure.histogram(samples, label=f'{i}')
+	return figure.plotly_figure
+
+def add_trace_one_by_one(n_traces, x):
+	figure = go.Figure()
+	for i in range(n_traces):
+		figure.add_trace(go.Scatter(x=x, y=x*i, name=f'{i}', mode='lines'))
+		figure['data'][-1]['marker']['color'] = '#ff0000'
+		figure['data'][-1]['line']['width'] = None
+	return figure
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--n-traces', type=int, nargs='*', default=[10,1000,10000])
+	args = parser.parse_args()
+	
+	x = np.linspace(0, 1, 99)
+	samples = np.random.randn(999)
+	print(f'{"traces":>8}{"scatter (s)":>14}{"histogram (s)":>16}{"add_trace (s)":>16}')
+	for n_traces in args.n_traces:
+		scatter_time = time_it(lambda: build_scatters(n_traces, x))
+		histogram_time = time_it(lambda: build_histograms(n_traces, samples))
+		reference_time = time_it(lambda: add_trace_one_by_one(n_traces, x))
+		print(f'{n_traces:>8}{scatter_time:>14.3f}{histogram_time:>16.3f}{reference_time:>16.3f}', flush=True)
@@ -0,0 +1,43 @@
+"""File size and build time of Plotly figures with large scatter traces,
+drawn as SVG (go.Scatter) and as WebGL (go.Scattergl). Run it as
+
+	python benchmarks/plotly_webgl.py --sizes 1e4 1e6 1e7
+
+For each number of points it builds a figure with one scatter and one
+error band and writes it to HTML. The size of the HTML is about the
+same for both, the difference is that the browser can only interact
+fluently with the WebGL version when there are many points.
+"""
+
+from grafica.PlotlyFigure import PlotlyFigure
+import numpy as np
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+def build_and_save(n_points, webgl_threshold, file_name):
+	x = np.linspace(0, 1, n_points)
+	y = np.cumsum(np.random.randn(n_points))
+	start = time.perf_counter()
+	figure = PlotlyFigure()
+	figure.WEBGL_THRESHOLD = webgl_threshold
+	figure.scatter(x, y, marker='.', label='scatter')
+	figure.errorband(x, y+9, lower=abs(y)/9, higher=abs(y)/9, label='error band')
+	built = time.perf_counter()
+	figure.save(file_name=str(file_name))
+	saved = time.perf_counter()
+	trace_types = {type(trace).__name__ for trace in figure.plotly_figure.data}
+	return built-start, saved-built, Path(file_name).stat().st_size, trace_types
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--sizes', type=float, nargs='*', default=[1e4,1e6,1e7])
+	args = parser.parse_args()
+	
+	print(f'{"points":>10}{"traces":>22}{"build (s)":>12}{"save (s)":>12}{"HTML (MB)":>12}')
+	with tempfile.TemporaryDirectory() as directory:
+		for n_points in [int(_) for _ in args.sizes]:
+			for webgl_threshold in [None, 0]:
+				build_time, save_time, size, trace_types = build_and_save(n_points, webgl_threshold, Path(directory)/'figure.html')
+				print(f'{n_points:>10.0e}{",".join(sorted(trace_types)):>22}{build_time:>12.3f}{save_time:>12.3f}{size/1e6:>12.2f}', flush=True)
@@ -0,0 +1,50 @@
+"""Time to draw and save many lines with `Figure.scatter_many` compared
+with one `Figure.scatter` per line. Run it as
+
+	python benchmarks/scatter_many.py --n-lines 100 1000 10000
+
+For each number of lines (of 200 points each) and each plotter it times
+adding the lines and saving the figure, once with a single scatter_many
+call and once calling scatter for each line.
+"""
+
+from grafica.PlotlyFigure import PlotlyFigure
+from grafica.MatplotlibFigure import HeadlessMatplotlibFigure
+import numpy as np
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+def time_it(func):
+	start = time.perf_counter()
+	func()
+	return time.perf_counter() - start
+
+def scatter_many(plotter, x, y, file_name):
+	figure = plotter()
+	figure.scatter_many(x, y, color=(0,0,0), alpha=.1)
+	figure.save(file_name=file_name)
+
+def scatter_each(plotter, x, y, file_name):
+	figure = plotter()
+	for line in y:
+		figure.scatter(x, line, color=(0,0,0), alpha=.1)
+	figure.save(file_name=file_name)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--n-lines', type=int, nargs='*', default=[100,1000,10000])
+	args = parser.parse_args()
+	
+	x = np.linspace(0, 1, 200)
+	with tempfile.TemporaryDirectory() as directory:
+		file_name = str(Path(directory)/'figure')
+		print(f'{"plotter":>26}{"lines":>8}{"scatter_many (s)":>19}{"scatter (s)":>14}')
+		for plotter in [PlotlyFigure, HeadlessMatplotlibFigure]:
+			scatter_many(plotter, x, x[None,:], file_name) # Warm up, e.g. the first Plotly save reads plotly.js.
+			for n_lines in args.n_lines:
+				y = np.cumsum(np.random.randn(n_lines, len(x)), axis=1)
+				many_time = time_it(lambda: scatter_many(plotter, x, y, file_name))
+				each_time = time_it(lambda: scatter_each(plotter, x, y, file_name))
+				print(f'{plotter.__name__:>26}{n_lines:>8}{many_time:>19.3f}{each_time:>14.3f}', flush=True)
@@ -1,21 +1,96 @@
 from .figure import Figure
-from .PlotlyFigure import PlotlyFigure
-from .MatplotlibFigure import MatplotlibFigure
+from . import background
+from .plotly_html import dashboard_html, plotlyjs_script
+from .samples import validate_workers, map_in_parallel
+from collections.abc import MutableMapping
 import __main__
+import contextlib
+import importlib
+import inspect
+import traceback
 from pathlib import Path
 
+BUILT_IN_PLOTTERS = { # They are imported only when used, so `import grafica` does not import every plotting package.
+	'plotly': 'grafica.PlotlyFigure:PlotlyFigure',
+	'matplotlib': 'grafica.MatplotlibFigure:MatplotlibFigure',
+	'matplotlib_headless': 'grafica.MatplotlibFigure:HeadlessMatplotlibFigure',
+}
+
+class Plotters(MutableMapping):
+	"""A dict of plotters, i.e. subclasses of Figure, by name. A plotter
+	can also be given as a string 'module:ClassName', then the module is
+	imported the first time the plotter is used."""
+	def __init__(self):
+		self._plotters = {}
+	
+	def __getitem__(self, name):
+		plotter = self._plotters[name]
+		if isinstance(plotter, str):
+			plotter = import_plotter(plotter)
+			self._plotters[name] = plotter
+		return plotter
+	
+	def __setitem__(self, name, plotter):
+		if not isinstance(name, str):
+			raise TypeError(f'<name> must be a string, received {name} of type {type(name)}.')
+		if isinstance(plotter, str):
+			validate_plotter_path(plotter)
+		else:
+			validate_plotter(plotter)
+		self._plotters[name] = plotter
+	
+	def __delitem__(self, name):
+		del self._plotters[name]
+	
+	def __iter__(self):
+		return iter(self._plotters)
+	
+	def __len__(self):
+		return len(self._plotters)
+	
+	def paths(self):
+		"""Returns the set of strings 'module:ClassName' of all the
+		plotters, without importing them."""
+		return {plotter if isinstance(plotter, str) else plotter_path(plotter) for plotter in self._plotters.values()}
+	
+	def is_imported(self, name):
+		"""Returns False if the plotter <name> was given as a string and
+		it was not used yet."""
+		return not isinstance(self._plotters[name], str)
+
+def validate_plotter(plotter):
+	if not isinstance(plotter, type) or not issubclass(plotter, Figure):
+		raise TypeError(f'<plotter> must be a subclass of Figure. Received {plotter}.')
+
+def validate_plotter_path(path):
+	if path.count(':') != 1:
+		raise ValueError(f"A plotter given as a string must be of the form 'module:ClassName', received {repr(path)}.")
+
+def plotter_path(plotter):
+	"""Returns the string 'module:ClassName' of <plotter>, see `import_plotter`."""
+	return f'{plotter.__module__}:{plotter.__qualname__}'
+
+def import_plotter(path):
+	"""Imports and returns the plotter given by the string 'module:ClassName'."""
+	validate_plotter_path(path)
+	module_name, class_name = path.split(':')
+	plotter = getattr(importlib.import_module(module_name), class_name)
+	validate_plotter(plotter)
+	return plotter
+
 class FigureManager:
 	def __init__(self):
 		self.figures = [] # Figures of class "from .figure import Figure" are stored here.
 		self._unsaved_figures = [] # Figures that were not yet saved by the `save_unsaved` method.
-		self.plotters = {} # Plotters to create figures are stored here.
-		BUILT_IN_PLOTTERS = {
-			'plotly': PlotlyFigure,
-			'matplotlib': MatplotlibFigure,
-		}
+		self._saving_figures = [] # Figures given to `save_async`, until `flush` is called.
+		self._async_saves = [] # (figure, future) of each `save_async` not yet finished, see `_collect_async_saves`.
+		self.plotters = Plotters() # Plotters to create figures are stored here.
 		for name, plotter in BUILT_IN_PLOTTERS.items():
 			self.add_plotter(plotter = plotter, name = name)
 		self._default_plotter_name = 'plotly'
+		self._close_after_save = False
+		self._max_figures = None
+		self._render_cache = None
 	
 	@property
 	def default_plotter(self):
@@ -26,31 +101,312 @@ class FigureManager:
 			raise ValueError(f'<plotter_name> must be one of {set(self.plotters.keys())}.')
 		self._default_plotter_name = plotter_name
 	
+	@property
+	def close_after_save(self):
+		"""If True, each figure is closed and dropped from `figures` once
+		it is saved by the manager, so that neither the manager nor the
+		plotting package (e.g. pyplot) keep it in memory. Default is False."""
+		return self._close_after_save
+	@close_after_save.setter
+	def close_after_save(self, close: bool):
+		if close not in [True, False]:
+			raise TypeError(f'<close_after_save> expects either True or False, received {close}.')
+		self._close_after_save = close
+	
+	@property
+	def max_figures(self):
+		"""Maximum number of figures kept in `figures`, or None for no
+		limit. When there are more, the saved figures that were used least
+		recently (see `Figure.last_used`) are closed and dropped. Figures
+		not yet saved are never dropped, so there can be more of them."""
+		return self._max_figures
+	@max_figures.setter
+	def max_figures(self, max_figures):
+		if max_figures is not None:
+			if not isinstance(max_figures, int) or isinstance(max_figures, bool):
+				raise TypeError(f'<max_figures> must be an integer number or None, received {max_figures} of type {type(max_figures)}.')
+			if max_figures < 0:
+				raise ValueError(f'<max_figures> must be positive, received {max_figures}.')
+		self._max_figures = max_figures
+		self._evict()
+	
+	@property
+	def render_cache(self):
+		"""A render_cache.RenderCache used by `save_unsaved`, so that the
+		figures that were already saved exactly as they are now are not
+		rendered again. Default is None, i.e. no cache."""
+		return self._render_cache
+	@render_cache.setter
+	def render_cache(self, render_cache):
+		from .render_cache import RenderCache
+		if render_cache is not None and not isinstance(render_cache, RenderCache):
+			raise TypeError(f'<render_cache> must be a RenderCache or None, received an object of type {type(render_cache)}.')
+		self._render_cache = render_cache
+	
+	def memory_footprint(self):
+		"""Returns an estimate of the bytes of memory used by the figures
+		in `figures`, see `Figure.memory_footprint`."""
+		return sum(fig.memory_footprint() for fig in self.figures)
+	
 	def add_plotter(self, plotter, name):
-		if not issubclass(plotter, Figure):
-			raise TypeError(f'<plotter> must be a subclass of Figure. Received {plotter}.')
-		if not isinstance(name, str):
-			raise TypeError(f'<name> must be a string, received {name} of type {type(name)}.')
+		"""- plotter: A subclass of Figure, or a string 'module:ClassName'
+		to import it only when it is used for the first time.
+		- name: String, the <plotter_name> to use it in `new`."""
 		self.plotters[name] = plotter
 	
 	def new(self, plotter_name=None, **kwargs):
-		if plotter_name is None:
-			plotter = self.default_plotter
-		elif plotter_name not in self.plotters:
-			raise ValueError(f'Unknown <plotter_name> "{plotter_name}".')
-		else:
-			plotter = self.plotters[plotter_name]
-		fig = plotter()
+		self._collect_async_saves()
+		fig = self._plotter(plotter_name)()
 		self.figures.append(fig)
 		self._unsaved_figures.append(fig)
 		fig.set(**kwargs)
+		self._evict()
+		return fig
+	
+	def replay(self, figure, plotter_name=None, **kwargs):
+		"""Creates a new figure with another plotter drawing the same as
+		<figure>, e.g. to make PNG thumbnails of Plotly figures. The traces
+		are not computed again, the same Trace objects and arrays are used.
+		The new figure is managed like those created with `new`.
+		- figure: A Figure, or a spec.FigureSpec.
+		- plotter_name: Name of the plotter in `plotters`, default is
+		`default_plotter`.
+		- kwargs: Figure properties to change in the new figure, e.g.
+		`title`.
+		
+		Example
+		-------
+		```
+		thumbnail = grafica.manager.replay(plotly_figure, 'matplotlib_headless', subtitle='Thumbnail')
+		thumbnail.save(dpi=50)
+		```
+		"""
+		from .spec import FigureSpec # Imported here because it imports this module.
+		self._collect_async_saves()
+		plotter = self._plotter(plotter_name)
+		spec = figure if isinstance(figure, FigureSpec) else FigureSpec.from_figure(figure)
+		fig = spec.build(plotter, deferred=True)
+		self.figures.append(fig)
+		self._unsaved_figures.append(fig)
+		fig.set(deferred=spec.deferred, **kwargs)
+		self._evict()
 		return fig
 	
 	def show(self):
 		for fig in self.figures:
 			fig.show()
 	
-	def save_unsaved(self, mkdir=False):
+	def save_unsaved(self, mkdir=False, include_plotlyjs=None, workers=None):
+		"""Saves all the figures that were not yet saved and returns the
+		list of paths to the files.
+		- mkdir: If False, the figures are saved in the current working
+		directory. If True, in a directory named as the script plus
+		'_plots'. Otherwise it is the path to the directory.
+		- include_plotlyjs: Passed to the `save` method of the figures
+		that have this argument, see PlotlyFigure.save. With 'directory'
+		plotly.js is written only once into the directory and all the
+		figures use it, so they work offline.
+		- workers: Integer number. If given, the figures are rendered and
+		written by this number of processes in parallel. Each figure is
+		sent to its process as a spec.FigureSpec, i.e. its properties and
+		the arrays of its traces (not the samples of Histogram and KDE),
+		and drawn there, so the processes do not receive the other
+		figures. Figures that cannot be encoded this way are saved by
+		this process. The files are the same as when saving serially.
+		It cannot be used while figures are being saved in background
+		threads (see `save_async`), call `flush` before.
+		If there is a `render_cache`, figures found in it are skipped.
+		If some figures cannot be saved, the others are saved anyway and
+		then a RuntimeError reports each failure, the failed figures are
+		kept as unsaved."""
+		self._collect_async_saves()
+		workers = validate_workers(workers)
+		if workers > 1 and (len(self._async_saves) > 0 or background.saver.pending > 0):
+			raise RuntimeError(f'Cannot save with <workers> while figures are being saved in background threads, because the processes would be forked from them. Call `flush` first.')
+		arguments = [(idx, file_name, kwargs) for idx, (file_name, kwargs) in enumerate(self._save_arguments(mkdir, include_plotlyjs))]
+		results = [None]*len(arguments)
+		with self.render_cache.batch() if self.render_cache is not None else contextlib.nullcontext(): # The index of the cache is written once.
+			if self.render_cache is not None:
+				keys = [_render_cache_key(self.render_cache, self._unsaved_figures[idx], file_name, kwargs) for idx, file_name, kwargs in arguments]
+				for idx, key in enumerate(keys):
+					path = self.render_cache.restore(key)
+					if path is not None:
+						results[idx] = (path, None)
+			arguments = [args for args, result in zip(arguments, results) if result is None]
+			if workers == 1 or len(arguments) < 2:
+				saved = [_save_figure(self._unsaved_figures, *args) for args in arguments]
+			else:
+				encoded = [_encode_figure(self._unsaved_figures[idx]) for idx, file_name, kwargs in arguments]
+				in_parallel = [i for i, spec in enumerate(encoded) if spec is not None]
+				saved = [None]*len(arguments)
+				for i, result in zip(in_parallel, map_in_parallel(
+					_save_encoded_figure,
+					shared = None,
+					arguments = [encoded[i] + arguments[i][1:] for i in in_parallel],
+					workers = workers,
+				)):
+					saved[i] = result
+				for i, spec in enumerate(encoded):
+					if spec is None:
+						saved[i] = _save_figure(self._unsaved_figures, *arguments[i])
+			for (idx, file_name, kwargs), (path, error) in zip(arguments, saved):
+				results[idx] = (path, error)
+				if self.render_cache is not None and error is None and keys[idx] is not None:
+					self.render_cache.store(keys[idx], path)
+		failures = [(fig, error) for fig, (path, error) in zip(self._unsaved_figures, results) if error is not None]
+		saved = [fig for fig, (path, error) in zip(self._unsaved_figures, results) if error is None]
+		self._unsaved_figures = [fig for fig, error in failures]
+		self._saved(saved)
+		if len(failures) > 0:
+			raise RuntimeError(f'Could not save {len(failures)} of {len(results)} figures:\n' + '\n'.join(f'- {fig.title}:\n{error}' for fig, error in failures))
+		return [path for path, error in results]
+	
+	def save_async(self, mkdir=False, include_plotlyjs=None, saver=None):
+		"""Same as `save_unsaved` but the figures are saved in background
+		threads, see `Figure.save_async`, and a list of
+		concurrent.futures.Future with the paths to the files is returned
+		immediately. Each figure is saved as it is now, later changes are
+		not saved. The figures are no longer unsaved. Those whose save
+		fails become unsaved again, and `close_after_save` is applied only
+		to those whose save succeeds, which the manager checks in `flush`
+		and whenever it is used afterwards. Use `flush` to wait for them."""
+		self._collect_async_saves()
+		figures = self._unsaved_figures
+		arguments = self._save_arguments(mkdir, include_plotlyjs)
+		self._unsaved_figures = []
+		futures = []
+		try:
+			for fig, (file_name, kwargs) in zip(figures, arguments):
+				futures.append(fig.save_async(file_name=file_name, saver=saver, **kwargs))
+		except BaseException:
+			self._unsaved_figures = figures[len(futures):] + self._unsaved_figures # They were not submitted.
+			raise
+		finally:
+			saving = {id(fig) for fig in self._saving_figures}
+			self._saving_figures += [fig for fig in figures[:len(futures)] if id(fig) not in saving]
+			self._async_saves += list(zip(figures, futures))
+		self._collect_async_saves() # Some may have already finished.
+		return futures
+	
+	def flush(self, timeout=None):
+		"""Waits until all the figures saved with `save_async` are
+		written, or for at most <timeout> seconds. Returns the list of
+		paths to the files, raises a RuntimeError if some failed."""
+		paths = []
+		failures = []
+		figures = {id(fig) for fig in self.figures}
+		for fig in self.figures + [fig for fig in self._saving_figures if id(fig) not in figures]: # The latter were already dropped, see `close_after_save`.
+			try:
+				paths += fig.flush(timeout=timeout)
+			except TimeoutError:
+				raise
+			except Exception:
+				failures.append((fig, traceback.format_exc()))
+		self._saving_figures = []
+		self._collect_async_saves()
+		if len(failures) > 0:
+			raise RuntimeError(f'Could not save {len(failures)} figures:\n' + '\n'.join(f'- {fig.title}:\n{error}' for fig, error in failures))
+		return paths
+	
+	def save_dashboard(self, file_name='dashboard', mkdir=False, include_plotlyjs=True, title=None, **kwargs):
+		"""Saves all the figures that were not yet saved into a single
+		HTML file, one after the other, loading plotly.js only once.
+		- file_name: Name of the HTML file.
+		- mkdir: Same as in `save_unsaved`.
+		- include_plotlyjs: How the page loads plotly.js, see
+		`plotly_html.plotlyjs_script`. By default it is embedded, so the
+		file works offline.
+		- title: Title of the page, default is <file_name>.
+		- kwargs: Passed to the `html_div` method of each figure.
+		Returns the path to the file."""
+		self._collect_async_saves()
+		directory = self._output_directory(mkdir)
+		if file_name[-5:] != '.html':
+			file_name += '.html'
+		sections = [(fig.title, fig.html_div(div_id=f'figure_{idx+1}', **kwargs)) for idx,fig in enumerate(self._unsaved_figures)]
+		path = Path(directory)/Path(file_name)
+		with open(path, 'w', encoding='utf-8') as ofile:
+			ofile.write(
+				dashboard_html(
+					sections,
+					title = title if title is not None else Path(file_name).stem,
+					head = plotlyjs_script(include_plotlyjs, directory),
+				)
+			)
+		saved = self._unsaved_figures
+		self._unsaved_figures = []
+		self._saved(saved)
+		return path
+	
+	def _plotter(self, plotter_name):
+		if plotter_name is None:
+			plotter = self.default_plotter
+		elif plotter_name not in self.plotters:
+			raise ValueError(f'Unknown <plotter_name> "{plotter_name}".')
+		else:
+			plotter = self.plotters[plotter_name]
+		return plotter
+	
+	def _collect_async_saves(self):
+		"""Handles the `save_async` calls that finished: the figures whose
+		save failed become unsaved again, if they were not dropped, and the
+		others are marked as saved. It runs in the thread using the manager,
+		never in the background threads, so the lists of figures are only
+		modified by one thread."""
+		if len(self._async_saves) == 0:
+			return
+		finished = [(fig, future) for fig, future in self._async_saves if future.done()]
+		self._async_saves = [(fig, future) for fig, future in self._async_saves if not future.done()]
+		figures = {id(fig) for fig in self.figures}
+		unsaved = {id(fig) for fig in self._unsaved_figures}
+		saved = []
+		for fig, future in finished:
+			if id(fig) in unsaved:
+				continue
+			if future.cancelled() or future.exception() is not None:
+				if id(fig) in figures:
+					self._unsaved_figures.append(fig)
+					unsaved.add(id(fig))
+			else:
+				saved.append(fig)
+		self._saved(list({id(fig): fig for fig in saved if id(fig) not in unsaved}.values()))
+	
+	def _saved(self, figures):
+		"""Applies `close_after_save` and `max_figures` after <figures>
+		were saved."""
+		if self.close_after_save:
+			self._drop(figures)
+		self._evict()
+	
+	def _evict(self):
+		if self.max_figures is None or len(self.figures) <= self.max_figures:
+			return
+		if len(self._unsaved_figures) >= len(self.figures): # All unsaved, e.g. while creating figures to save them at the end.
+			return
+		kept = {id(fig) for fig in self._unsaved_figures} | {id(fig) for fig, future in self._async_saves} # If an async save fails the figure becomes unsaved again.
+		saved = sorted((fig for fig in self.figures if id(fig) not in kept), key=lambda fig: fig.last_used)
+		self._drop(saved[:len(self.figures)-self.max_figures])
+	
+	def _drop(self, figures):
+		"""Closes <figures> and removes them from `figures`."""
+		for fig in figures:
+			fig.close()
+		dropped = {id(fig) for fig in figures}
+		self.figures = [fig for fig in self.figures if id(fig) not in dropped]
+	
+	def _save_arguments(self, mkdir, include_plotlyjs):
+		"""Returns a list of (file_name, kwargs) to save each unsaved figure."""
+		directory = self._output_directory(mkdir)
+		arguments = []
+		for idx,fig in enumerate(self._unsaved_figures):
+			file_name = fig.title if fig.title is not None else f'figure_{idx+1}'
+			kwargs = {}
+			if include_plotlyjs is not None and 'include_plotlyjs' in inspect.signature(fig.save).parameters:
+				kwargs['include_plotlyjs'] = include_plotlyjs
+			arguments.append((str(Path(directory)/Path(file_name)), kwargs))
+		return arguments
+	
+	def _output_directory(self, mkdir):
 		if mkdir == False: # Save the plots in the current working directory.
 			directory = './'
 		else:
@@ -59,7 +415,39 @@ class FigureManager:
 			else: # I assume mkdir is a path to a directory where to save the plots.
 				directory = str(mkdir)
 			Path(directory).mkdir(parents=True, exist_ok=True)
-		for idx,fig in enumerate(self._unsaved_figures):
-			file_name = fig.title if fig.title is not None else f'figure_{idx+1}'
-			fig.save(file_name = str(Path(directory)/Path(file_name)))
-		self._unsaved_figures = []
+		return directory
+
+def _render_cache_key(render_cache, fig, file_name, kwargs):
+	"""Returns the key of <fig> in <render_cache>, or None if its content
+	cannot be hashed, then it is just saved without the cache."""
+	try:
+		return render_cache.key(fig, file_name, **kwargs)
+	except (TypeError, ValueError):
+		return None
+
+def _encode_figure(fig):
+	"""Returns (metadata, arrays) with the spec of <fig> to send it to
+	another process, see `_save_encoded_figure`, or None if its traces
+	contain objects that cannot be encoded."""
+	from .spec import FigureSpec # Imported here because it imports this module.
+	try:
+		return FigureSpec.from_figure(fig)._encode()
+	except (TypeError, ValueError):
+		return None
+
+def _save_encoded_figure(shared, metadata, arrays, file_name, kwargs):
+	"""Draws the figure encoded by `_encode_figure` and saves it, returns
+	the same as `_save_figure`."""
+	from .spec import _from_encoded
+	try:
+		return _from_encoded(metadata, arrays).build(deferred=True).save(file_name=file_name, **kwargs), None
+	except Exception:
+		return None, traceback.format_exc()
+
+def _save_figure(figures, idx, file_name, kwargs):
+	"""Saves figures[idx] and returns (path, None), or (None, traceback)
+	if it fails, so that one failure does not stop the others."""
+	try:
+		return figures[idx].save(file_name=file_name, **kwargs), None
+	except Exception:
+		return None, traceback.format_exc()
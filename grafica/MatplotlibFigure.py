@@ -1,21 +1,32 @@
-from .figure import Figure
-from .traces import Scatter, ErrorBand, Histogram, Heatmap, Contour, KDE
-import matplotlib.pyplot as plt
+from .figure import Figure, nbytes
+from .spec import FigureSpec
+from .traces import Scatter, ScatterMany, ErrorBand, Histogram, Heatmap, Contour, KDE
 import matplotlib.colors as matplotlib_colors
+from matplotlib.collections import LineCollection, QuadMesh
+import matplotlib.figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import numpy as np
 import warnings
+import base64
+import io
 
 class MatplotlibFigure(Figure):
 	def __init__(self):
 		super().__init__()
-		fig, ax = plt.subplots()
+		fig, ax = self._create_matplotlib_figure()
 		self.matplotlib_figure = fig
 		self.matplotlib_axes = ax
 	
+	def _create_matplotlib_figure(self):
+		import matplotlib.pyplot as plt # Imported only here and where it is used, so that HeadlessMatplotlibFigure never imports it.
+		return plt.subplots()
+	
 	# Methods that must be overridden ----------------------------------
 	
 	def show(self):
 		# Overriding this method as specified in the class Figure.
+		import matplotlib.pyplot as plt
+		self.render()
 		plt.show()
 	
 	def save(self, file_name=None, format='png', facecolor=(1,1,1,0), **kwargs):
@@ -24,9 +35,49 @@ class MatplotlibFigure(Figure):
 			file_name = self.title
 		if file_name is None:
 			raise ValueError(f'Please provide a name for saving the figure to a file by the <file_name> argument.')
+		self.render()
 		if file_name[-4] != '.':
 			file_name = f'{file_name}.{format}'
 		self.matplotlib_figure.savefig(fname=file_name, format=format, facecolor=facecolor, **kwargs)
+		return file_name
+	
+	def html_div(self, div_id=None, format='png', facecolor=(1,1,1,0), **kwargs):
+		# Overriding this method as specified in the class Figure.
+		self.render()
+		image = io.BytesIO()
+		self.matplotlib_figure.savefig(image, format=format, facecolor=facecolor, **kwargs)
+		mime_type = {'svg': 'image/svg+xml', 'jpg': 'image/jpeg'}.get(format, f'image/{format}')
+		id_attribute = f' id="{div_id}"' if div_id is not None else ''
+		return f'<div{id_attribute}><img src="data:{mime_type};base64,{base64.b64encode(image.getvalue()).decode("ascii")}"></div>'
+	
+	def close(self):
+		# Overriding this method as specified in the class Figure.
+		if self.matplotlib_figure is not None:
+			import matplotlib.pyplot as plt
+			plt.close(self.matplotlib_figure) # Otherwise pyplot keeps it alive.
+		self.matplotlib_figure = None
+		self.matplotlib_axes = None
+	
+	def _snapshot_to_save_async(self):
+		# Overriding this method as specified in the class Figure. pyplot is not thread safe, so the snapshot is drawn without it.
+		return FigureSpec.from_figure(self, copy=True).build(plotter=HeadlessMatplotlibFigure, deferred=True)
+	
+	def memory_footprint(self):
+		# Overriding this method as specified in the class Figure.
+		seen = set()
+		traces_bytes = nbytes([vars(trace) for trace in self.traces], seen)
+		if self.matplotlib_figure is None:
+			return traces_bytes
+		arrays = []
+		for axes in self.matplotlib_figure.axes:
+			arrays += [line.get_xydata() for line in axes.lines] # Matplotlib keeps its own copies of the arrays.
+			for collection in axes.collections:
+				arrays.append(collection.get_array())
+				if isinstance(collection, QuadMesh): # It keeps the coordinates of the cells, `get_paths` would create a Path for each cell.
+					arrays.append(collection.get_coordinates())
+				else:
+					arrays += [path.vertices for path in collection.get_paths()] + [collection.get_offsets()]
+		return traces_bytes + nbytes(arrays, seen)
 	
 	def draw_layout(self):
 		# Overriding this method as specified in the class Figure.
@@ -35,7 +86,8 @@ class MatplotlibFigure(Figure):
 		self.matplotlib_axes.set_xscale(map_axes_scale_to_Matplotlib_scale(self.xscale))
 		self.matplotlib_axes.set_yscale(map_axes_scale_to_Matplotlib_scale(self.yscale))
 		if self.title != None:
-			self.matplotlib_figure.canvas.manager.set_window_title(self.title)
+			if self.matplotlib_figure.canvas.manager is not None:
+				self.matplotlib_figure.canvas.manager.set_window_title(self.title)
 			if self.show_title == True:
 				self.matplotlib_figure.suptitle(self.title)
 		if self.aspect == 'equal':
@@ -44,18 +96,26 @@ class MatplotlibFigure(Figure):
 			self.matplotlib_axes.set_title(self.subtitle)
 	
 	def draw_trace(self, trace):
+		# Overriding this method as specified in the class Figure.
+		self.draw_traces([trace])
+	
+	def draw_traces(self, traces):
 		# Overriding this method as specified in the class Figure.
 		traces_drawing_methods = {
 			Scatter: self._draw_scatter,
+			ScatterMany: self._draw_scatter_many,
 			Histogram: self._draw_histogram,
 			Heatmap: self._draw_heatmap,
 			Contour: self._draw_contour,
 			ErrorBand: self._draw_errorband,
 			KDE: self._draw_scatter,
 		}
-		if type(trace) not in traces_drawing_methods:
-			raise RuntimeError(f"Don't know how to draw a {type(trace)} trace...")
-		traces_drawing_methods[type(trace)](trace)
+		for trace in traces:
+			if type(trace) not in traces_drawing_methods:
+				raise RuntimeError(f"Don't know how to draw a {type(trace)} trace...")
+			traces_drawing_methods[type(trace)](trace)
+		if any(trace.label is not None and isinstance(trace, (Scatter, ScatterMany, Histogram)) for trace in traces): # If you gave me a label it is obvious (for me) that you want to display it, no?
+			self.matplotlib_axes.legend() # Only once, building the legend is slow.
 	
 	# Methods that draw each of the traces (for internal use only) -----
 	
@@ -72,8 +132,24 @@ class MatplotlibFigure(Figure):
 			alpha = scatter.alpha,
 			label = scatter.label,
 		)
-		if scatter.label != None: # If you gave me a label it is obvious (for me) that you want to display it, no?
-			self.matplotlib_axes.legend()
+	
+	def _draw_scatter_many(self, scatter_many):
+		if not isinstance(scatter_many, ScatterMany):
+			raise TypeError(f'<scatter_many> must be an instance of {ScatterMany}, received object of type {type(scatter_many)}.')
+		segments = np.empty(scatter_many.y.shape + (2,))
+		segments[...,0] = scatter_many.x # Broadcasts if it is shared by all the lines.
+		segments[...,1] = scatter_many.y
+		self.matplotlib_axes.add_collection(
+			LineCollection(
+				segments,
+				colors = [scatter_many.color],
+				linestyles = map_linestyle_to_Matplotlib_linestyle(scatter_many.linestyle),
+				linewidths = scatter_many.linewidth,
+				alpha = scatter_many.alpha,
+				label = scatter_many.label,
+			)
+		)
+		self.matplotlib_axes.autoscale_view()
 	
 	def _draw_errorband(self, errorband: ErrorBand):
 		if not isinstance(errorband, ErrorBand):
@@ -96,8 +172,6 @@ class MatplotlibFigure(Figure):
 			alpha = errorband.alpha,
 			label = errorband.label,
 		)
-		if errorband.label != None: # If you gave me a label it is obvious (for me) that you want to display it, no?
-			self.matplotlib_axes.legend()
 	
 	def _draw_histogram(self, histogram):
 		if not isinstance(histogram, Histogram):
@@ -128,8 +202,6 @@ class MatplotlibFigure(Figure):
 			marker = histogram.marker,
 			label = histogram.label,
 		)
-		if histogram.label is not None: # If you gave me a label it is obvious (for me) that you want to display it, no?
-			self.matplotlib_axes.legend()
 	
 	def _draw_heatmap(self, heatmap):
 		if not isinstance(heatmap, Heatmap):
@@ -198,6 +270,30 @@ class MatplotlibFigure(Figure):
 		)
 		self.matplotlib_axes.clabel(cs, inline=True)
 	
+class HeadlessMatplotlibFigure(MatplotlibFigure):
+	"""Same as MatplotlibFigure, but the Matplotlib figure is created
+	directly with an Agg canvas instead of through pyplot, which is never
+	imported. Each figure is independent of any global state, so many of
+	them can be drawn and saved at the same time from different threads,
+	and they are freed as soon as they are not referenced, without
+	closing them. They cannot be shown in a window, only saved, so
+	`show` only warns, and `grafica.show()` still shows the other
+	figures."""
+	
+	def _create_matplotlib_figure(self):
+		fig = matplotlib.figure.Figure()
+		FigureCanvasAgg(fig)
+		return fig, fig.subplots()
+	
+	def show(self):
+		# Overriding this method as specified in the class Figure.
+		warnings.warn(f'A {self.__class__.__name__} cannot be shown, it has no window. Use `save` or `html_div` instead, or a MatplotlibFigure.')
+	
+	def close(self):
+		# Overriding this method as specified in the class Figure.
+		self.matplotlib_figure = None
+		self.matplotlib_axes = None
+	
 def map_axes_scale_to_Matplotlib_scale(scale):
 	if scale is None or scale == 'lin':
 		return 'linear'
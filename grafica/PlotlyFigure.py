@@ -1,42 +1,115 @@
-from .figure import Figure
-from .traces import Scatter, ErrorBand, Histogram, Heatmap, Contour, KDE
+from .figure import Figure, nbytes
+from .traces import Scatter, ScatterMany, ErrorBand, Histogram, Heatmap, Contour, KDE
 import plotly.graph_objects as go
-import plotly
+import plotly.io as pio
+from .plotly_html import encode_typed_arrays, write_plotlyjs
 import numpy as np
 import warnings
+from pathlib import Path
+import uuid
 
 class PlotlyFigure(Figure):
+	WEBGL_THRESHOLD = 100000 # Scatter traces with more points than this are drawn with WebGL, because SVG becomes unusable in the browser. Set to None to never use it.
+	INCLUDE_PLOTLYJS = 'cdn' # Default for `save`, set it to 'directory' or True for files that work offline.
+	COMPACT_HISTOGRAM_THRESHOLD = 1000 # Histograms with more bins than this are drawn with a single trace, see `_draw_compact_histogram`. Set to 0 to always do it or None to never.
+	
 	def __init__(self):
 		super().__init__()
-		self.plotly_figure = go.Figure()
+		self._plotly_figure = go.Figure()
+		self._trace_dicts = [] # Traces drawn but not yet added to the go.Figure, see `plotly_figure`.
+	
+	@property
+	def plotly_figure(self):
+		"""The plotly.graph_objects.Figure with everything in the figure,
+		including what was not drawn yet because it is deferred, see
+		`render`. The traces are kept as plain dicts and added to it in a
+		single batch when it is needed, because adding them one by one to
+		a go.Figure is slow."""
+		self.render()
+		if len(self._trace_dicts) > 0:
+			trace_dicts = self._trace_dicts
+			self._trace_dicts = []
+			self._plotly_figure.add_traces(trace_dicts)
+		return self._plotly_figure
 	
 	# Methods that must be overridden ----------------------------------
 	
 	def show(self):
 		# Overriding this method as specified in the class Figure.
+		self.render()
 		self.plotly_figure.show()
 	
-	def save(self, file_name=None, include_plotlyjs='cdn', auto_open=False, **kwargs):
+	def save(self, file_name=None, include_plotlyjs=None, auto_open=False, typed_arrays=False, float32=False, **kwargs):
 		# Overriding this method as specified in the class Figure.
+		"""- include_plotlyjs: How the HTML loads plotly.js, see
+		`plotly_html.plotlyjs_script`. With 'directory' the library is
+		written only once into the directory of the file, and shared by
+		all the figures saved there. Default is INCLUDE_PLOTLYJS.
+		- typed_arrays: If True, the numeric arrays of the traces are
+		embedded in the HTML as base64 typed arrays instead of decimal
+		text, see `plotly_html.encode_typed_arrays`.
+		- float32: If True, float arrays are stored with 32 bits where
+		the precision allows it. Requires <typed_arrays>."""
 		if file_name is None:
 			file_name = self.title
 		if file_name is None: # If it is still None...
 			raise ValueError(f'Please provide a name for saving the figure to a file by the <file_name> argument.')
+		if float32 and not typed_arrays:
+			raise ValueError(f'<float32> can only be used together with <typed_arrays>.')
 		if file_name[-5:] != '.html':
 			file_name += '.html'
-		plotly.offline.plot(
-			self.plotly_figure,
-			filename = file_name,
+		if include_plotlyjs is None:
+			include_plotlyjs = self.INCLUDE_PLOTLYJS
+		if include_plotlyjs == 'directory':
+			include_plotlyjs = write_plotlyjs(Path(file_name).parent)
+		self.render()
+		figure = self.plotly_figure
+		if typed_arrays:
+			figure = encode_typed_arrays(figure.to_plotly_json(), float32=float32)
+		if kwargs.get('div_id') is None: # Otherwise plotly uses a random one and each time the file is different.
+			kwargs['div_id'] = str(uuid.uuid5(uuid.NAMESPACE_URL, Path(file_name).name))
+		pio.write_html(
+			figure,
+			file = file_name,
 			auto_open = auto_open,
 			include_plotlyjs = include_plotlyjs,
+			validate = False,
 			**kwargs
 		)
+		return file_name
+	
+	def html_div(self, div_id=None, typed_arrays=False, float32=False):
+		# Overriding this method as specified in the class Figure.
+		self.render()
+		figure = self.plotly_figure
+		if typed_arrays:
+			figure = encode_typed_arrays(figure.to_plotly_json(), float32=float32)
+		return pio.to_html(
+			figure,
+			full_html = False,
+			include_plotlyjs = False,
+			div_id = div_id,
+			validate = False,
+		)
+	
+	def close(self):
+		# Overriding this method as specified in the class Figure.
+		self._plotly_figure = None
+		self._trace_dicts = []
+	
+	def memory_footprint(self):
+		# Overriding this method as specified in the class Figure.
+		seen = set()
+		traces_bytes = nbytes([vars(trace) for trace in self.traces], seen)
+		if self._plotly_figure is None:
+			return traces_bytes
+		return traces_bytes + nbytes([self._trace_dicts, list(self._plotly_figure._data)], seen) # plotly keeps its own copies of the arrays.
 	
 	def draw_layout(self):
 		# Overriding this method as specified in the class Figure.
 		if self.show_title == True and self.title != None:
-			self.plotly_figure.update_layout(title = self.title)
-		self.plotly_figure.update_layout(
+			self._plotly_figure.update_layout(title = self.title)
+		self._plotly_figure.update_layout(
 			xaxis_title = self.xlabel,
 			yaxis_title = self.ylabel,
 		)
@@ -44,20 +117,22 @@ class PlotlyFigure(Figure):
 		if self.xscale in [None, 'lin']:
 			pass
 		elif self.xscale == 'log':
-			self.plotly_figure.update_layout(xaxis_type = 'log')
+			self._plotly_figure.update_layout(xaxis_type = 'log')
 		if self.yscale in [None, 'lin']:
 			pass
 		elif self.yscale == 'log':
-			self.plotly_figure.update_layout(yaxis_type = 'log')
+			self._plotly_figure.update_layout(yaxis_type = 'log')
 		
 		if self.aspect == 'equal':
-			self.plotly_figure.update_yaxes(
+			self._plotly_figure.update_yaxes(
 				scaleanchor = "x",
 				scaleratio = 1,
 			)
 		
 		if self.subtitle != None:
-			self.plotly_figure.add_annotation(
+			self._plotly_figure.layout.annotations = [annotation for annotation in self._plotly_figure.layout.annotations if annotation.name != 'subtitle'] # Otherwise it is added again each time the layout is drawn.
+			self._plotly_figure.add_annotation(
+				name = 'subtitle',
 				text = self.subtitle.replace('\n','<br>'),
 				xref = "paper", 
 				yref = "paper",
@@ -75,6 +150,7 @@ class PlotlyFigure(Figure):
 		# Overriding this method as specified in the class Figure.
 		traces_drawing_methods = {
 			Scatter: self._draw_scatter,
+			ScatterMany: self._draw_scatter_many,
 			ErrorBand: self._draw_errorband,
 			Histogram: self._draw_histogram,
 			Heatmap: self._draw_heatmap,
@@ -90,57 +166,92 @@ class PlotlyFigure(Figure):
 	def _draw_scatter(self, scatter: Scatter):
 		if not isinstance(scatter, Scatter):
 			raise TypeError(f'<scatter> must be an instance of {Scatter}, received object of type {type(scatter)}.')
-		self.plotly_figure.add_trace(
-			go.Scatter(
+		self._trace_dicts.append(
+			dict(
+				type = self._scatter_type(len(scatter.x)),
 				x = scatter.x,
 				y = scatter.y,
 				name = scatter.label,
 				opacity = scatter.alpha,
 				mode = translate_marker_and_linestyle_to_Plotly_mode(scatter.marker, scatter.linestyle),
-				marker_symbol = map_marker_to_Plotly_markers(scatter.marker),
 				showlegend = True if scatter.label is not None else False,
+				marker = dict(
+					symbol = map_marker_to_Plotly_markers(scatter.marker),
+					color = rgb2hexastr_color(scatter.color),
+				),
 				line = dict(
 					dash = map_linestyle_to_Plotly_linestyle(scatter.linestyle),
-				)
+					width = scatter.linewidth,
+				),
 			)
 		)
-		self.plotly_figure['data'][-1]['marker']['color'] = rgb2hexastr_color(scatter.color)
-		self.plotly_figure['data'][-1]['line']['width'] = scatter.linewidth
 	
-	def _draw_errorband(self, errorband: ErrorBand):
-		if not isinstance(errorband, ErrorBand):
-			raise TypeError(f'<errorband> must be an instance of {ErrorBand}, received object of type {type(errorband)}.')
-		x = errorband.x
-		y1 = errorband.y + errorband.higher
-		y2 = errorband.y - errorband.lower
-		legendgroup = str(np.random.rand(3))
-		# Draw the error band ---
-		self.plotly_figure.add_trace(
-			go.Scatter(
-				x = list(x) + list(x)[::-1],
-				y = list(y1) + list(y2)[::-1],
-				opacity = errorband.alpha/2,
+	def _draw_scatter_many(self, scatter_many: ScatterMany):
+		if not isinstance(scatter_many, ScatterMany):
+			raise TypeError(f'<scatter_many> must be an instance of {ScatterMany}, received object of type {type(scatter_many)}.')
+		n_lines, n_points = scatter_many.y.shape
+		# All the lines go into a single trace, one after the other separated by NaN, which Plotly does not connect.
+		x = np.full((n_lines, n_points+1), float('NaN'))
+		y = np.full((n_lines, n_points+1), float('NaN'))
+		x[:,:-1] = scatter_many.x
+		y[:,:-1] = scatter_many.y
+		self._trace_dicts.append(
+			dict(
+				type = self._scatter_type(x.size),
+				x = x.reshape(-1)[:-1],
+				y = y.reshape(-1)[:-1],
+				name = scatter_many.label,
+				opacity = scatter_many.alpha,
 				mode = 'lines',
-				name = errorband.label,
-				legendgroup = legendgroup,
-				showlegend = False,
+				connectgaps = False,
+				showlegend = True if scatter_many.label is not None else False,
 				line = dict(
-					color = rgb2hexastr_color(errorband.color),
+					color = rgb2hexastr_color(scatter_many.color),
+					dash = map_linestyle_to_Plotly_linestyle(scatter_many.linestyle),
+					width = scatter_many.linewidth,
 				),
 			)
 		)
-		self.plotly_figure['data'][-1]['fill'] = 'toself'
-		self.plotly_figure['data'][-1]['hoveron'] = 'points'
-		self.plotly_figure['data'][-1]['line']['width'] = 0
+	
+	def _draw_errorband(self, errorband: ErrorBand):
+		if not isinstance(errorband, ErrorBand):
+			raise TypeError(f'<errorband> must be an instance of {ErrorBand}, received object of type {type(errorband)}.')
+		x = np.asarray(errorband.x)
+		y1 = np.asarray(errorband.y) + np.asarray(errorband.higher)
+		y2 = np.asarray(errorband.y) - np.asarray(errorband.lower)
+		legendgroup = self._new_legendgroup()
+		scatter_type = self._scatter_type(len(x))
+		# Draw the error band ---
+		band = dict(
+			type = scatter_type,
+			x = np.concatenate([x, x[::-1]]),
+			y = np.concatenate([y1, y2[::-1]]),
+			opacity = errorband.alpha/2,
+			mode = 'lines',
+			name = errorband.label,
+			legendgroup = legendgroup,
+			showlegend = False,
+			line = dict(
+				color = rgb2hexastr_color(errorband.color),
+				width = 0,
+			),
+			fill = 'toself',
+		)
+		if scatter_type == 'scatter': # Scattergl has no `hoveron`.
+			band['hoveron'] = 'points'
+		self._trace_dicts.append(band)
 		# Draw the trace itself ---
-		self.plotly_figure.add_trace(
-			go.Scatter(
+		self._trace_dicts.append(
+			dict(
+				type = scatter_type,
 				x = errorband.x,
 				y = errorband.y,
 				name = errorband.label,
 				opacity = errorband.alpha,
 				mode = translate_marker_and_linestyle_to_Plotly_mode(errorband.marker, errorband.linestyle),
-				marker_symbol = map_marker_to_Plotly_markers(errorband.marker),
+				marker = dict(
+					symbol = map_marker_to_Plotly_markers(errorband.marker),
+				),
 				showlegend = True if errorband.label is not None else False,
 				line = dict(
 					dash = map_linestyle_to_Plotly_linestyle(errorband.linestyle),
@@ -151,39 +262,63 @@ class PlotlyFigure(Figure):
 			)
 		)
 	
+	def _scatter_type(self, n_points):
+		"""Returns 'scattergl' if <n_points> is above WEBGL_THRESHOLD,
+		otherwise 'scatter'. Both take the same arguments for the
+		markers, lines, colors and legend used here."""
+		if self.WEBGL_THRESHOLD is not None and n_points > self.WEBGL_THRESHOLD:
+			return 'scattergl'
+		return 'scatter'
+	
+	def _new_legendgroup(self):
+		"""Returns a legend group name not used before in this figure."""
+		self._n_legendgroups = getattr(self, '_n_legendgroups', 0) + 1
+		return f'legendgroup {self._n_legendgroups}'
+	
 	def _draw_histogram(self, histogram):
 		if not isinstance(histogram, Histogram):
 			raise TypeError(f'<histogram> must be an instance of {Histogram}, received object of type {type(histogram)}.')
+		if self.COMPACT_HISTOGRAM_THRESHOLD is not None and len(histogram.bin_edges)-1 > self.COMPACT_HISTOGRAM_THRESHOLD:
+			self._draw_compact_histogram(histogram)
+			return
 		x = np.array(histogram.x) # Make a copy to avoid touching the original data.
 		x[0] = x[1] - (x[3]-x[1]) # Plotly does not plot points in infinity.
 		x[-1] = x[-2] + (x[-2]-x[-4]) # Plotly does not plot points in infinity.
-		legendgroup = str(np.random.rand(3))
+		legendgroup = self._new_legendgroup()
+		bin_centers = x[::2] + (x[1::2]-x[::2])/2
 		# The following trace is the histogram lines ---
-		self.plotly_figure.add_traces(
-			go.Scatter(
+		self._trace_dicts.append(
+			dict(
+				type = 'scatter',
 				x = x, 
 				y = histogram.y,
 				opacity = histogram.alpha,
 				mode = 'lines',
+				marker = dict(
+					color = rgb2hexastr_color(histogram.color),
+				),
 				line = dict(
 					dash = map_linestyle_to_Plotly_linestyle(histogram.linestyle),
+					width = histogram.linewidth,
 				),
 				legendgroup = legendgroup,
 				showlegend = False,
 				hoverinfo='skip',
 			)
 		)
-		self.plotly_figure['data'][-1]['marker']['color'] = rgb2hexastr_color(histogram.color)
-		self.plotly_figure['data'][-1]['line']['width'] = histogram.linewidth
 		# The following trace adds the markers in the middle of each bin ---
 		if histogram.marker is not None:
-			self.plotly_figure.add_traces(
-				go.Scatter(
-					x = [x[2*i] + (x[2*i+1]-x[2*i])/2 for i in range(int(len(x)/2))],
+			self._trace_dicts.append(
+				dict(
+					type = 'scatter',
+					x = bin_centers,
 					y = histogram.y[::2],
 					name = histogram.label,
 					mode = 'markers',
-					marker_symbol = map_marker_to_Plotly_markers(histogram.marker),
+					marker = dict(
+						symbol = map_marker_to_Plotly_markers(histogram.marker),
+						color = rgb2hexastr_color(histogram.color),
+					),
 					opacity = histogram.alpha,
 					line = dict(
 						dash = map_linestyle_to_Plotly_linestyle(histogram.linestyle),
@@ -193,18 +328,22 @@ class PlotlyFigure(Figure):
 					showlegend = False,
 				)
 			)
-			self.plotly_figure['data'][-1]['marker']['color'] = rgb2hexastr_color(histogram.color)
 		# The following trace adds the hover texts ---
-		self.plotly_figure.add_traces(
-			go.Scatter(
-				x = [x[2*i] + (x[2*i+1]-x[2*i])/2 for i in range(int(len(x)/2))],
+		self._trace_dicts.append(
+			dict(
+				type = 'scatter',
+				x = bin_centers,
 				y = histogram.y[::2],
 				name = histogram.label,
 				mode = 'lines',
-				marker_symbol = map_marker_to_Plotly_markers(histogram.marker),
+				marker = dict(
+					symbol = map_marker_to_Plotly_markers(histogram.marker),
+					color = rgb2hexastr_color(histogram.color),
+				),
 				opacity = histogram.alpha,
 				line = dict(
 					dash = map_linestyle_to_Plotly_linestyle(histogram.linestyle),
+					width = 0,
 				),
 				legendgroup = legendgroup,
 				showlegend = False,
@@ -212,26 +351,107 @@ class PlotlyFigure(Figure):
 				hovertemplate = "%{text}",
 			)
 		)
-		self.plotly_figure['data'][-1]['marker']['color'] = rgb2hexastr_color(histogram.color)
-		self.plotly_figure['data'][-1]['line']['width'] = 0
 		# The following trace is to add the item in the legend ---
-		self.plotly_figure.add_traces(
-			go.Scatter(
+		self._trace_dicts.append(
+			dict(
+				type = 'scatter',
 				x = [float('NaN')],
 				y = [float('NaN')],
 				name = histogram.label,
 				mode = translate_marker_and_linestyle_to_Plotly_mode(histogram.marker, histogram.linestyle),
-				marker_symbol = map_marker_to_Plotly_markers(histogram.marker),
+				marker = dict(
+					symbol = map_marker_to_Plotly_markers(histogram.marker),
+					color = rgb2hexastr_color(histogram.color),
+				),
 				opacity = histogram.alpha,
 				showlegend = True if histogram.label != None else False,
 				line = dict(
 					dash = map_linestyle_to_Plotly_linestyle(histogram.linestyle),
+					width = histogram.linewidth,
 				),
 				legendgroup = legendgroup,
 			)
 		)
-		self.plotly_figure['data'][-1]['marker']['color'] = rgb2hexastr_color(histogram.color)
-		self.plotly_figure['data'][-1]['line']['width'] = histogram.linewidth
+	
+	def _draw_compact_histogram(self, histogram):
+		"""Draws <histogram> such that it looks the same as with
+		`_draw_histogram` but much lighter for many bins. The bins are a
+		single trace with two points per bin, one at the lower edge and
+		one at the center, joined with `line_shape='hv'` so the line is a
+		step. The center points have the markers, the others have size 0.
+		The hover text is formatted by the browser from the edges stored
+		in `customdata`. A second trace of fixed size draws the underflow
+		and overflow, whose hover texts have infinite edges that cannot be
+		stored in `customdata`."""
+		bin_edges = np.asarray(histogram.bin_edges, dtype=float)
+		counts = np.asarray(histogram.bin_counts)[1:-1]
+		n_bins = len(counts)
+		legendgroup = self._new_legendgroup()
+		color = rgb2hexastr_color(histogram.color)
+		marker_symbol = map_marker_to_Plotly_markers(histogram.marker)
+		mode = 'lines' if histogram.marker is None else 'lines+markers'
+		line = dict(
+			shape = 'hv',
+			dash = map_linestyle_to_Plotly_linestyle(histogram.linestyle),
+			width = histogram.linewidth,
+		)
+		# The bins ---
+		x = np.empty(2*n_bins+1)
+		x[0:-1:2] = bin_edges[:-1]
+		x[1::2] = bin_edges[:-1] + (bin_edges[1:]-bin_edges[:-1])/2
+		x[-1] = bin_edges[-1]
+		y = np.repeat(counts, 2)
+		y = np.append(y, y[-1])
+		customdata = np.empty((2*n_bins+1, 2)) # Lower and upper edge of the bin of each point.
+		customdata[0:-1:2,0] = customdata[1::2,0] = bin_edges[:-1]
+		customdata[0:-1:2,1] = customdata[1::2,1] = bin_edges[1:]
+		customdata[-1] = customdata[-2]
+		self._trace_dicts.append(
+			dict(
+				type = 'scatter',
+				x = x,
+				y = y,
+				name = histogram.label,
+				mode = mode,
+				opacity = histogram.alpha,
+				marker = dict(
+					symbol = marker_symbol,
+					color = color,
+					size = np.tile([0,6], n_bins+1)[:-1] if histogram.marker is not None else None, # 6 is Plotly's default size.
+				),
+				line = line,
+				showlegend = True if histogram.label != None else False,
+				legendgroup = legendgroup,
+				customdata = customdata,
+				hovertemplate = 'Bin: [%{customdata[0]}, %{customdata[1]})<br>Count: %{y}',
+			)
+		)
+		# The underflow and overflow ---
+		width_below = bin_edges[1] - bin_edges[0]
+		width_above = bin_edges[-1] - bin_edges[-2]
+		underflow, overflow = histogram.bin_counts[0], histogram.bin_counts[-1]
+		underflow_text = f'Bin: (-∞, {histogram.bin_edges[0]})<br>Count: {underflow}'
+		overflow_text = f'Bin: [{histogram.bin_edges[-1]},∞)<br>Count: {overflow}'
+		self._trace_dicts.append(
+			dict(
+				type = 'scatter',
+				x = [bin_edges[0]-width_below, bin_edges[0]-width_below/2, bin_edges[0], bin_edges[0], float('NaN'), bin_edges[-1], bin_edges[-1], bin_edges[-1]+width_above/2, bin_edges[-1]+width_above],
+				y = [underflow, underflow, underflow, counts[0], float('NaN'), counts[-1], overflow, overflow, overflow],
+				name = histogram.label,
+				mode = mode,
+				opacity = histogram.alpha,
+				marker = dict(
+					symbol = marker_symbol,
+					color = color,
+					size = [0,6,0,0,0,0,0,6,0] if histogram.marker is not None else None,
+				),
+				line = line,
+				showlegend = False,
+				legendgroup = legendgroup,
+				text = [underflow_text]*4 + [''] + [overflow_text]*4,
+				hovertemplate = '%{text}',
+			)
+		)
 	
 	def _draw_heatmap(self, heatmap):
 		if not isinstance(heatmap, Heatmap):
@@ -244,8 +464,9 @@ class PlotlyFigure(Figure):
 			with warnings.catch_warnings():
 				warnings.filterwarnings("ignore", message="invalid value encountered in log")
 				z = np.log(z)
-		self.plotly_figure.add_trace(
-			go.Heatmap(
+		self._trace_dicts.append(
+			dict(
+				type = 'heatmap',
 				x = x,
 				y = y,
 				z = z,
@@ -259,7 +480,7 @@ class PlotlyFigure(Figure):
 				hovertemplate = f'{(self.xlabel if self.xlabel is not None else "x")}: %{{x}}<br>{(self.ylabel if self.ylabel is not None else "y")}: %{{y}}<br>{(heatmap.zlabel if heatmap.zlabel is not None else "color scale")}: %{{z}}<extra></extra>', # https://community.plotly.com/t/heatmap-changing-x-y-and-z-label-on-tooltip/23588/6
 			)
 		)
-		self.plotly_figure.update_layout(legend_orientation="h")
+		self._plotly_figure.update_layout(legend_orientation="h")
 	
 	def _draw_contour(self, contour):
 		if not isinstance(contour, Contour):
@@ -277,8 +498,9 @@ class PlotlyFigure(Figure):
 		if hasattr(contour.contours, '__iter__'):
 			raise NotImplementedError(f'An iterable specifying which contours to use was not yet implemented. Only implemented an integer number specifying number of equidistant contours.')
 		n_contours = contour.contours
-		self.plotly_figure.add_trace(
-			go.Contour(
+		self._trace_dicts.append(
+			dict(
+				type = 'contour',
 				x = x,
 				y = y,
 				z = z,
@@ -302,7 +524,7 @@ class PlotlyFigure(Figure):
 				)
 			)
 		)
-		self.plotly_figure.update_layout(legend_orientation="h")
+		self._plotly_figure.update_layout(legend_orientation="h")
 		
 def translate_marker_and_linestyle_to_Plotly_mode(marker, linestyle):
 	"""<marker> and <linestyle> are each one and only one of the valid
@@ -1,4 +1,6 @@
 from .FigureManager import FigureManager
+from .binning import StreamingHistogram
+from .spec import FigureSpec
 
 manager = FigureManager()
 
@@ -6,9 +8,25 @@ def new(*args, **kwargs):
 	"""A shorthand wrapper around grafica.manager.new"""
 	return manager.new(*args, **kwargs)
 
+def replay(*args, **kwargs):
+	"""A shorthand wrapper around grafica.manager.replay"""
+	return manager.replay(*args, **kwargs)
+
 def save_unsaved(*args, **kwargs):
 	"""A shorthand wrapper around grafica.manager.save_unsaved"""
 	return manager.save_unsaved(*args, **kwargs)
 
+def save_dashboard(*args, **kwargs):
+	"""A shorthand wrapper around grafica.manager.save_dashboard"""
+	return manager.save_dashboard(*args, **kwargs)
+
+def save_async(*args, **kwargs):
+	"""A shorthand wrapper around grafica.manager.save_async"""
+	return manager.save_async(*args, **kwargs)
+
+def flush(*args, **kwargs):
+	"""A shorthand wrapper around grafica.manager.flush"""
+	return manager.flush(*args, **kwargs)
+
 def show(*args, **kwargs):
 	return manager.show(*args, **kwargs)
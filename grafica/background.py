@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+import threading
+
+MAX_WORKERS = 2 # Threads of the default `BackgroundSaver`.
+MAX_PENDING = 16 # Saves that can be waiting at the same time in the default `BackgroundSaver`, further calls block until one finishes.
+
+class BackgroundSaver:
+	"""Saves figures in background threads, so the thread that creates
+	them does not wait while they are rendered and written. The number
+	of pending saves is bounded, when it is reached `submit` blocks until
+	one finishes, so a producer faster than the disk cannot accumulate
+	figures in memory without limit."""
+	def __init__(self, max_workers=None, max_pending=None):
+		"""- max_workers: Number of threads, default is MAX_WORKERS.
+		- max_pending: Maximum number of saves submitted and not yet
+		finished, default is MAX_PENDING."""
+		max_workers = MAX_WORKERS if max_workers is None else max_workers
+		max_pending = MAX_PENDING if max_pending is None else max_pending
+		for name, value in {'max_workers': max_workers, 'max_pending': max_pending}.items():
+			if not isinstance(value, int) or isinstance(value, bool):
+				raise TypeError(f'<{name}> must be an integer number, received {value} of type {type(value)}.')
+			if value < 1:
+				raise ValueError(f'<{name}> must be a positive integer, received {value}.')
+		self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='grafica_save')
+		self._slots = threading.BoundedSemaphore(max_pending)
+		self._pending = set()
+		self._lock = threading.Lock()
+
+	def submit(self, figure, file_name=None, **kwargs):
+		"""Calls `figure.save(file_name, **kwargs)` in a background thread
+		and then `figure.close()`, and returns a concurrent.futures.Future
+		with the path to the file. <figure> must not be modified after
+		this, use `Figure.save_async` to save a snapshot."""
+		self._slots.acquire()
+		try:
+			future = self._executor.submit(_save_and_close, figure, file_name, kwargs)
+		except BaseException:
+			self._slots.release()
+			raise
+		with self._lock:
+			self._pending.add(future)
+		future.add_done_callback(self._finished)
+		return future
+
+	def _finished(self, future):
+		with self._lock:
+			self._pending.discard(future)
+		self._slots.release()
+
+	@property
+	def pending(self):
+		"""Number of saves submitted and not yet finished."""
+		with self._lock:
+			return len(self._pending)
+
+	def flush(self, timeout=None):
+		"""Waits until all the saves submitted so far are finished, or for
+		at most <timeout> seconds. Returns the number of saves that are
+		still pending, i.e. 0 unless the timeout expired."""
+		with self._lock:
+			pending = list(self._pending)
+		done, not_done = wait(pending, timeout=timeout)
+		return len(not_done)
+
+def _save_and_close(figure, file_name, kwargs):
+	try:
+		return figure.save(file_name=file_name, **kwargs)
+	finally:
+		figure.close()
+
+saver = BackgroundSaver() # Used by default by `Figure.save_async`, its threads are started when needed.
@@ -0,0 +1,259 @@
+import numpy as np
+from .samples import load_samples, is_iterator, iter_windows, finite_range, validate_workers, map_in_parallel
+import warnings
+from pathlib import Path
+
+class StreamingHistogram:
+	"""An accumulating histogram with a fixed binning. Samples are given
+	in chunks through the `fill` method and only the counts are kept,
+	so the memory is bounded by the number of bins and not by the number
+	of samples. It can be drawn at any point with `Figure.histogram`.
+
+	Example
+	-------
+	```
+	import grafica
+	import numpy as np
+
+	histogram = grafica.StreamingHistogram(bins=99, range=(-3,3))
+	for _ in range(9):
+		histogram.fill(np.random.randn(999999))
+	figure = grafica.new()
+	figure.histogram(histogram)
+	```
+	"""
+	def __init__(self, bins, range=None):
+		"""- bins: Either an iterable with the bin edges, monotonically
+		increasing, or an integer number of equal width bins. In the
+		latter case <range> must be specified.
+		- range: Tuple of the form (lower, upper) with the lower and
+		upper edges of the bins. Only used when <bins> is an integer."""
+		if isinstance(bins, (int, np.integer)):
+			if range is None:
+				raise ValueError(f'When <bins> is an integer number, <range> must be specified.')
+			try:
+				lower, upper = [float(_) for _ in range]
+			except:
+				raise ValueError(f'<range> must be a tuple of the form (lower, upper) with lower and upper float numbers, received {range}.')
+			if bins < 1:
+				raise ValueError(f'<bins> must be a positive integer, received {bins}.')
+			bin_edges = np.linspace(lower, upper, bins+1)
+		elif hasattr(bins, '__iter__') and not isinstance(bins, str):
+			if range is not None:
+				raise ValueError(f'<range> can only be specified when <bins> is an integer number.')
+			bin_edges = np.array(bins, dtype=float)
+		else:
+			raise TypeError(f'<bins> must be an integer number or an iterable with the bin edges, received {bins} of type {type(bins)}.')
+		bin_edges = validate_bin_edges(bin_edges)
+		self._bin_edges = bin_edges
+		self._counts = np.zeros(len(bin_edges)-1, dtype=np.int64)
+		self._underflow = 0
+		self._overflow = 0
+		self._top_edge_count = 0 # Samples exactly on the upper edge of the last bin, they are also counted in the overflow.
+		self._nan_count = 0
+		self._inf_count = 0
+		self._entries = 0
+
+	def fill(self, samples, workers=None):
+		"""Adds <samples> to the histogram.
+		- samples: A 1D iterable with the samples, e.g. one chunk of a
+		larger data set. It can also be a numpy.memmap, a path to a
+		`.npy` file or an iterator yielding chunks of samples, which are
+		read in windows without loading all of them into memory.
+		- workers: Number of processes to bin the samples in parallel,
+		see `tally_samples`."""
+		if not hasattr(samples, '__iter__') and not isinstance(samples, Path):
+			raise ValueError(f'<samples> must be iterable.')
+		samples = load_samples(samples)
+		if is_iterator(samples):
+			for window, _ in iter_windows(samples):
+				self.fill(window, workers=workers)
+			return self
+		tally = tally_samples(samples, self._bin_edges, workers=workers)
+		self._counts += tally[_FIRST_BIN:_FIRST_BIN+len(self._counts)]
+		self._underflow += int(tally[_NEG_INF] + tally[_BELOW])
+		self._overflow += int(tally[-4] + tally[-3] + tally[-2])
+		self._top_edge_count += int(tally[-4])
+		self._nan_count += int(tally[-1])
+		self._inf_count += int(tally[_NEG_INF] + tally[-2])
+		self._entries += int(tally.sum())
+		return self
+	
+	@property
+	def bin_edges(self):
+		return self._bin_edges
+
+	@property
+	def counts(self):
+		"""Number of samples in each bin, each bin is [lower, upper)."""
+		return self._counts
+
+	@property
+	def underflow(self):
+		"""Number of samples below the lower edge of the first bin,
+		including -inf."""
+		return self._underflow
+
+	@property
+	def overflow(self):
+		"""Number of samples equal or above the upper edge of the last
+		bin, including +inf."""
+		return self._overflow
+
+	@property
+	def nan_count(self):
+		return self._nan_count
+
+	@property
+	def inf_count(self):
+		"""Number of samples that are either +inf or -inf."""
+		return self._inf_count
+
+	@property
+	def entries(self):
+		"""Total number of samples that were filled, including NaN."""
+		return self._entries
+
+def histogram_bin_edges(samples, bins):
+	"""Same as numpy.histogram_bin_edges but ignoring NaN and inf, for
+	<samples> as returned by `samples.load_samples`. For numpy.memmap
+	and integer <bins> the samples are read in windows. Iterators can
+	be read only once, so for them <bins> must be the bin edges."""
+	if not isinstance(bins, str) and np.ndim(bins) != 0:
+		return np.asarray(bins)
+	if is_iterator(samples):
+		raise ValueError(f'When <samples> is an iterator <bins> must be an iterable with the bin edges, because the samples can be read only once.')
+	if isinstance(samples, np.memmap):
+		if not isinstance(bins, str): # Only the range is needed.
+			minimum, maximum = finite_range(samples)
+			return np.histogram_bin_edges(
+				np.array([] if minimum is None else [minimum, maximum], dtype=samples.dtype),
+				bins = bins,
+			)
+		warnings.warn(f'Computing the bins with bins={repr(bins)} requires loading all the samples into memory. To avoid this, use an integer number of bins or give the bin edges.')
+	finite = np.isfinite(samples)
+	return np.histogram_bin_edges(
+		samples if finite.all() else samples[finite],
+		bins = bins,
+	)
+
+def validate_bin_edges(bin_edges):
+	bin_edges = np.asarray(bin_edges, dtype=float)
+	if bin_edges.ndim != 1 or len(bin_edges) < 2:
+		raise ValueError(f'The bin edges must be a 1D array with at least two elements.')
+	if not np.isfinite(bin_edges).all():
+		raise ValueError(f'The bin edges must be finite numbers.')
+	if (np.diff(bin_edges) <= 0).any():
+		raise ValueError(f'The bin edges must be monotonically increasing.')
+	return bin_edges
+
+CHUNK_SIZE = 2**16 # Number of samples that are binned at once. This bounds the temporary memory used by `tally_samples` and keeps it within the CPU cache.
+MIN_SAMPLES_PER_WORKER = 2**20 # With less samples than this per process it is faster to bin them in the main process.
+MAX_INTEGER_VALUES = 2**24 # Integer samples spanning more values than this are binned as floats.
+
+# Layout of the array returned by `tally_samples`, being K the number of bins:
+_NEG_INF = 1 # -inf.
+_BELOW = 2 # Finite samples below the first bin.
+_FIRST_BIN = 3 # From here, K elements with the counts of each bin.
+# Then, starting at _FIRST_BIN+K: samples equal to the upper edge of the last bin, finite samples above it, +inf and NaN.
+
+def tally_samples(samples, bin_edges, workers=None):
+	"""Counts <samples> into the bins defined by <bin_edges> in a single
+	pass and returns an integer array of length len(bin_edges)+6, see the
+	layout above. Each bin is [lower, upper).
+	If <workers> is an integer greater than 1, the samples are split in
+	pieces that are binned by a pool of that many processes and then the
+	counts are added, the result is exactly the same.
+	Each sample is assigned one slot of the layout at once: for uniform
+	bins the slot is computed with arithmetic and then corrected by
+	comparing with the edges, otherwise with `numpy.searchsorted` against
+	the edges extended with sentinels. Then the slots are counted with
+	`numpy.bincount`. Integer samples are first counted per value with
+	`numpy.bincount`, and then the values are binned."""
+	bin_edges = np.asarray(bin_edges, dtype=float)
+	extended_edges = np.concatenate([
+		[-np.inf, np.nextafter(-np.inf, 0)],
+		bin_edges,
+		[np.nextafter(bin_edges[-1], np.inf), np.inf, np.nan],
+	])
+	samples = np.asarray(samples).ravel()
+	if samples.dtype.kind not in 'biuf':
+		samples = samples.astype(float)
+	tally = np.zeros(len(extended_edges)+1, dtype=np.int64)
+	if len(samples) == 0:
+		return tally
+	workers = validate_workers(workers)
+	if workers > 1 and len(samples) >= MIN_SAMPLES_PER_WORKER*workers:
+		return _tally_samples_in_parallel(samples, bin_edges, workers)
+	if samples.dtype.kind in 'biu':
+		values, value_counts = _count_integer_values(samples)
+		if values is not None:
+			slots = _find_slots(values, extended_edges)
+			tally += np.bincount(slots, weights=value_counts, minlength=len(tally)).astype(np.int64)
+			return tally
+	for start in range(0, len(samples), CHUNK_SIZE):
+		slots = _find_slots(samples[start:start+CHUNK_SIZE], extended_edges)
+		tally += np.bincount(slots, minlength=len(tally))
+	return tally
+
+def _find_slots(samples, extended_edges):
+	"""Returns the slot (in the layout of `tally_samples`) of each sample."""
+	bin_edges = extended_edges[2:-3]
+	n_bins = len(bin_edges) - 1
+	if not _are_uniform(bin_edges):
+		return np.searchsorted(extended_edges, samples, side='right')
+	# Uniform bins, the slot is computed with arithmetic. Rounding errors can make it off by one, this is corrected below using the edges.
+	with np.errstate(over='ignore', invalid='ignore'):
+		slots = samples - bin_edges[0]
+		slots *= n_bins/(bin_edges[-1]-bin_edges[0])
+		slots += _FIRST_BIN
+		np.clip(slots, _NEG_INF, len(extended_edges)-1, out=slots) # -inf and +inf already fall in their slots.
+		is_nan = np.isnan(slots)
+		if is_nan.any():
+			slots[is_nan] = len(extended_edges) # NaN falls in its slot.
+		slots = slots.astype(np.intp)
+		samples_edges = np.append(extended_edges, np.nan)
+		slots -= samples < samples_edges[slots-1]
+		slots += samples >= samples_edges[slots]
+		# The slot for samples equal to the upper edge is only one ulp wide, so a sample slightly above it can still be one slot below:
+		on_top_edge = slots == _FIRST_BIN + n_bins
+		slots[on_top_edge] += samples[on_top_edge] != bin_edges[-1]
+	return slots
+
+def _are_uniform(bin_edges):
+	widths = np.diff(bin_edges)
+	return np.allclose(widths, widths[0], rtol=1e-9, atol=0)
+
+def _count_integer_values(samples):
+	"""If the range of the integer <samples> is not too large, counts
+	how many times each value appears. Returns (values, counts), or
+	(None, None) if the range is too large to do this efficiently or
+	the values do not fit in np.intp (e.g. uint64 above 2**63)."""
+	lowest = int(samples.min())
+	highest = int(samples.max())
+	if lowest < np.iinfo(np.intp).min or highest > np.iinfo(np.intp).max:
+		return None, None
+	n_values = highest - lowest + 1
+	if n_values > max(len(samples), 2**16) or n_values > MAX_INTEGER_VALUES:
+		return None, None
+	value_counts = np.zeros(n_values, dtype=np.int64)
+	for start in range(0, len(samples), CHUNK_SIZE):
+		chunk = samples[start:start+CHUNK_SIZE]
+		if lowest != 0 or chunk.dtype.kind == 'b':
+			chunk = chunk.astype(np.intp) - lowest
+		value_counts += np.bincount(chunk, minlength=n_values)
+	values = np.arange(lowest, highest+1)
+	return values[value_counts>0], value_counts[value_counts>0]
+
+def _tally_piece(samples, start, stop, bin_edges):
+	return tally_samples(samples[start:stop], bin_edges)
+
+def _tally_samples_in_parallel(samples, bin_edges, workers):
+	bounds = np.linspace(0, len(samples), 4*workers+1).astype(int) # A few pieces per worker to balance the load.
+	tallies = map_in_parallel(
+		_tally_piece,
+		shared = samples,
+		arguments = [(start, stop, bin_edges) for start,stop in zip(bounds[:-1], bounds[1:])],
+		workers = workers,
+	)
+	return np.sum(tallies, axis=0)
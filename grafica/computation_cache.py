@@ -0,0 +1,185 @@
+import numpy as np
+from collections import OrderedDict
+import hashlib
+import mmap
+import os
+import threading
+from .samples import WINDOW_SIZE
+
+MAX_BYTES = 2**28 # Default size limit of a `ComputationCache`.
+MAX_MEMOIZED_FINGERPRINTS = 2**10 # Fingerprints of memory mapped arrays kept by `fingerprint`.
+
+class ComputationCache:
+	"""A memory-bounded least-recently-used cache for the results of
+	computing traces, e.g. the counts of a Histogram or the curve of a
+	KDE, so that drawing the same samples with the same arguments again,
+	for instance in several figures, does not compute them again. The
+	keys are built with `fingerprint`. It is opt-in, see `enable`."""
+	def __init__(self, max_bytes=None):
+		"""- max_bytes: Limit to the bytes of the numpy arrays kept in the
+		cache. Default is MAX_BYTES."""
+		max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+		if not isinstance(max_bytes, int) or isinstance(max_bytes, bool):
+			raise TypeError(f'<max_bytes> must be an integer number, received {max_bytes} of type {type(max_bytes)}.')
+		if max_bytes < 0:
+			raise ValueError(f'<max_bytes> must be positive, received {max_bytes}.')
+		self._max_bytes = max_bytes
+		self._entries = OrderedDict() # {key: (value, nbytes)}, the least recently used first.
+		self._size = 0
+		self._hits = 0
+		self._misses = 0
+		self._evictions = 0
+		self._lock = threading.Lock()
+
+	@property
+	def max_bytes(self):
+		return self._max_bytes
+
+	@property
+	def size(self):
+		"""Bytes of the arrays in the cache."""
+		return self._size
+
+	@property
+	def hits(self):
+		return self._hits
+
+	@property
+	def misses(self):
+		return self._misses
+
+	@property
+	def evictions(self):
+		"""Number of entries deleted to respect <max_bytes>."""
+		return self._evictions
+
+	def __len__(self):
+		return len(self._entries)
+
+	def statistics(self):
+		"""Returns a dict with the hits, misses, evictions, entries and size."""
+		with self._lock:
+			return {'hits': self._hits, 'misses': self._misses, 'evictions': self._evictions, 'entries': len(self._entries), 'size': self._size}
+
+	def get(self, key, compute):
+		"""Returns the value of <key>. If it is not in the cache, it is
+		computed as `compute()` and added. If <key> is None, the value is
+		just computed."""
+		if key is None:
+			return compute()
+		with self._lock:
+			if key in self._entries:
+				self._entries.move_to_end(key)
+				self._hits += 1
+				return self._entries[key][0]
+			self._misses += 1
+		value = compute() # Not holding the lock, so other threads can use the cache meanwhile.
+		nbytes = _nbytes(value)
+		with self._lock:
+			if key not in self._entries and nbytes <= self._max_bytes:
+				self._entries[key] = (value, nbytes)
+				self._size += nbytes
+				while self._size > self._max_bytes:
+					_, (_, evicted_nbytes) = self._entries.popitem(last=False)
+					self._size -= evicted_nbytes
+					self._evictions += 1
+		return value
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self._size = 0
+
+_cache = None
+
+def enable(max_bytes=None):
+	"""Starts using a new ComputationCache for all the Histogram and KDE
+	traces, and returns it."""
+	global _cache
+	_cache = ComputationCache(max_bytes)
+	return _cache
+
+def disable():
+	"""Stops using the cache, traces are always computed."""
+	global _cache
+	_cache = None
+
+def get_cache():
+	"""Returns the ComputationCache in use, or None if it is disabled."""
+	return _cache
+
+def fingerprint(value):
+	"""Returns a hashable object that identifies <value> by its content,
+	to be used in the keys of a ComputationCache, or None if this is not
+	possible (then the value is not cached).
+	- Numpy arrays (also numpy.memmap) and lists of numbers: their type,
+	shape and a SHA-256 hash of their bytes, which takes about 1 ms per
+	MB. Arrays are read in windows, so numpy.memmap is not loaded into
+	memory. The hash of arrays memory mapped read only from a file (e.g.
+	samples given as the path to a `.npy` file) is computed only once
+	while the file is not modified, so hits with them are immediate.
+	- Strings, numbers and None: their type and themselves, so that
+	e.g. 1, 1.0 and True are different.
+	- Tuples of any of these: the fingerprint of each element.
+	- Anything else (e.g. iterators or functions): None."""
+	if value is None or isinstance(value, (bool, int, float, str, np.generic)):
+		return (type(value).__name__, value)
+	if isinstance(value, tuple):
+		items = tuple(fingerprint(_) for _ in value)
+		return None if any(item is None for item in items) else ('tuple',) + items
+	if isinstance(value, list):
+		if not all(isinstance(_, (bool, int, float, np.number)) for _ in value):
+			return None
+		value = np.asarray(value)
+	if isinstance(value, np.ndarray):
+		if value.dtype.hasobject:
+			return None
+		memo_key = _memo_key(value)
+		with _memoized_fingerprints_lock:
+			if memo_key in _memoized_fingerprints:
+				_memoized_fingerprints.move_to_end(memo_key)
+				return _memoized_fingerprints[memo_key]
+		digest = hashlib.sha256()
+		flat = value.reshape(-1) if value.ndim != 1 else value
+		for start in range(0, len(flat), WINDOW_SIZE):
+			digest.update(np.ascontiguousarray(flat[start:start+WINDOW_SIZE]).view(np.uint8))
+		result = ('array', value.dtype.str, value.shape, digest.hexdigest())
+		if memo_key is not None:
+			with _memoized_fingerprints_lock:
+				_memoized_fingerprints[memo_key] = result
+				if len(_memoized_fingerprints) > MAX_MEMOIZED_FINGERPRINTS:
+					_memoized_fingerprints.popitem(last=False)
+		return result
+	return None
+
+_memoized_fingerprints = OrderedDict() # {`_memo_key`: fingerprint}, the least recently used first.
+_memoized_fingerprints_lock = threading.Lock()
+
+def _memo_key(array):
+	"""Returns what identifies the content of <array> without reading it,
+	if it is memory mapped read only from a file: the file, its size and
+	modification time, and the position and layout of <array> in it.
+	Otherwise returns None, because the array could be modified."""
+	if not isinstance(array, np.memmap) or array.mode != 'r' or array.filename is None:
+		return None
+	buffer = array
+	while isinstance(buffer, np.ndarray) and buffer.base is not None:
+		buffer = buffer.base
+	if not isinstance(buffer, mmap.mmap):
+		return None
+	try:
+		stat = os.stat(array.filename)
+	except OSError:
+		return None
+	# The mmap starts at the offset of the array rounded down to the granularity, see numpy.memmap.
+	position = array.offset - array.offset%mmap.ALLOCATIONGRANULARITY + array.__array_interface__['data'][0] - np.frombuffer(buffer, dtype=np.uint8).__array_interface__['data'][0]
+	return (array.filename, stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, position, array.dtype.str, array.shape, array.strides)
+
+def _nbytes(value):
+	if isinstance(value, np.ndarray):
+		return value.nbytes
+	if isinstance(value, (list, tuple)):
+		return sum(_nbytes(_) for _ in value)
+	if hasattr(value, '__dict__'):
+		return _nbytes(list(vars(value).values()))
+	return 0
@@ -0,0 +1,85 @@
+import numpy as np
+
+VALID_DECIMATIONS = {'minmax','lttb'}
+
+def decimate(x, y, max_points, method='minmax'):
+	"""Returns the sorted indices of at most <max_points> points of the
+	line given by <x> and <y> that look the same when drawn, so that huge
+	traces can be rendered fast. If there are less than <max_points>
+	points, all of them are returned.
+	- method: One of {'minmax','lttb'}, see `min_max_indices` and
+	`lttb_indices`."""
+	if method not in VALID_DECIMATIONS:
+		raise ValueError(f'<method> must be one of {VALID_DECIMATIONS}, received {repr(method)}.')
+	if not isinstance(max_points, (int, np.integer)) or isinstance(max_points, bool):
+		raise TypeError(f'<max_points> must be an integer number, received {max_points} of type {type(max_points)}.')
+	if max_points < 4:
+		raise ValueError(f'<max_points> must be at least 4, received {max_points}.')
+	x = np.asarray(x)
+	y = np.asarray(y, dtype=float)
+	if len(x) <= max_points:
+		return np.arange(len(x))
+	if method == 'lttb':
+		return lttb_indices(x, y, max_points)
+	return min_max_indices(x, y, max_points)
+
+def min_max_indices(x, y, max_points):
+	"""Splits the points in max_points/4 columns and keeps the first, the
+	last, the lowest and the highest point of each, so the extrema and the
+	envelope of the line are exactly preserved. If <x> is increasing the
+	columns have the same width in x, like the pixel columns of the plot,
+	otherwise they have the same number of points. NaN values of <y> are
+	ignored."""
+	n_columns = max_points//4
+	column = _column_of_each_point(x, n_columns)
+	starts = np.concatenate([[0], np.flatnonzero(np.diff(column))+1])
+	stops = np.append(starts[1:], len(y))
+	indices = [starts, stops-1]
+	with np.errstate(invalid='ignore'):
+		for reduce in [np.fmin, np.fmax]:
+			extremes = np.repeat(reduce.reduceat(y, starts), stops-starts)
+			candidates = np.flatnonzero(y == extremes) # Where there are ties, take the first one of each column.
+			indices.append(candidates[np.concatenate([[True], np.diff(column[candidates]) != 0])])
+	return np.unique(np.concatenate(indices))
+
+def _column_of_each_point(x, n_columns):
+	n = len(x)
+	if x.dtype.kind in 'iuf' and np.isfinite(x[[0,-1]]).all() and x[-1] > x[0]:
+		with np.errstate(invalid='ignore'):
+			is_increasing = (np.diff(x) >= 0).all()
+		if is_increasing:
+			column = (x - x[0])*(n_columns/(x[-1]-x[0]))
+			return np.minimum(column.astype(np.intp), n_columns-1)
+	return np.arange(n)*n_columns//n
+
+def lttb_indices(x, y, max_points):
+	"""Largest Triangle Three Buckets algorithm, see S. Steinarsson,
+	"Downsampling Time Series for Visual Representation" (2013). The
+	first and last points are kept and the others are split in buckets
+	with the same number of points, from each one the point forming the
+	largest triangle with the point kept in the previous bucket and the
+	average of the next bucket is kept. This is better at preserving the
+	shape of the line than `min_max_indices`, but an extreme is not
+	always kept. If <x> is not numeric, the index is used instead."""
+	n = len(y)
+	if x.dtype.kind not in 'iuf':
+		x = np.arange(n)
+	x = np.asarray(x, dtype=float)
+	bounds = np.linspace(1, n-1, max_points-1).astype(np.intp)
+	x_averages = np.add.reduceat(x[1:n-1], bounds[:-1]-1)/np.diff(bounds)
+	with np.errstate(invalid='ignore'):
+		y_averages = np.add.reduceat(np.nan_to_num(y[1:n-1]), bounds[:-1]-1)/np.diff(bounds)
+	indices = np.empty(max_points, dtype=np.intp)
+	indices[0] = 0
+	indices[-1] = n-1
+	for bucket, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+		a = indices[bucket]
+		if bucket+1 < len(x_averages):
+			next_x, next_y = x_averages[bucket+1], y_averages[bucket+1]
+		else:
+			next_x, next_y = x[-1], y[-1]
+		with np.errstate(invalid='ignore'):
+			areas = np.abs((x[a]-next_x)*(y[start:stop]-y[a]) - (x[a]-x[start:stop])*(next_y-y[a]))
+		areas[np.isnan(areas)] = -1
+		indices[bucket+1] = start + np.argmax(areas)
+	return indices
@@ -1,7 +1,12 @@
 import numpy as np
-from .traces import Trace, Scatter, ErrorBand, Histogram, KDE, Heatmap, Contour
+from .traces import Trace, Scatter, ScatterMany, ErrorBand, Histogram, KDE, Heatmap, Contour
+from . import background
+from concurrent.futures import wait
+import itertools
 
 _VALID_AXIS_SCALES = {'lin','log'}
+_clock = itertools.count() # Orders the uses of the figures, see `Figure.last_used`.
+_PROPERTIES = ('title','show_title','subtitle','xlabel','ylabel','xscale','yscale','aspect') # Figure properties, in the order they are set when copying a figure.
 
 class Figure:
 	"""
@@ -12,6 +17,11 @@ class Figure:
 	def __init__(self):
 		self._show_title = True
 		self.traces = []
+		self._deferred = False
+		self._layout_is_outdated = False # Whether the layout changed since it was drawn.
+		self._undrawn_traces = [] # Traces added but not yet drawn.
+		self._pending_saves = [] # Futures returned by `save_async`.
+		self._last_used = next(_clock)
 	
 	def show(self):
 		"""Must override this method when inheriting."""
@@ -27,7 +37,7 @@ class Figure:
 	@title.setter
 	def title(self, title):
 		self._title = str(title)
-		self.draw_layout() # Update the "drawn figure".
+		self._update_layout() # Update the "drawn figure".
 	
 	@property
 	def show_title(self):
@@ -37,7 +47,7 @@ class Figure:
 		if show not in [True, False]:
 			raise TypeError(f'<show_title> expects either True or False, received {show}.')
 		self._show_title = show
-		self.draw_layout() # Update the "drawn figure".
+		self._update_layout() # Update the "drawn figure".
 	
 	@property
 	def subtitle(self):
@@ -45,7 +55,7 @@ class Figure:
 	@subtitle.setter
 	def subtitle(self, subtitle):
 		self._subtitle = str(subtitle)
-		self.draw_layout() # Update the "drawn figure".
+		self._update_layout() # Update the "drawn figure".
 	
 	@property
 	def xlabel(self):
@@ -53,7 +63,7 @@ class Figure:
 	@xlabel.setter
 	def xlabel(self, xlabel):
 		self._xlabel = str(xlabel)
-		self.draw_layout() # Update the "drawn figure".
+		self._update_layout() # Update the "drawn figure".
 	
 	@property
 	def ylabel(self):
@@ -61,7 +71,7 @@ class Figure:
 	@ylabel.setter
 	def ylabel(self, ylabel):
 		self._ylabel = str(ylabel)
-		self.draw_layout() # Update the "drawn figure".
+		self._update_layout() # Update the "drawn figure".
 	
 	@property
 	def xscale(self):
@@ -71,7 +81,7 @@ class Figure:
 		if xscale not in _VALID_AXIS_SCALES:
 			raise ValueError(f'<xscale> must be one of {_VALID_AXIS_SCALES}, received {xscale}.')
 		self._xscale = xscale
-		self.draw_layout() # Update the "drawn figure".
+		self._update_layout() # Update the "drawn figure".
 	
 	@property
 	def yscale(self):
@@ -81,7 +91,7 @@ class Figure:
 		if yscale not in _VALID_AXIS_SCALES:
 			raise ValueError(f'<yscale> must be one of {_VALID_AXIS_SCALES}, received {yscale}.')
 		self._yscale = yscale
-		self.draw_layout() # Update the "drawn figure".
+		self._update_layout() # Update the "drawn figure".
 	
 	@property
 	def aspect(self):
@@ -92,13 +102,121 @@ class Figure:
 		if aspect not in VALID_ASPECTS:
 			raise ValueError(f'<aspect> must be one of {VALID_ASPECTS}, received {aspect}.')
 		self._aspect = aspect
-		self.draw_layout() # Update the "drawn figure".
+		self._update_layout() # Update the "drawn figure".
+	
+	@property
+	def deferred(self):
+		"""If True, the layout and the traces are recorded but they are
+		drawn only once, when `render` is called, which the plotters do
+		at `show` and `save`. Otherwise each change is drawn immediately."""
+		return self._deferred if hasattr(self, '_deferred') else False
+	@deferred.setter
+	def deferred(self, deferred: bool):
+		if deferred not in [True, False]:
+			raise TypeError(f'<deferred> expects either True or False, received {deferred}.')
+		self._deferred = deferred
+		if deferred == False:
+			self.render()
 	
 	def set(self, **kwargs):
+		"""Sets several properties at once, e.g. `set(title='A', xlabel='x')`,
+		and then draws the layout only once."""
 		for key in kwargs.keys():
 			if not hasattr(self, key):
 				raise ValueError(f'Cannot set <{key}>, invalid property.')
-			setattr(self, f'{key}', kwargs[key])
+		if 'deferred' in kwargs:
+			self.deferred = kwargs.pop('deferred')
+		deferred = self.deferred
+		self._deferred = True
+		try:
+			for key in kwargs.keys():
+				setattr(self, f'{key}', kwargs[key])
+		finally:
+			self._deferred = deferred
+		if not self.deferred:
+			self.render()
+	
+	def render(self):
+		"""Draws whatever was recorded and not yet drawn, i.e. the layout
+		if it changed and the traces added while the figure was deferred.
+		Plotters must call this at the beginning of `show` and `save`."""
+		self._last_used = next(_clock)
+		if getattr(self, '_layout_is_outdated', False):
+			self._layout_is_outdated = False
+			self.draw_layout()
+		undrawn_traces = getattr(self, '_undrawn_traces', [])
+		if len(undrawn_traces) > 0:
+			self._undrawn_traces = []
+			self.draw_traces(undrawn_traces)
+	
+	def snapshot(self):
+		"""Returns a new figure of the same plotter with the current
+		properties, settings and traces, which is not affected by later
+		changes to this one nor to the arrays used to create its traces.
+		It is deferred, so nothing is drawn until it is saved or shown.
+		The samples of Histogram and KDE traces are not copied, they are
+		not needed to draw them."""
+		from .spec import FigureSpec # Imported here because it imports this module.
+		return FigureSpec.from_figure(self, copy=True).build(deferred=True)
+	
+	def save_async(self, file_name=None, saver=None, **kwargs):
+		"""Saves the figure in a background thread and returns immediately
+		a concurrent.futures.Future with the path to the file, so the
+		caller does not wait while the figure is rendered and written. What
+		is saved is a `snapshot` taken now, so the figure can keep being
+		modified. Errors are raised by `future.result()`.
+		- saver: The background.BackgroundSaver to use, default is
+		background.saver. If it already has its maximum number of pending
+		saves, this blocks until one finishes.
+		- file_name, kwargs: Same as in `save`."""
+		saver = background.saver if saver is None else saver
+		future = saver.submit(self._snapshot_to_save_async(), file_name=file_name, **kwargs)
+		self._pending_saves = [_ for _ in getattr(self, '_pending_saves', []) if not _.done()] + [future]
+		return future
+	
+	def _snapshot_to_save_async(self):
+		"""Returns the `snapshot` that `save_async` saves and closes in a
+		background thread. Plotters whose figures cannot be used from
+		other threads must override this to return one that can."""
+		return self.snapshot()
+	
+	def flush(self, timeout=None):
+		"""Waits until all the `save_async` calls of this figure are
+		finished, or for at most <timeout> seconds. Returns the list of
+		paths to the files, raises the first error if any save failed."""
+		futures = getattr(self, '_pending_saves', [])
+		done, not_done = wait(futures, timeout=timeout)
+		if len(not_done) > 0:
+			raise TimeoutError(f'{len(not_done)} saves of the figure did not finish within {timeout} seconds.')
+		self._pending_saves = []
+		return [future.result() for future in futures]
+	
+	def close(self):
+		"""Releases the objects held by the plotting package, if any. The
+		figure must not be used afterwards. Plotters holding resources that
+		are not freed with the figure must override this method."""
+		pass
+	
+	@property
+	def last_used(self):
+		"""A number that increases each time any figure is created,
+		modified, rendered, saved or shown, so the figures used least
+		recently have the lowest values."""
+		return getattr(self, '_last_used', 0)
+	
+	def memory_footprint(self):
+		"""Returns an estimate of the bytes of memory used by the figure,
+		i.e. the numpy arrays held by its traces, which are usually most of
+		it. Arrays mapped from files are not counted. Plotters add the
+		arrays held by the plotting package."""
+		return nbytes([vars(trace) for trace in self.traces])
+	
+	def _update_layout(self):
+		self._last_used = next(_clock)
+		if self.deferred:
+			self._layout_is_outdated = True
+		else:
+			self.draw_layout()
 	
 	# Drawing methods --------------------------------------------------
 	# The interface of these methods is defined here, but each specific
@@ -116,7 +234,15 @@ class Figure:
 	def save(self, file_name=None, **kwargs):
 		"""Must override this method when inheriting.
 		This method must save the figure in its current state to a persistent
-		file in the hard drive."""
+		file in the hard drive, and return the path to the file."""
+		raise NotImplementedError(f'Not implemented yet for the plotting package you are using! (Specifically for the class {self.__class__.__name__}.)')
+	
+	def html_div(self, div_id=None, **kwargs):
+		"""Must override this method when inheriting.
+		This method must return an HTML <div> displaying the figure in its
+		current state, to be embedded in a page, e.g. a dashboard. If the
+		div needs a library, e.g. plotly.js, it must not include it.
+		- div_id: The `id` of the div, or None."""
 		raise NotImplementedError(f'Not implemented yet for the plotting package you are using! (Specifically for the class {self.__class__.__name__}.)')
 	
 	def draw_layout(self):
@@ -130,6 +256,12 @@ class Figure:
 		This method must draw the trace object received."""
 		raise NotImplementedError(f'Not implemented yet for the plotting package you are using! (Specifically for the class {self.__class__.__name__}.)')
 	
+	def draw_traces(self, traces):
+		"""Draws several traces, in order. By default it calls `draw_trace`
+		for each of them, plotters can override it to draw them in bulk."""
+		for trace in traces:
+			self.draw_trace(trace)
+	
 	# ------------------------------------------------------------------
 	
 	def add_trace(self, trace: Trace):
@@ -147,7 +279,11 @@ class Figure:
 		if not isinstance(trace, Trace):
 			raise TypeError(f'<trace> must be an instance of Trace, received an object of type {type(trace)}')
 		self.traces.append(trace)
-		self.draw_trace(trace)
+		self._last_used = next(_clock)
+		if self.deferred:
+			self._undrawn_traces.append(trace)
+		else:
+			self.draw_trace(trace)
 	
 	# Methods to ease the life of the user -----------------------------
 	
@@ -159,6 +295,16 @@ class Figure:
 			kwargs['color'] = self.pick_default_color()
 		self.add_trace(Scatter(x, y, **kwargs))
 	
+	def scatter_many(self, x, y, **kwargs):
+		"""Many lines with the same style given by a 2D array <y> with
+		one line per row, and <x> shared by all of them (1D) or one per row
+		(2D). They are stored and drawn as a single trace, use it instead
+		of calling `scatter` for each line when there are many of them.
+		For optional kwargs see documentation of traces.ScatterMany."""
+		if kwargs.get('color') is None:
+			kwargs['color'] = self.pick_default_color()
+		self.add_trace(ScatterMany(x, y, **kwargs))
+	
 	def errorband(self, x, y, lower, higher, **kwargs):
 		"""A Scatter trace with a solid and continuous "error band" going
 		from <y-lower> up to <y+higher>.
@@ -168,7 +314,9 @@ class Figure:
 		self.add_trace(ErrorBand(x, y, lower, higher, **kwargs))
 	
 	def histogram(self, samples, **kwargs):
-		"""Given an array of samples produces a histogram.
+		"""Given an array of samples produces a histogram. <samples> can
+		also be a StreamingHistogram, in which case its current counts
+		are drawn.
 		For optional kwargs see documentation of traces.Histogram."""
 		if kwargs.get('color') is None:
 			kwargs['color'] = self.pick_default_color()
@@ -211,3 +359,23 @@ class Figure:
 		color = self.DEFAULT_COLORS[0]
 		self.DEFAULT_COLORS = self.DEFAULT_COLORS[1:] + [self.DEFAULT_COLORS[0]]
 		return color
+
+def nbytes(value, seen=None):
+	"""Returns the bytes of the numpy arrays in <value>, looking into
+	dicts, lists and tuples. Each array is counted once, also if it is a
+	view of another one. Arrays whose memory belongs to something else,
+	e.g. a numpy.memmap or a mapped file, are not counted."""
+	seen = set() if seen is None else seen
+	if isinstance(value, np.ndarray):
+		base = value
+		while isinstance(base.base, np.ndarray):
+			base = base.base
+		if id(base) in seen or isinstance(base, np.memmap) or base.base is not None:
+			return 0
+		seen.add(id(base))
+		return base.nbytes
+	if isinstance(value, dict):
+		value = list(value.values())
+	if isinstance(value, (list, tuple)):
+		return sum(nbytes(item, seen) for item in value)
+	return 0
@@ -0,0 +1,239 @@
+import numpy as np
+from .samples import iter_windows, validate_workers, map_in_parallel
+
+MAX_MEMORY = 2**26 # Default bytes of temporary memory used to evaluate a KDE exactly.
+FFT_GRID_POINTS_PER_BANDWIDTH = 32 # Resolution of the grid used by `binned_gaussian_kde`, see its documentation for the accuracy.
+FFT_MAX_GRID_SIZE = 2**22
+FFT_KERNEL_CUTOFF = 8 # The kernel is truncated at this number of bandwidths, where it is below 1e-14 of its peak.
+
+class KDEStatistics:
+	"""Weighted statistics of a set of samples needed to build a Gaussian
+	KDE, computed reading the samples in windows. NaN samples are
+	ignored."""
+	def __init__(self, samples, weights=None):
+		"""- samples, weights: As returned by `samples.load_samples`."""
+		self._n_samples = 0
+		self._sum_of_weights = 0
+		self._sum_of_squared_weights = 0
+		self._mean = 0
+		self._sum_of_squared_deviations = 0
+		self._minimum = None
+		self._maximum = None
+		for samples_window, weights_window in iter_windows(samples, weights):
+			samples_window, weights_window = drop_nan(samples_window, weights_window)
+			if len(samples_window) == 0:
+				continue
+			if weights_window is None:
+				sum_of_weights = len(samples_window)
+				sum_of_squared_weights = len(samples_window)
+				mean = samples_window.mean()
+				sum_of_squared_deviations = ((samples_window-mean)**2).sum()
+			else:
+				sum_of_weights = weights_window.sum()
+				sum_of_squared_weights = (weights_window**2).sum()
+				mean = (weights_window*samples_window).sum()/sum_of_weights
+				sum_of_squared_deviations = (weights_window*(samples_window-mean)**2).sum()
+			# Merge with the previous windows, see https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Parallel_algorithm
+			total = self._sum_of_weights + sum_of_weights
+			delta = mean - self._mean
+			self._mean += delta*sum_of_weights/total
+			self._sum_of_squared_deviations += sum_of_squared_deviations + delta**2*self._sum_of_weights*sum_of_weights/total
+			self._sum_of_weights = total
+			self._sum_of_squared_weights += sum_of_squared_weights
+			self._n_samples += len(samples_window)
+			self._minimum = samples_window.min() if self._minimum is None else min(self._minimum, samples_window.min())
+			self._maximum = samples_window.max() if self._maximum is None else max(self._maximum, samples_window.max())
+		if self._n_samples < 2:
+			raise ValueError(f'At least 2 samples that are not NaN are needed to build a KDE, received {self._n_samples}.')
+
+	@property
+	def n_samples(self):
+		return self._n_samples
+
+	@property
+	def sum_of_weights(self):
+		return self._sum_of_weights
+
+	@property
+	def neff(self):
+		"""Effective number of samples, same as in scipy.stats.gaussian_kde."""
+		return self._sum_of_weights**2/self._sum_of_squared_weights
+
+	@property
+	def mean(self):
+		return self._mean
+
+	@property
+	def variance(self):
+		"""Unbiased weighted variance, same as numpy.cov with `aweights`."""
+		return self._sum_of_squared_deviations/(self._sum_of_weights - self._sum_of_squared_weights/self._sum_of_weights)
+
+	@property
+	def minimum(self):
+		return self._minimum
+
+	@property
+	def maximum(self):
+		return self._maximum
+
+def kernel_variance(statistics, bw_method=None):
+	"""Returns the variance of the Gaussian kernel, i.e. the square of
+	the bandwidth, in the same way as scipy.stats.gaussian_kde does.
+	- statistics: A KDEStatistics object.
+	- bw_method: See scipy.stats.gaussian_kde. A callable is not
+	supported because it needs all the samples in memory."""
+	if bw_method is None or bw_method == 'scott':
+		factor = statistics.neff**(-1/5)
+	elif bw_method == 'silverman':
+		factor = (statistics.neff*3/4)**(-1/5)
+	elif np.isscalar(bw_method) and not isinstance(bw_method, str):
+		factor = bw_method
+	else:
+		raise ValueError(f"<bw_method> must be 'scott', 'silverman' or a scalar when the samples are read in windows, received {repr(bw_method)}.")
+	variance = statistics.variance*factor**2
+	if not variance > 0:
+		raise ValueError(f'The bandwidth of the KDE is zero, probably all the samples have the same value.')
+	return variance
+
+def evaluate_gaussian_kde(samples, x, variance, weights=None, sum_of_weights=None, max_memory=None, workers=None, pool='threads'):
+	"""Evaluates at <x> a Gaussian KDE with kernel variance <variance>,
+	reading the samples in windows so that the temporary memory is
+	bounded by <max_memory> bytes. The result is the same as evaluating
+	scipy.stats.gaussian_kde, up to rounding errors.
+	- samples, weights: As returned by `samples.load_samples`.
+	- sum_of_weights: Sum of <weights>, or number of samples if there
+	are no weights. NaN samples are ignored.
+	- workers, pool: If <workers> is given, <x> is split in chunks that
+	are evaluated in parallel by this number of threads or processes,
+	see `samples.map_in_parallel`. <max_memory> is shared among them."""
+	max_memory = MAX_MEMORY if max_memory is None else max_memory
+	workers = validate_workers(workers)
+	x = np.asarray(x, dtype=float)
+	if workers == 1:
+		y = _evaluate_gaussian_kde_in_windows((samples, weights), x, variance, max_memory)
+	else:
+		y = np.concatenate(map_in_parallel(
+			_evaluate_gaussian_kde_in_windows,
+			shared = (samples, weights),
+			arguments = [(x_chunk, variance, max_memory//workers) for x_chunk in np.array_split(x, workers)],
+			workers = workers,
+			pool = pool,
+		))
+	y /= sum_of_weights*(2*np.pi*variance)**.5
+	return y
+
+def _evaluate_gaussian_kde_in_windows(samples_and_weights, x, variance, max_memory):
+	"""Returns the sum of the non normalized kernels of all the samples
+	at each <x>, the temporary arrays have at most <max_memory> bytes."""
+	samples, weights = samples_and_weights
+	y = np.zeros(len(x))
+	if len(x) == 0:
+		return y
+	window_size = max(1, int(max_memory//(8*len(x))))
+	for samples_window, weights_window in iter_windows(samples, weights, window_size=window_size):
+		samples_window, weights_window = drop_nan(samples_window, weights_window)
+		kernel = np.subtract.outer(np.asarray(samples_window, dtype=float), x)
+		kernel **= 2
+		kernel *= -1/(2*variance)
+		np.exp(kernel, out=kernel)
+		if weights_window is None:
+			y += kernel.sum(axis=0)
+		else:
+			y += weights_window @ kernel
+	return y
+
+def evaluate_scipy_kde(kde_function, x, max_memory=None, workers=None, pool='threads'):
+	"""Evaluates the scipy.stats.gaussian_kde object <kde_function> at
+	<x> in chunks of at most <max_memory>/(8*number of samples) points,
+	so that the memory used per chunk is bounded also when the evaluation
+	allocates an array of samples times points. Each point is evaluated
+	independently, so the result is the same as `kde_function(x)`, only
+	chunks with a single point can differ by rounding errors.
+	- workers, pool: If <workers> is given, the chunks are evaluated in
+	parallel by this number of threads or processes, see
+	`samples.map_in_parallel`. <max_memory> is shared among them."""
+	max_memory = MAX_MEMORY if max_memory is None else max_memory
+	workers = validate_workers(workers)
+	x = np.asarray(x, dtype=float)
+	points_per_chunk = max(1, int(max_memory//(8*kde_function.n*workers)))
+	n_chunks = max(int(np.ceil(len(x)/points_per_chunk)), min(workers, len(x)), 1)
+	x_chunks = np.array_split(x, n_chunks)
+	if workers == 1:
+		return np.concatenate([kde_function(x_chunk) for x_chunk in x_chunks])
+	return np.concatenate(map_in_parallel(
+		_evaluate_scipy_kde,
+		shared = kde_function,
+		arguments = [(x_chunk,) for x_chunk in x_chunks],
+		workers = workers,
+		pool = pool,
+	))
+
+def _evaluate_scipy_kde(kde_function, x):
+	return kde_function(x)
+
+def binned_gaussian_kde(samples, x, variance, minimum, maximum, weights=None, sum_of_weights=None):
+	"""Evaluates at <x> a Gaussian KDE with kernel variance <variance>
+	by binning the samples onto a fine grid (linear binning) and
+	convolving it with the kernel using FFT. The cost is O(N+G*log(G)),
+	being N the number of samples and G the number of grid points,
+	instead of O(N*len(x)).
+	The grid has FFT_GRID_POINTS_PER_BANDWIDTH points per bandwidth and
+	spans from <minimum> to <maximum> plus FFT_KERNEL_CUTOFF bandwidths
+	at each side, the KDE is linearly interpolated at <x> and it is 0
+	outside the grid.
+	Accuracy: the linear binning and the linear interpolation each add
+	an error of order (grid spacing/bandwidth)**2 times the curvature of
+	the KDE, about 5/24*(grid spacing/bandwidth)**2 of the maximum where
+	a peak is as narrow as the kernel. With the default 32 points per
+	bandwidth this is ~2e-4 (measured maximum absolute error over 500
+	points, relative to the maximum of the KDE, with and without
+	weights: ~2e-5 for normal, ~1e-4 for Student's t with 2 degrees of
+	freedom and for exponential, and ~2e-4 for 15000 N(0,1) plus 5000
+	N(5,0.05) samples). Doubling the points per bandwidth reduces the
+	error by 4.
+	If the range of the samples is so large compared with the bandwidth
+	that the grid would exceed FFT_MAX_GRID_SIZE points, the spacing is
+	increased and the accuracy degrades accordingly.
+	- samples, weights: As returned by `samples.load_samples`, they are
+	read in windows so the memory is bounded by the grid size.
+	- minimum, maximum: Minimum and maximum of the samples.
+	- sum_of_weights: Sum of <weights>, or number of samples if there
+	are no weights. NaN samples are ignored."""
+	x = np.asarray(x, dtype=float)
+	bandwidth = variance**.5
+	spacing = bandwidth/FFT_GRID_POINTS_PER_BANDWIDTH
+	kernel_half_size = int(np.ceil(FFT_KERNEL_CUTOFF*FFT_GRID_POINTS_PER_BANDWIDTH))
+	if (maximum-minimum)/spacing + 2*kernel_half_size + 2 > FFT_MAX_GRID_SIZE:
+		spacing = (maximum-minimum)/(FFT_MAX_GRID_SIZE - 2*kernel_half_size - 2)
+		kernel_half_size = int(np.ceil(FFT_KERNEL_CUTOFF*bandwidth/spacing))
+	grid_start = minimum - kernel_half_size*spacing
+	grid_size = int(np.ceil((maximum-minimum)/spacing)) + 2*kernel_half_size + 2
+	# Linear binning of the samples ---
+	grid = np.zeros(grid_size)
+	for samples_window, weights_window in iter_windows(samples, weights):
+		samples_window, weights_window = drop_nan(samples_window, weights_window)
+		position = (np.asarray(samples_window, dtype=float) - grid_start)/spacing
+		idx = np.floor(position).astype(np.intp)
+		fraction = position - idx
+		if weights_window is not None:
+			fraction_weights = weights_window*fraction
+			grid += np.bincount(idx, weights=weights_window-fraction_weights, minlength=grid_size)
+		else:
+			fraction_weights = fraction
+			grid += np.bincount(idx, weights=1-fraction, minlength=grid_size)
+		grid += np.bincount(idx+1, weights=fraction_weights, minlength=grid_size)
+	# Convolution with the kernel ---
+	n_fft = 2**int(np.ceil(np.log2(grid_size + kernel_half_size)))
+	kernel = np.zeros(n_fft)
+	offsets = np.arange(kernel_half_size+1)*spacing
+	kernel[:kernel_half_size+1] = np.exp(-offsets**2/(2*variance))
+	kernel[n_fft-kernel_half_size:] = kernel[kernel_half_size:0:-1]
+	density = np.fft.irfft(np.fft.rfft(grid, n_fft)*np.fft.rfft(kernel), n_fft)[:grid_size]
+	density /= sum_of_weights*(2*np.pi*variance)**.5
+	return np.interp(x, grid_start + np.arange(grid_size)*spacing, density, left=0, right=0)
+
+def drop_nan(samples, weights=None):
+	is_nan = np.isnan(samples)
+	if not is_nan.any():
+		return samples, weights
+	return samples[~is_nan], weights[~is_nan] if weights is not None else None
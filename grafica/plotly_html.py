@@ -0,0 +1,156 @@
+import numpy as np
+import base64
+import html
+import os
+import tempfile
+from pathlib import Path
+
+FLOAT32_TOLERANCE = 1e-6 # Arrays are downcast to float32 only if the rounding errors are below this fraction of their range of values.
+
+_TYPED_ARRAY_DTYPES = { # Types supported by plotly.js typed arrays.
+	np.dtype('int8'): 'i1',
+	np.dtype('uint8'): 'u1',
+	np.dtype('int16'): 'i2',
+	np.dtype('uint16'): 'u2',
+	np.dtype('int32'): 'i4',
+	np.dtype('uint32'): 'u4',
+	np.dtype('float32'): 'f4',
+	np.dtype('float64'): 'f8',
+}
+
+def encode_typed_arrays(figure_dict, float32=False):
+	"""Returns a copy of <figure_dict>, as given by
+	`go.Figure.to_plotly_json`, in which the numeric arrays of the traces
+	are replaced by base64 encoded typed arrays, i.e. dicts of the form
+	{'dtype': 'f8', 'bdata': '...', 'shape': '...'}, which plotly.js
+	(version 2.28 or newer) reads directly. This is several times smaller
+	and faster to write and to load than the decimal text of JSON.
+	- float32: If True, float64 arrays are stored as float32 where the
+	rounding errors are smaller than FLOAT32_TOLERANCE times the range
+	of their values, halving their size."""
+	return {
+		key: [_encode_arrays(trace, float32) for trace in value] if key == 'data' else value
+		for key, value in figure_dict.items()
+	}
+
+def typed_array(array, float32=False):
+	"""Returns <array> as a plotly.js typed array dict, or None if it
+	is not numeric. See `encode_typed_arrays`."""
+	array = np.asarray(array)
+	if array.dtype.kind not in 'biuf' or array.ndim == 0:
+		return None
+	if array.dtype.kind == 'b':
+		array = array.astype(np.uint8)
+	elif array.dtype.kind in 'iu' and array.dtype not in _TYPED_ARRAY_DTYPES: # 64 bits integers are not supported.
+		if len(array) > 0 and np.iinfo(np.int32).min <= array.min() and array.max() <= np.iinfo(np.int32).max:
+			array = array.astype(np.int32)
+		else:
+			array = array.astype(np.float64)
+	elif array.dtype.kind == 'f' and array.dtype not in _TYPED_ARRAY_DTYPES:
+		array = array.astype(np.float64)
+	if float32 and array.dtype == np.float64:
+		array = _downcast_to_float32(array)
+	array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<'))
+	encoded = {
+		'dtype': _TYPED_ARRAY_DTYPES[array.dtype.newbyteorder('=')],
+		'bdata': base64.b64encode(array).decode('ascii'),
+	}
+	if array.ndim > 1:
+		encoded['shape'] = ','.join(str(_) for _ in array.shape)
+	return encoded
+
+def _downcast_to_float32(array):
+	with np.errstate(invalid='ignore', over='ignore'):
+		array32 = array.astype(np.float32)
+		finite = np.isfinite(array)
+		if not (np.isfinite(array32) == finite).all():
+			return array # Out of the float32 range.
+		if not finite.any():
+			return array32
+		values = array[finite]
+		errors = np.abs(values - array32[finite])
+		span = values.max() - values.min()
+		if span == 0:
+			span = np.abs(values).max()
+		if errors.max() > FLOAT32_TOLERANCE*span:
+			return array
+	return array32
+
+def _encode_arrays(value, float32):
+	if isinstance(value, dict):
+		return {key: _encode_arrays(item, float32) for key, item in value.items()}
+	if isinstance(value, np.ndarray) or (isinstance(value, (list, tuple)) and len(value) > 0 and all(isinstance(_, (int, float)) and not isinstance(_, bool) for _ in value)):
+		encoded = typed_array(value, float32)
+		if encoded is not None:
+			return encoded
+	if isinstance(value, (list, tuple)):
+		return [_encode_arrays(item, float32) for item in value]
+	return value
+
+def plotlyjs_file_name():
+	"""Name of the file written by `write_plotlyjs`, it includes the
+	version so HTML files never load a different plotly.js than the one
+	they were made for."""
+	from plotly.offline import get_plotlyjs_version # Imported here so that importing this module does not import plotly.
+	return f'plotly-{get_plotlyjs_version()}.min.js'
+
+def write_plotlyjs(directory):
+	"""Writes the plotly.js bundle of the installed plotly into
+	<directory>, unless it is already there, and returns its file name
+	to be referenced by HTML files in the same directory."""
+	path = Path(directory)/plotlyjs_file_name()
+	if not path.exists():
+		from plotly.offline import get_plotlyjs
+		Path(directory).mkdir(parents=True, exist_ok=True)
+		with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.js', delete=False, encoding='utf-8') as ofile: # Write and rename, so nobody reads it half written.
+			ofile.write(get_plotlyjs())
+		os.replace(ofile.name, path)
+	return path.name
+
+def plotlyjs_script(include_plotlyjs, directory):
+	"""Returns the <script> tag that loads plotly.js for an HTML file
+	in <directory>.
+	- include_plotlyjs: Same as in plotly.io.write_html, i.e. True to
+	embed it, 'cdn' to load it from the internet, 'directory' to use
+	a copy in <directory> (see `write_plotlyjs`), a path ending in `.js`
+	or False to not load it."""
+	from plotly.offline import get_plotlyjs, get_plotlyjs_version
+	if include_plotlyjs is True:
+		return f'<script type="text/javascript">{get_plotlyjs()}</script>'
+	if include_plotlyjs is False:
+		return ''
+	if include_plotlyjs == 'cdn':
+		src = f'https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js'
+	elif include_plotlyjs == 'directory':
+		src = write_plotlyjs(directory)
+	elif isinstance(include_plotlyjs, str) and include_plotlyjs.endswith('.js'):
+		src = include_plotlyjs
+	else:
+		raise ValueError(f"<include_plotlyjs> must be True, False, 'cdn', 'directory' or a path ending in '.js', received {repr(include_plotlyjs)}.")
+	return f'<script src="{src}" charset="utf-8"></script>'
+
+def dashboard_html(sections, title=None, head=''):
+	"""Returns a full HTML page with one section per figure.
+	- sections: List of tuples (heading, div) with the heading, or None,
+	and the HTML div of each figure.
+	- head: HTML to add in the <head>, e.g. the plotly.js <script>."""
+	body = []
+	for heading, div in sections:
+		body.append('<section>')
+		if heading is not None:
+			body.append(f'<h2>{html.escape(heading)}</h2>')
+		body.append(div)
+		body.append('</section>')
+	body = '\n'.join(body)
+	return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title if title is not None else 'Dashboard')}</title>
+{head}
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
@@ -1,6 +1,6 @@
-import plotly.express as px
+from plotly.colors import qualitative
 
-MyColors2021 = px.colors.qualitative.Plotly
+MyColors2021 = list(qualitative.Plotly) # A copy, so plotly's own palette is not modified.
 MyColors2021[-1] = '#0051bb'
 MyColors2021 += [
 	'#fffb00',
@@ -1,17 +1,44 @@
-import plotly.express as px
 import plotly.io as pio
 import plotly.graph_objects as go
 import numpy as np
 
-# Create my own template and set it as default -------------------------
+# My own template ------------------------------------------------------
+# It is built the first time it is used and nothing is changed in plotly
+# unless requested, i.e. importing this module has no side effects.
 MARKERS = ['circle', 'cross', 'x', 'triangle-up', 'star', 'hexagram', 'square', 'diamond', 'hourglass', 'bowtie', 'pentagon', 'triangle-down', 'triangle-left', 'triangle-right', 'star-triangle-up', 'star-triangle-down', 'star-square', 'star-diamond', 'diamond-tall', 'diamond-wide', 'triangle-ne', 'triangle-se', 'triangle-sw', 'triangle-nw',  'hexagon', 'hexagon2', 'octagon']
-my_template = pio.templates['plotly']
-my_template.data.scatter = [
-    go.Scatter(marker=dict(symbol=s, size=12)) for s in MARKERS
-]
+TEMPLATE_NAME = 'my_template'
 
-pio.templates['my_template'] = my_template
-pio.templates.default = 'my_template'
+_my_template = None
+
+def build_template():
+	"""Returns my template, a copy of the 'plotly' template in which each
+	scatter trace has a different marker. It is built only once, later
+	calls return the same object, which is also available as the module
+	attribute `my_template`."""
+	global _my_template
+	if _my_template is None:
+		template = go.layout.Template(pio.templates['plotly']) # A copy, the original is not modified.
+		template.data.scatter = [
+			go.Scatter(marker=dict(symbol=s, size=12)) for s in MARKERS
+		]
+		_my_template = template
+	return _my_template
+
+def __getattr__(name):
+	if name == 'my_template': # A plotly.graph_objects.layout.Template, built when it is first accessed.
+		return build_template()
+	raise AttributeError(f'module {repr(__name__)} has no attribute {repr(name)}')
+
+def apply_template(fig):
+	"""Uses my template in the plotly figure <fig>, and returns it."""
+	return fig.update_layout(template=build_template())
+
+def set_default_template():
+	"""Registers my template in plotly.io.templates as TEMPLATE_NAME and
+	makes it the default for all the figures created afterwards, also
+	by other libraries."""
+	pio.templates[TEMPLATE_NAME] = build_template()
+	pio.templates.default = TEMPLATE_NAME
 
 # ----------------------------------------------------------------------
 
@@ -20,6 +47,7 @@ def add_grouped_legend(fig, data_frame, x, graph_dimensions):
 	- fig: The figure in which to add such grouped legend.
 	- data_frame: The data frame from which to create the legend, in principle it should be the same that was plotted in `fig`.
 	- graph_dimensions: A dictionary with the arguments such as `color`, `symbol`, `line_dash` passed to plotly.express functions you want to group, with the names of the columns in the data_frame."""
+	import plotly.express as px # Imported here because it is slow and it needs pandas.
 	param_list = [{'px': {dimension: dimension_value}, 'lg': {'legendgrouptitle_text': dimension_value}} for dimension, dimension_value in graph_dimensions.items()]
 	legend_traces = []
 	for param in param_list:
@@ -44,6 +72,7 @@ def add_grouped_legend(fig, data_frame, x, graph_dimensions):
 
 def line(error_y_mode=None, grouped_legend=False, **kwargs):
 	"""Extension of `plotly.express.line` to use error bands."""
+	import plotly.express as px
 	def process_color(color: str, alpha: float):
 		if '#' in color: # This means it is an hex string:
 			return f"rgba({tuple(int(data['line']['color'].lstrip('#')[i:i+2], 16) for i in (0, 2, 4))},{alpha})".replace('((','(').replace('),',',').replace(' ','')
@@ -0,0 +1,230 @@
+from .spec import FigureSpec
+from .plotly_html import plotlyjs_file_name, write_plotlyjs
+from contextlib import contextmanager
+import hashlib
+import importlib.metadata
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+MAX_BYTES = 2**30 # Default size limit of a `RenderCache`.
+_VERSIONED_PACKAGES = ('grafica', 'plotly', 'matplotlib', 'numpy') # A new version of any of them can change the files, so they are part of the key.
+
+class RenderCache:
+	"""An on-disk cache of saved figures. Each entry is keyed by a hash of
+	everything that determines the file: the plotter, the figure
+	properties and settings, the traces and their arrays, the arguments
+	given to `save` and the versions of the plotting packages. When a
+	figure is saved again with the same key, it is not rendered: if the
+	file it was saved to is still there unchanged nothing is done at all,
+	otherwise the copy kept in the cache is written.
+	The cache is kept in a directory so it persists between runs. When it
+	exceeds <max_bytes>, the entries used least recently are deleted.
+	To save many figures with `save` use it inside `with cache.batch():`,
+	so the index of the cache is written only once.
+
+	Example
+	-------
+	```
+	import grafica
+	from grafica.render_cache import RenderCache
+
+	grafica.manager.render_cache = RenderCache('~/.cache/my_plots')
+	... # Create the figures.
+	grafica.save_unsaved() # Figures that did not change are skipped.
+	```
+	"""
+	INDEX_FILE_NAME = 'index.json'
+
+	def __init__(self, directory, max_bytes=None):
+		"""- directory: Path to the directory of the cache, it is created
+		if it does not exist.
+		- max_bytes: Size limit of the files in the cache, default is
+		MAX_BYTES."""
+		max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+		if not isinstance(max_bytes, int) or isinstance(max_bytes, bool):
+			raise TypeError(f'<max_bytes> must be an integer number, received {max_bytes} of type {type(max_bytes)}.')
+		if max_bytes < 0:
+			raise ValueError(f'<max_bytes> must be positive, received {max_bytes}.')
+		self._directory = Path(directory).expanduser()
+		self._directory.mkdir(parents=True, exist_ok=True)
+		self._max_bytes = max_bytes
+		self._lock = threading.Lock()
+		self._hits = 0
+		self._misses = 0
+		self._evictions = 0
+		index_path = self._directory/self.INDEX_FILE_NAME
+		self._index = json.loads(index_path.read_text()) if index_path.exists() else {} # {key: entry}, see `store`.
+		self._size = sum(entry['size'] for entry in self._index.values())
+		self._index_is_outdated = False # If True, `_index` has changes not yet written to the file.
+		self._batches = 0 # Number of `batch` blocks being run.
+
+	@property
+	def directory(self):
+		return self._directory
+
+	@property
+	def max_bytes(self):
+		return self._max_bytes
+
+	@property
+	def hits(self):
+		"""Number of saves skipped by this object."""
+		return self._hits
+
+	@property
+	def misses(self):
+		"""Number of saves that were not found in the cache by this object."""
+		return self._misses
+
+	@property
+	def evictions(self):
+		"""Number of entries deleted by this object to respect <max_bytes>."""
+		return self._evictions
+
+	@property
+	def size(self):
+		"""Bytes of the files in the cache."""
+		return self._size
+
+	def __len__(self):
+		return len(self._index)
+
+	def key(self, figure, file_name=None, **kwargs):
+		"""Returns the key of saving <figure> with `figure.save(file_name, **kwargs)`."""
+		digest = hashlib.sha256(FigureSpec.from_figure(figure).fingerprint().encode('utf-8'))
+		digest.update(json.dumps([str(file_name), repr(sorted(kwargs.items())), _versions()]).encode('utf-8'))
+		return digest.hexdigest()
+
+	def save(self, figure, file_name=None, **kwargs):
+		"""Same as `figure.save(file_name, **kwargs)` but using the cache,
+		returns the path to the file. Figures whose content cannot be
+		hashed are just saved."""
+		try:
+			key = self.key(figure, file_name, **kwargs)
+		except (TypeError, ValueError):
+			key = None
+		path = self.restore(key)
+		if path is None:
+			path = figure.save(file_name=file_name, **kwargs)
+			if key is not None:
+				self.store(key, path)
+		return path
+
+	@contextmanager
+	def batch(self):
+		"""Context manager to save many figures: inside it the index file
+		is not written and no entry is evicted, this is done only once at
+		the end, e.g. by `FigureManager.save_unsaved`."""
+		with self._lock:
+			self._batches += 1
+		try:
+			yield self
+		finally:
+			with self._lock:
+				self._batches -= 1
+				if self._batches == 0:
+					self._evict()
+					self._write_index()
+
+	def restore(self, key):
+		"""If <key> is in the cache, makes sure that the file it was saved
+		to has the right content and returns its path. Otherwise, also if
+		<key> is None, returns None. Counts a hit or a miss. Only the
+		entry in memory is updated, the index file is written by the next
+		`store` or at the end of a `batch`."""
+		with self._lock:
+			entry = self._index.get(key)
+			cached_path = self._directory/entry['file'] if entry is not None else None
+			if entry is None or not cached_path.exists():
+				self._misses += 1
+				return None
+			path = Path(entry['path'])
+			if _stat(path) != entry['stat']: # It was deleted or modified, write it again.
+				shutil.copyfile(cached_path, path)
+				entry['stat'] = _stat(path)
+			if entry.get('plotlyjs', False): # It loads plotly.js from a file next to it, see `PlotlyFigure.save`.
+				write_plotlyjs(path.parent)
+			entry['last_used'] = time.time()
+			self._index_is_outdated = True
+			self._hits += 1
+			return entry['path']
+
+	def store(self, key, path):
+		"""Keeps a copy of the file <path> as the result of <key>."""
+		path = Path(path)
+		cached_file_name = f'{key}{path.suffix}'
+		shutil.copyfile(path, self._directory/cached_file_name)
+		uses_plotlyjs = path.suffix == '.html' and f'src="{plotlyjs_file_name()}"'.encode('utf-8') in path.read_bytes()
+		with self._lock:
+			if key in self._index:
+				self._size -= self._index[key]['size']
+			self._index[key] = {
+				'path': str(path),
+				'file': cached_file_name,
+				'size': path.stat().st_size,
+				'stat': _stat(path),
+				'last_used': time.time(),
+				'plotlyjs': uses_plotlyjs,
+			}
+			self._size += self._index[key]['size']
+			self._index_is_outdated = True
+			if self._batches == 0:
+				self._evict()
+				self._write_index()
+
+	def clear(self):
+		"""Deletes all the entries."""
+		with self._lock:
+			for key in list(self._index):
+				self._delete(key)
+			self._write_index()
+
+	def _evict(self):
+		if self._size <= self._max_bytes:
+			return
+		for key in sorted(self._index, key=lambda key: self._index[key]['last_used']):
+			if self._size <= self._max_bytes:
+				break
+			self._delete(key)
+			self._evictions += 1
+
+	def _delete(self, key):
+		entry = self._index.pop(key)
+		self._size -= entry['size']
+		self._index_is_outdated = True
+		(self._directory/entry['file']).unlink(missing_ok=True)
+
+	def _write_index(self):
+		if not self._index_is_outdated:
+			return
+		with tempfile.NamedTemporaryFile('w', dir=self._directory, suffix='.json', delete=False) as ofile: # Write and rename, so it is never read half written.
+			json.dump(self._index, ofile)
+		os.replace(ofile.name, self._directory/self.INDEX_FILE_NAME)
+		self._index_is_outdated = False
+
+def _stat(path):
+	"""Returns what identifies the current content of the file <path>
+	without reading it, or None if it does not exist."""
+	try:
+		stat = Path(path).stat()
+	except FileNotFoundError:
+		return None
+	return [stat.st_size, stat.st_mtime_ns]
+
+_versions_cache = None
+
+def _versions():
+	global _versions_cache
+	if _versions_cache is None:
+		_versions_cache = {}
+		for package in _VERSIONED_PACKAGES:
+			try:
+				_versions_cache[package] = importlib.metadata.version(package)
+			except importlib.metadata.PackageNotFoundError:
+				_versions_cache[package] = None
+	return _versions_cache
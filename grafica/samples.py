@@ -0,0 +1,104 @@
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+
+WINDOW_SIZE = 2**22 # Number of samples read at once from out of core sources.
+VALID_POOLS = {'threads','processes'}
+
+def load_samples(samples):
+	"""Returns <samples> in a form that can be read in windows without
+	copying all of them into memory:
+	- A path to a `.npy` file is opened as a read only numpy.memmap.
+	- A numpy array, including numpy.memmap, is returned as it is.
+	- An iterator (e.g. a generator) is assumed to yield chunks of
+	samples and is returned as it is.
+	- Anything else is converted with numpy.asarray."""
+	if isinstance(samples, (str, Path)):
+		if Path(samples).suffix != '.npy':
+			raise ValueError(f'If <samples> is a path it must be a `.npy` file, received {samples}.')
+		return np.load(samples, mmap_mode='r')
+	if isinstance(samples, np.ndarray) or is_iterator(samples):
+		return samples
+	return np.asarray(samples)
+
+def is_iterator(samples):
+	"""Returns True if <samples> is an iterator over chunks of samples,
+	which can only be read once."""
+	return hasattr(samples, '__next__') and iter(samples) is samples
+
+def is_out_of_core(samples):
+	"""Returns True if <samples>, as returned by `load_samples`, should
+	be read in windows instead of as a whole."""
+	return isinstance(samples, np.memmap) or is_iterator(samples)
+
+def iter_windows(samples, weights=None, window_size=None):
+	"""Yields tuples (samples_window, weights_window) with at most
+	<window_size> samples each, reading <samples> and <weights> as
+	returned by `load_samples`. If <weights> is None, weights_window
+	is None."""
+	window_size = WINDOW_SIZE if window_size is None else window_size
+	if is_iterator(samples):
+		if weights is not None:
+			raise ValueError(f'<weights> cannot be used when <samples> is an iterator.')
+		for chunk in samples:
+			chunk = np.asarray(chunk).ravel()
+			for start in range(0, len(chunk), window_size):
+				yield chunk[start:start+window_size], None
+		return
+	samples = samples.ravel()
+	if weights is not None:
+		weights = weights.ravel()
+		if len(weights) != len(samples):
+			raise ValueError(f'<weights> must have the same length as <samples>, received len(weights)={len(weights)} and len(samples)={len(samples)}.')
+	for start in range(0, len(samples), window_size):
+		yield samples[start:start+window_size], weights[start:start+window_size] if weights is not None else None
+
+def finite_range(samples):
+	"""Returns (minimum, maximum) of the finite values in <samples>,
+	reading them in windows, or (None, None) if there are none."""
+	minimum = None
+	maximum = None
+	for window, _ in iter_windows(samples):
+		window = window[np.isfinite(window)]
+		if len(window) == 0:
+			continue
+		minimum = window.min() if minimum is None else min(minimum, window.min())
+		maximum = window.max() if maximum is None else max(maximum, window.max())
+	return minimum, maximum
+
+def validate_workers(workers):
+	if workers is None:
+		return 1
+	if not isinstance(workers, (int, np.integer)) or isinstance(workers, bool):
+		raise TypeError(f'<workers> must be an integer number, received {workers} of type {type(workers)}.')
+	if workers < 1:
+		raise ValueError(f'<workers> must be a positive integer, received {workers}.')
+	return int(workers)
+
+_shared = None # Object shared with the worker processes of `map_in_parallel`.
+
+def _set_shared(shared):
+	global _shared
+	_shared = shared
+
+def _call_with_shared(function, arguments):
+	return function(_shared, *arguments)
+
+def map_in_parallel(function, shared, arguments, workers, pool='processes'):
+	"""Returns [function(shared, *args) for args in arguments] computed
+	by a pool of <workers> threads or processes.
+	- shared: An object needed by all the calls, e.g. the samples. Each
+	process receives it only once and, where processes are created with
+	fork, it is inherited without copying it, also if it is a numpy.memmap.
+	- pool: One of {'threads','processes'}. For processes <function>
+	must be defined at module level."""
+	if pool not in VALID_POOLS:
+		raise ValueError(f'<pool> must be one of {VALID_POOLS}, received {repr(pool)}.')
+	arguments = list(arguments)
+	if pool == 'threads':
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			return list(executor.map(lambda args: function(shared, *args), arguments))
+	mp_context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+	with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_set_shared, initargs=(shared,)) as executor:
+		return list(executor.map(_call_with_shared, [function]*len(arguments), arguments))
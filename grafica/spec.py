@@ -0,0 +1,316 @@
+from .figure import Figure, _PROPERTIES
+from .traces import Trace
+from . import traces as traces_module
+from .FigureManager import import_plotter, plotter_path, validate_plotter
+import numpy as np
+import datetime
+import hashlib
+import importlib
+import json
+import struct
+import zipfile
+from copy import deepcopy
+
+FORMAT_VERSION = 1
+
+class FigureSpec:
+	"""Everything needed to draw a figure, independent of the plotting
+	package: the figure properties (title, labels, etc.), the settings
+	changed for the figure (e.g. DEFAULT_COLORS) and the traces with
+	their already computed arrays. It can be saved to a file, loaded in
+	another process and drawn with any plotter, without computing the
+	traces again.
+
+	Example
+	-------
+	```
+	import grafica
+	from grafica.spec import FigureSpec
+
+	figure = grafica.new(title='Heavy analysis')
+	figure.KDE(samples)
+	FigureSpec.from_figure(figure).save('heavy_analysis')
+	# Later, or in another process:
+	spec = FigureSpec.load('heavy_analysis.npz')
+	spec.build('grafica.MatplotlibFigure:HeadlessMatplotlibFigure').save()
+	```
+	"""
+	def __init__(self, plotter, properties=None, settings=None, traces=None, deferred=False):
+		"""- plotter: The plotter of the figure, a subclass of Figure or
+		a string 'module:ClassName'.
+		- properties: Dict with the figure properties, e.g. {'title': 'A'}.
+		- settings: Dict with the class attributes of the plotter changed
+		for this figure, e.g. {'WEBGL_THRESHOLD': None}.
+		- traces: List of Trace objects.
+		- deferred: Whether the figure is deferred, see `Figure.deferred`."""
+		if not isinstance(plotter, str):
+			validate_plotter(plotter)
+			plotter = plotter_path(plotter)
+		properties = {} if properties is None else dict(properties)
+		for name in properties:
+			if name not in _PROPERTIES:
+				raise ValueError(f'Invalid property <{name}>, the properties are {_PROPERTIES}.')
+		settings = {} if settings is None else dict(settings)
+		for name in settings:
+			if not name.isupper():
+				raise ValueError(f'The names of the settings must be upper case, received {repr(name)}.')
+		traces = [] if traces is None else list(traces)
+		for trace in traces:
+			if not isinstance(trace, Trace):
+				raise TypeError(f'<traces> must contain only Trace objects, received an object of type {type(trace)}.')
+		if deferred not in [True, False]:
+			raise TypeError(f'<deferred> expects either True or False, received {deferred}.')
+		self._plotter = plotter
+		self._properties = properties
+		self._settings = settings
+		self._traces = traces
+		self._deferred = deferred
+
+	@classmethod
+	def from_figure(cls, figure, copy=False):
+		"""Returns the spec of <figure> as it is now.
+		- copy: If False, the spec shares the traces and their arrays
+		with the figure, which is fast. If True the arrays are copied,
+		except the samples of Histogram and KDE, which are not needed."""
+		if not isinstance(figure, Figure):
+			raise TypeError(f'<figure> must be a Figure, received an object of type {type(figure)}.')
+		return cls(
+			plotter = type(figure),
+			properties = {name: getattr(figure, name) for name in _PROPERTIES if hasattr(figure, f'_{name}')},
+			settings = {name: deepcopy(value) if copy else value for name, value in vars(figure).items() if name.isupper()},
+			traces = [_copy_trace(trace) for trace in figure.traces] if copy else figure.traces,
+			deferred = figure.deferred,
+		)
+
+	@property
+	def plotter(self):
+		"""The plotter of the figure, as a string 'module:ClassName'."""
+		return self._plotter
+
+	@property
+	def properties(self):
+		return self._properties
+
+	@property
+	def settings(self):
+		return self._settings
+
+	@property
+	def traces(self):
+		return self._traces
+
+	@property
+	def deferred(self):
+		return self._deferred
+
+	def build(self, plotter=None, deferred=None):
+		"""Returns a new figure drawn from this spec. The traces are not
+		computed again, the same Trace objects are used.
+		- plotter: A subclass of Figure or a string 'module:ClassName'.
+		Default is the plotter of the original figure. The settings are
+		only applied if the plotter has them.
+		- deferred: Whether the new figure is deferred, default is the
+		same as the original figure. If False, it is drawn now."""
+		plotter = self.plotter if plotter is None else plotter
+		plotter = import_plotter(plotter) if isinstance(plotter, str) else plotter
+		validate_plotter(plotter)
+		figure = plotter()
+		for name, value in self.settings.items():
+			if hasattr(figure, name):
+				setattr(figure, name, value)
+		figure.set(deferred=True, **self.properties)
+		for trace in self.traces:
+			figure.add_trace(trace)
+		figure.deferred = self.deferred if deferred is None else deferred # If False, everything is drawn now at once.
+		return figure
+
+	def fingerprint(self):
+		"""Returns a hash (hexadecimal string) of everything in the spec,
+		including the bytes of the arrays. Two specs have the same
+		fingerprint if and only if they draw the same figure (except for
+		hash collisions, which are practically impossible)."""
+		metadata, arrays = self._encode()
+		metadata.pop('deferred') # It does not change what is drawn.
+		digest = hashlib.sha256(json.dumps(metadata, sort_keys=True).encode('utf-8'))
+		for key in sorted(arrays):
+			array = np.ascontiguousarray(arrays[key])
+			digest.update(f'{key}:{array.dtype.str}:{array.shape}:'.encode('utf-8'))
+			digest.update(array.reshape(-1).view(np.uint8))
+		return digest.hexdigest()
+	
+	def _encode(self):
+		"""Returns (metadata, arrays), see `save`."""
+		arrays = {}
+		keys = {}
+		metadata = {
+			'format_version': FORMAT_VERSION,
+			'plotter': self.plotter,
+			'properties': _encode(self.properties, arrays, keys),
+			'settings': _encode(self.settings, arrays, keys),
+			'traces': [
+				{
+					'class': f'{type(trace).__module__}:{type(trace).__qualname__}',
+					'state': _encode({name: value for name, value in vars(trace).items() if _is_drawn(name)}, arrays, keys),
+				}
+				for trace in self.traces
+			],
+			'deferred': self.deferred,
+		}
+		return metadata, arrays
+	
+	def save(self, file_name):
+		"""Saves the spec into an uncompressed `.npz` file: each array is
+		stored in binary as a `.npy` member and everything else in a small
+		JSON header, the member 'metadata'. Returns the path to the file.
+		The samples of Histogram and KDE and the points of decimated
+		traces before decimation are not saved, they are not drawn."""
+		file_name = str(file_name)
+		if file_name[-4:] != '.npz':
+			file_name += '.npz'
+		metadata, arrays = self._encode()
+		np.savez(
+			file_name,
+			metadata = np.frombuffer(json.dumps(metadata).encode('utf-8'), dtype=np.uint8),
+			**arrays,
+		)
+		return file_name
+
+	@classmethod
+	def load(cls, file_name, mmap=True, plotters=None):
+		"""Loads a spec saved with `save`.
+		- mmap: If True, the arrays are memory mapped from the file
+		instead of read, so loading is immediate and only the parts that
+		are used are read. The file must not be modified meanwhile.
+		- plotters: The FigureManager.Plotters that the file may name as
+		its plotter, default is `grafica.manager.plotters`. Nothing named
+		in the file is imported unless it is one of these plotters or a
+		trace of `grafica.traces`, so that loading a file cannot run
+		arbitrary code. Other plotters raise ValueError, add them to the
+		manager with `add_plotter` first."""
+		if plotters is None:
+			from . import manager # Imported here because the package imports this module.
+			plotters = manager.plotters
+		arrays = load_npz(file_name, mmap=mmap)
+		metadata = json.loads(bytes(arrays.pop('metadata')).decode('utf-8'))
+		if metadata.get('format_version') != FORMAT_VERSION:
+			raise ValueError(f'Cannot load {file_name}, its format version is {metadata.get("format_version")} and the supported one is {FORMAT_VERSION}.')
+		if metadata['plotter'] not in plotters.paths():
+			raise ValueError(f'Cannot load {file_name}, its plotter {repr(metadata["plotter"])} is not registered. The registered plotters are {sorted(plotters.paths())}.')
+		for trace in metadata['traces']:
+			module_name, _, class_name = trace['class'].partition(':')
+			trace_class = getattr(traces_module, class_name, None)
+			if module_name != traces_module.__name__ or not isinstance(trace_class, type) or not issubclass(trace_class, Trace):
+				raise ValueError(f'Cannot load {file_name}, {repr(trace["class"])} is not a trace of {traces_module.__name__}.')
+		return _from_encoded(metadata, arrays)
+
+def _from_encoded(metadata, arrays):
+	"""Returns the FigureSpec encoded in (<metadata>, <arrays>), see
+	`FigureSpec._encode`. The classes named in <metadata> are imported,
+	so it must be trusted."""
+	traces = []
+	for trace in metadata['traces']:
+		module_name, class_name = trace['class'].split(':')
+		trace_class = getattr(importlib.import_module(module_name), class_name)
+		if not isinstance(trace_class, type) or not issubclass(trace_class, Trace):
+			raise TypeError(f'{trace["class"]} is not a Trace.')
+		traces.append(trace_class.__new__(trace_class)) # Not calling __init__, everything was already computed.
+		vars(traces[-1]).update(_decode(trace['state'], arrays))
+	return FigureSpec(
+		plotter = metadata['plotter'],
+		properties = _decode(metadata['properties'], arrays),
+		settings = _decode(metadata['settings'], arrays),
+		traces = traces,
+		deferred = metadata['deferred'],
+	)
+
+def _copy_trace(trace):
+	"""Returns a copy of <trace> that does not share arrays with it, except
+	the samples and the arrays before decimation, which are not drawn."""
+	drawn = {id(value) for name, value in vars(trace).items() if _is_drawn(name)}
+	memo = {id(value): value for name, value in vars(trace).items() if not _is_drawn(name) and id(value) not in drawn}
+	return deepcopy(trace, memo)
+
+def _is_drawn(name):
+	"""Whether the attribute <name> of a trace is needed to draw it. The
+	others, the samples and the arrays before decimation, are neither
+	copied nor saved."""
+	return name != '_samples' and not name.startswith('_original_')
+
+def load_npz(file_name, mmap=True):
+	"""Returns a dict with the arrays of the `.npz` file <file_name>. If
+	<mmap> is True they are memory mapped, this is possible because
+	`numpy.savez` stores them uncompressed (for compressed members they
+	are read instead)."""
+	arrays = {}
+	with zipfile.ZipFile(file_name) as archive, open(file_name, 'rb') as ifile:
+		for member in archive.infolist():
+			name = member.filename[:-4] if member.filename[-4:] == '.npy' else member.filename
+			if mmap and member.compress_type == zipfile.ZIP_STORED:
+				ifile.seek(member.header_offset)
+				local_header = ifile.read(30) # See the ZIP specification, "local file header".
+				file_name_length, extra_field_length = struct.unpack('<HH', local_header[26:30])
+				ifile.seek(member.header_offset + 30 + file_name_length + extra_field_length)
+				version = np.lib.format.read_magic(ifile)
+				if version in [(1,0), (2,0)]:
+					read_array_header = np.lib.format.read_array_header_1_0 if version == (1,0) else np.lib.format.read_array_header_2_0
+					shape, fortran_order, dtype = read_array_header(ifile)
+					if dtype.hasobject:
+						raise ValueError(f'Cannot load {file_name}, it contains arrays of Python objects.')
+					if np.prod(shape) == 0: # Empty arrays cannot be memory mapped.
+						arrays[name] = np.empty(shape, dtype=dtype)
+					else:
+						arrays[name] = np.memmap(file_name, dtype=dtype, mode='r', offset=ifile.tell(), shape=shape, order='F' if fortran_order else 'C')
+					continue
+			with archive.open(member) as member_file:
+				arrays[name] = np.lib.format.read_array(member_file, allow_pickle=False)
+	return arrays
+
+def _encode(value, arrays, keys):
+	"""Returns <value> as something that can be written with JSON, moving
+	the arrays into the dict <arrays>. Each array is stored once, also
+	if it appears several times, <keys> has the key of each one by id."""
+	if value is None or isinstance(value, (bool, int, float, str)):
+		return value
+	if isinstance(value, np.generic):
+		return value.item()
+	if isinstance(value, np.ndarray) or (isinstance(value, list) and len(value) > 0 and all(isinstance(_, (int, float, np.number, datetime.date, np.datetime64)) and not isinstance(_, bool) for _ in value)):
+		if id(value) not in keys:
+			keys[id(value)] = f'array_{len(arrays)}'
+			arrays[keys[id(value)]] = _as_array(value)
+		return {'array': keys[id(value)]}
+	if isinstance(value, tuple):
+		return {'tuple': [_encode(_, arrays, keys) for _ in value]}
+	if isinstance(value, list):
+		return {'list': [_encode(_, arrays, keys) for _ in value]}
+	if isinstance(value, dict):
+		return {'dict': {str(key): _encode(item, arrays, keys) for key, item in value.items()}}
+	if hasattr(value, '__iter__') and hasattr(value, '__len__'): # E.g. a range, that the traces accept as data.
+		if id(value) not in keys:
+			keys[id(value)] = f'array_{len(arrays)}'
+			arrays[keys[id(value)]] = _as_array(value)
+		return {'array': keys[id(value)]}
+	raise TypeError(f'Cannot save an object of type {type(value)}.')
+
+def _as_array(value):
+	"""Returns <value> as a numpy array that can be saved without
+	pickle. Dates and times are converted to numpy.datetime64, except
+	those with a time zone, which raise TypeError."""
+	array = np.asarray(value)
+	if array.dtype.hasobject:
+		if all(isinstance(_, (datetime.date, np.datetime64)) and getattr(_, 'tzinfo', None) is None for _ in array.flat): # numpy.datetime64 has no time zones.
+			return array.astype('datetime64')
+		raise TypeError(f'Arrays of Python objects cannot be saved, received an array with dtype {array.dtype}.')
+	return array
+
+def _decode(value, arrays):
+	if isinstance(value, dict):
+		kind, content = next(iter(value.items()))
+		if kind == 'array':
+			return arrays[content]
+		if kind == 'tuple':
+			return tuple(_decode(_, arrays) for _ in content)
+		if kind == 'list':
+			return [_decode(_, arrays) for _ in content]
+		if kind == 'dict':
+			return {key: _decode(item, arrays) for key, item in content.items()}
+	return value
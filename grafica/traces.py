@@ -1,8 +1,15 @@
 from .validation import validate_alpha, validate_color, validate_label, validate_linestyle, validate_linewidth, validate_marker
 import numpy as np
-from scipy.stats import gaussian_kde
+from .binning import StreamingHistogram, histogram_bin_edges
+from .samples import load_samples, is_iterator, is_out_of_core, VALID_POOLS
+from .decimation import decimate
+from . import computation_cache
+from .computation_cache import fingerprint
+from .kde import KDEStatistics, kernel_variance, evaluate_gaussian_kde, evaluate_scipy_kde, binned_gaussian_kde
+from pathlib import Path
 
 VALID_ZSCALES = {'lin','log'}
+VALID_KDE_ENGINES = {'exact','fft'}
 
 class Trace:
 	"""Most basic trace definition. Other traces should inherit from this
@@ -19,7 +26,7 @@ class Trace:
 			return None
 
 class Scatter(Trace):
-	def __init__(self, x, y, color, marker=None, linestyle='solid', linewidth=None, alpha=1, label=None):
+	def __init__(self, x, y, color, marker=None, linestyle='solid', linewidth=None, alpha=1, label=None, max_points=None, decimation='minmax'):
 		"""A Scatter trace is a line in an xy plane given by two arrays 
 		of points x=[x1,x2,...] and y=[y1,y2,...].
 		- color: RGB tuple.
@@ -27,7 +34,13 @@ class Scatter(Trace):
 		- linestyle: One of {'solid','dotted','dashed', 'none', None}.
 		- linewidth: Float number.
 		- alpha: Float number.
-		- label: String."""
+		- label: String.
+		- max_points: Integer number. If given and there are more points
+		than this, only a subset of at most <max_points> that looks the
+		same when drawn is kept in <x> and <y>, so huge traces are rendered
+		fast. The original points are kept in <original_x> and <original_y>.
+		- decimation: One of {'minmax','lttb'}, how the subset of points
+		is chosen, see the `decimation` module. 'minmax' keeps the extrema."""
 		super().__init__(label)
 		self._color = validate_color(color)
 		self._marker = validate_marker(marker)
@@ -36,6 +49,15 @@ class Scatter(Trace):
 		self._alpha = validate_alpha(alpha)
 		if not hasattr(x, '__iter__') or not hasattr(y, '__iter__') or len(x) != len(y):
 			raise ValueError(f'<x> and <y> must be two iterables of the same length.')
+		self._original_x = x
+		self._original_y = y
+		self._decimation_indices = None
+		if max_points is not None:
+			indices = decimate(x, y, max_points, method=decimation)
+			if len(indices) < len(x):
+				self._decimation_indices = indices
+				x = np.asarray(x)[indices]
+				y = np.asarray(y)[indices]
 		self._x = x
 		self._y = y
 	
@@ -66,9 +88,21 @@ class Scatter(Trace):
 	@property
 	def y(self):
 		return self._y
+	
+	@property
+	def original_x(self):
+		"""The <x> given when creating the trace, before decimation. Traces
+		loaded with spec.FigureSpec do not have it, then it is <x>."""
+		return getattr(self, '_original_x', self._x)
+	
+	@property
+	def original_y(self):
+		"""The <y> given when creating the trace, before decimation. Traces
+		loaded with spec.FigureSpec do not have it, then it is <y>."""
+		return getattr(self, '_original_y', self._y)
 
 class ErrorBand(Scatter):
-	def __init__(self, x, y, lower, higher, color, marker=None, linestyle='solid', linewidth=None, alpha=1, label=None):
+	def __init__(self, x, y, lower, higher, color, marker=None, linestyle='solid', linewidth=None, alpha=1, label=None, max_points=None, decimation='minmax'):
 		"""A Scatter trace with a solid and continuous "error band" going
 		from <y-lower> up to <y+higher>.
 		- color: RGB tuple.
@@ -76,10 +110,17 @@ class ErrorBand(Scatter):
 		- linestyle: One of {'solid','dotted','dashed', 'none', None}.
 		- linewidth: Float number.
 		- alpha: Float number.
-		- label: String."""
-		super().__init__(x=x, y=y, color=color, marker=marker, linestyle=linestyle, linewidth=linewidth, alpha=alpha, label=label)
+		- label: String.
+		- max_points, decimation: See Scatter. The points are chosen
+		using <y>, and the same points are kept in <lower> and <higher>."""
+		super().__init__(x=x, y=y, color=color, marker=marker, linestyle=linestyle, linewidth=linewidth, alpha=alpha, label=label, max_points=max_points, decimation=decimation)
 		if not hasattr(lower, '__iter__') or not hasattr(higher, '__iter__') or not len(higher) == len(lower) == len(x):
 			raise ValueError(f'<lower> and <higher> must be two iterables of the same length than <x> and <y>.')
+		self._original_lower = lower
+		self._original_higher = higher
+		if self._decimation_indices is not None:
+			lower = np.asarray(lower)[self._decimation_indices]
+			higher = np.asarray(higher)[self._decimation_indices]
 		self._lower = lower
 		self._higher = higher
 	
@@ -90,10 +131,83 @@ class ErrorBand(Scatter):
 	@property
 	def higher(self):
 		return self._higher
+	
+	@property
+	def original_lower(self):
+		return getattr(self, '_original_lower', self._lower)
+	
+	@property
+	def original_higher(self):
+		return getattr(self, '_original_higher', self._higher)
+
+class ScatterMany(Trace):
+	def __init__(self, x, y, color, linestyle='solid', linewidth=None, alpha=1, label=None):
+		"""Many lines in an xy plane with the same style, e.g. thousands of
+		waveforms, stored as a single 2D array and drawn by each plotter as
+		a single object, which is much faster than one Scatter per line.
+		- x: 1D array with the x values shared by all the lines, or 2D
+		array with the x values of each line in each row.
+		- y: 2D array with the y values of each line in each row.
+		- color: RGB tuple, all the lines have the same color.
+		- linestyle: One of {'solid','dotted','dashed', 'none', None}.
+		- linewidth: Float number.
+		- alpha: Float number.
+		- label: String, a single entry in the legend for all the lines."""
+		super().__init__(label)
+		self._color = validate_color(color)
+		self._linestyle = validate_linestyle(linestyle)
+		self._linewidth = validate_linewidth(linewidth)
+		self._alpha = validate_alpha(alpha)
+		try:
+			x = np.asarray(x)
+			y = np.asarray(y)
+		except ValueError:
+			raise ValueError(f'<x> and <y> must be arrays, all the lines must have the same number of points.')
+		if y.ndim != 2:
+			raise ValueError(f'<y> must be a 2D array with one line per row, received an array with shape {y.shape}.')
+		if x.shape not in [y.shape[1:], y.shape]:
+			raise ValueError(f'<x> must be a 1D array with {y.shape[1]} elements or a 2D array with the same shape as <y>, {y.shape}, received an array with shape {x.shape}.')
+		self._x = x
+		self._y = y
+	
+	@property
+	def color(self):
+		return self._color
+	
+	@property
+	def linestyle(self):
+		return self._linestyle
+	
+	@property
+	def linewidth(self):
+		return self._linewidth
+	
+	@property
+	def alpha(self):
+		return self._alpha
+	
+	@property
+	def x(self):
+		"""1D array shared by all the lines or 2D array with one line per row."""
+		return self._x
+	
+	@property
+	def y(self):
+		"""2D array with one line per row."""
+		return self._y
+	
+	@property
+	def n_lines(self):
+		return len(self._y)
 
 class Histogram(Trace):
-	def __init__(self, samples, color, marker=None, linestyle='solid', linewidth=None, alpha=1, label=None, density=False, bins='auto'):
+	def __init__(self, samples, color, marker=None, linestyle='solid', linewidth=None, alpha=1, label=None, density=False, bins='auto', workers=None):
 		"""Given an array of samples produces a histogram.
+		- samples: A 1D iterable with the samples or a StreamingHistogram,
+		in which case its current counts are used. It can also be a
+		numpy.memmap, a path to a `.npy` file or an iterator yielding
+		chunks of samples, which are read in windows without loading all
+		of them into memory. For iterators <bins> must be the bin edges.
 		- color: RGB tuple.
 		- marker: One of {'.','o','+','x','*', None}.
 		- linestyle: One of {'solid','dotted','dashed', 'none', None}.
@@ -101,59 +215,49 @@ class Histogram(Trace):
 		- alpha: Float number.
 		- label: String.
 		- density: Same as homonym argument in numpy.histogram.
-		- bins: Same as homonym argument in numpy.histogram."""
+		- bins: Same as homonym argument in numpy.histogram. Ignored if
+		<samples> is a StreamingHistogram.
+		- workers: Integer number. If given, the samples are binned by
+		this number of processes in parallel. The result is exactly the
+		same, it is only worth it for large numbers of samples."""
 		super().__init__(label)
 		self._color = validate_color(color)
 		self._marker = validate_marker(marker)
 		self._linestyle = validate_linestyle(linestyle)
 		self._linewidth = validate_linewidth(linewidth)
 		self._alpha = validate_alpha(alpha)
-		if not hasattr(samples, '__iter__'):
+		if not hasattr(samples, '__iter__') and not isinstance(samples, (StreamingHistogram, Path)):
 			raise ValueError(f'<samples> must be iterable.')
 		self._samples = samples
 		# The following is for handling to whoever is going to plot this a collection of xy points to draw this as a scatter plot.
-		samples = np.array(samples)
-		hist, bin_edges = np.histogram(
-			samples[(~np.isnan(samples))&(~np.isinf(samples))],
-			bins = bins,
-			density = density,
-		)
-		if density == False:
-			hist[-1] -= sum(samples==bin_edges[-1])
-		else:
-			hist *= np.diff(bin_edges)*len(samples)
-			hist[-1] -= sum(samples==bin_edges[-1])
-			hist /= np.diff(bin_edges)*len(samples)
-		x = [-float('inf')]
-		if density == False:
-			y = [sum(samples<bin_edges[0])]
-		else:
-			if sum(samples<bin_edges[0]) == 0:
-				y = [0]
-			else:
-				y = [float('NaN')]
-		for idx,count in enumerate(hist):
-			x.append(bin_edges[idx])
-			x.append(bin_edges[idx])
-			y.append(y[-1])
-			y.append(count)
-		x.append(bin_edges[-1])
-		y.append(y[-1])
-		x.append(bin_edges[-1])
-		if density == False:
-			y.append(sum(samples>=bin_edges[-1]))
+		if not isinstance(samples, StreamingHistogram):
+			samples = load_samples(samples)
+			samples = _cached(
+				('Histogram', samples, bins),
+				lambda: StreamingHistogram(bins=histogram_bin_edges(samples, bins)).fill(samples, workers=workers),
+			)
+			bin_edges = samples.bin_edges
 		else:
-			if sum(samples>=bin_edges[-1]) == 0:
-				y.append(0)
-			else:
-				y.append(float('NaN'))
-		x.append(float('inf'))
-		y.append(y[-1])
-		self._x = np.array(x)
-		self._y = np.array(y)
+			bin_edges = samples.bin_edges
+		hist = samples.counts.copy()
+		top_edge_count = samples._top_edge_count
+		n_underflow = samples.underflow
+		n_overflow = samples.overflow
+		if density == True:
+			n_samples = samples.entries
+			hist[-1] += top_edge_count # Same convention as numpy.histogram to get the same normalization.
+			hist = hist/np.diff(bin_edges)/hist.sum()
+			hist *= np.diff(bin_edges)*n_samples
+			hist[-1] -= top_edge_count
+			hist /= np.diff(bin_edges)*n_samples
+			n_underflow = 0 if n_underflow == 0 else float('NaN')
+			n_overflow = 0 if n_overflow == 0 else float('NaN')
+		bin_counts = np.concatenate([[n_underflow], hist, [n_overflow]])
+		self._x = np.concatenate([[-float('inf')], np.repeat(bin_edges, 2), [float('inf')]])
+		self._y = np.repeat(bin_counts, 2)
 		
 		self._bin_edges = bin_edges
-		self._bin_counts = np.array([y[0]] + list(hist) + [y[-1]])
+		self._bin_counts = bin_counts
 	
 	@property
 	def color(self):
@@ -192,9 +296,11 @@ class Histogram(Trace):
 		return self._bin_counts
 
 class KDE(Scatter):
-	def __init__(self, samples, color, x=None, linestyle='solid', linewidth=None, alpha=1, label=None, bw_method=None, weights=None):
+	def __init__(self, samples, color, x=None, linestyle='solid', linewidth=None, alpha=1, label=None, bw_method=None, weights=None, engine='exact', max_memory=None, workers=None, pool='threads'):
 		"""Given an array of samples produces a Kernel Density Estimation (KDE) plot.
-		- samples: A 1D iterable containing the samples.
+		- samples: A 1D iterable containing the samples. It can also be a
+		numpy.memmap or a path to a `.npy` file, which are read in
+		windows without loading all of them into memory.
 		- color: RGB tuple.
 		- x: int or array of floats. If int, specifies the number of x
 		values equally spaced between min(samples) and max(samples) to
@@ -205,17 +311,42 @@ class KDE(Scatter):
 		- alpha: Float number.
 		- label: String.
 		- bw_method: See scipy.stats.gaussian_kde.
-		- weights: See scipy.stats.gaussian_kde."""
-		if not hasattr(samples, '__iter__'):
+		- weights: See scipy.stats.gaussian_kde. Can also be a numpy.memmap
+		or a path to a `.npy` file.
+		- engine: One of {'exact','fft'}. 'exact' evaluates the KDE at
+		each x, with a cost proportional to len(samples)*len(x). 'fft'
+		bins the samples onto a fine grid and convolves it with the
+		kernel, which is much faster for many samples, see
+		kde.binned_gaussian_kde for its accuracy.
+		- max_memory: Integer number of bytes. Only for engine='exact',
+		the KDE is evaluated in chunks such that the temporary arrays
+		stay below this size. Default is kde.MAX_MEMORY.
+		- workers: Integer number. Only for engine='exact', the chunks
+		are evaluated in parallel by this number of threads or processes.
+		- pool: One of {'threads','processes'}, used with <workers>."""
+		if not hasattr(samples, '__iter__') and not isinstance(samples, Path):
 			raise ValueError(f'<samples> must be iterable.')
-		self._samples = np.array(samples)
-		self._samples = self._samples[~np.isnan(self._samples)]
-		kde_function = gaussian_kde(self._samples, bw_method=bw_method, weights=weights)
-		if x is None:
-			x = np.linspace(min(samples), max(samples), 99)
-		elif isinstance(x, int):
-			x = np.linspace(min(samples), max(samples), x)
-		y = kde_function(x)
+		samples = load_samples(samples)
+		if is_iterator(samples):
+			raise ValueError(f'<samples> cannot be an iterator for a KDE, because the samples have to be read twice. Use a numpy.memmap or a `.npy` file instead.')
+		if weights is not None:
+			weights = load_samples(weights)
+		if engine not in VALID_KDE_ENGINES:
+			raise ValueError(f'<engine> must be one of {VALID_KDE_ENGINES}, received {repr(engine)}.')
+		if pool not in VALID_POOLS:
+			raise ValueError(f'<pool> must be one of {VALID_POOLS}, received {repr(pool)}.')
+		if is_out_of_core(samples) or is_out_of_core(weights):
+			self._samples = samples
+		else:
+			is_nan = np.isnan(samples)
+			self._samples = samples[~is_nan]
+			if weights is not None:
+				weights = weights[~is_nan]
+		x, y = _cached(
+			('KDE', self._samples, weights, x, bw_method, engine),
+			lambda: _kde_curve(self._samples, weights, x, bw_method, engine, max_memory, workers, pool),
+		)
+		x, y = np.array(x), np.array(y) # Copies, so the arrays in the cache cannot be modified through this trace.
 		super().__init__(
 			x = x,
 			y = y,
@@ -228,6 +359,65 @@ class KDE(Scatter):
 		)
 		
 
+def _kde_curve(samples, weights, x, bw_method, engine, max_memory, workers, pool):
+	"""Returns (x, y) of the KDE, see `KDE`. In memory <samples> must not
+	contain NaN."""
+	if is_out_of_core(samples) or is_out_of_core(weights):
+		statistics = KDEStatistics(samples, weights)
+		minimum, maximum = statistics.minimum, statistics.maximum
+		variance = kernel_variance(statistics, bw_method)
+		sum_of_weights = statistics.sum_of_weights
+	else:
+		from scipy.stats import gaussian_kde # Imported here because it takes long and it is only needed for KDE.
+		kde_function = gaussian_kde(samples, bw_method=bw_method, weights=weights)
+		minimum, maximum = samples.min(), samples.max()
+	if x is None:
+		x = np.linspace(minimum, maximum, 99)
+	elif isinstance(x, int):
+		x = np.linspace(minimum, maximum, x)
+	if engine == 'fft':
+		if not is_out_of_core(samples) and not is_out_of_core(weights):
+			variance = kde_function.covariance[0,0] # This way all the options of scipy.stats.gaussian_kde for <bw_method> are available.
+			sum_of_weights = len(samples) if weights is None else np.sum(weights)
+		y = binned_gaussian_kde(
+			samples,
+			x,
+			variance = variance,
+			minimum = minimum,
+			maximum = maximum,
+			weights = weights,
+			sum_of_weights = sum_of_weights,
+		)
+	elif is_out_of_core(samples) or is_out_of_core(weights):
+		y = evaluate_gaussian_kde(
+			samples,
+			x,
+			variance = variance,
+			weights = weights,
+			sum_of_weights = sum_of_weights,
+			max_memory = max_memory,
+			workers = workers,
+			pool = pool,
+		)
+	else:
+		y = evaluate_scipy_kde(
+			kde_function,
+			x,
+			max_memory = max_memory,
+			workers = workers,
+			pool = pool,
+		)
+	return x, y
+
+def _cached(arguments, compute):
+	"""Returns `compute()`, using the ComputationCache if it is enabled and
+	all the <arguments> it depends on can be fingerprinted."""
+	cache = computation_cache.get_cache()
+	if cache is None:
+		return compute()
+	key = fingerprint(tuple(arguments))
+	return cache.get(key, compute)
+
 class Heatmap(Trace):
 	def __init__(self, x, y, z, zscale='lin', zlabel=None, zlim=None, alpha=1, label=None):
 		"""Produces a 2D colored heat map.
@@ -60,4 +60,33 @@ for plotter in grafica.manager.plotters:
 				density = density,
 			)
 
+streaming_histogram = grafica.StreamingHistogram(bins=33, range=(-3,3))
+for plotter in grafica.manager.plotters:
+	fig = grafica.manager.new(
+		title = 'Streaming histogram',
+		subtitle = 'Samples are filled in chunks',
+		plotter_name = plotter,
+	)
+	for n_chunk in range(3):
+		streaming_histogram.fill(np.random.randn(999))
+		fig.histogram(
+			streaming_histogram,
+			label = f'After {n_chunk+1} chunks',
+		)
+
+fig = grafica.manager.new(
+	title = 'Compact histogram',
+	subtitle = 'Plotly draws histograms with many bins with less traces',
+	plotter_name = 'plotly',
+)
+samples = np.random.randn(99999)
+for compact in [False, True]:
+	fig.COMPACT_HISTOGRAM_THRESHOLD = 0 if compact else None
+	fig.histogram(
+		samples,
+		bins = 99,
+		marker = '.',
+		label = f'compact={compact}',
+	)
+
 grafica.save_unsaved(mkdir=True)
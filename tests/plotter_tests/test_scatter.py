@@ -66,4 +66,19 @@ for plotter in grafica.manager.plotters:
 				color = (0,0,1),
 			)
 
+	fig = grafica.manager.new(
+		title = 'Decimation',
+		plotter_name = plotter,
+	)
+	x_many = np.linspace(0, 99, 9999)
+	y_many = np.cumsum(np.random.randn(len(x_many)))
+	for decimation in ['minmax','lttb']:
+		fig.scatter(
+			x_many,
+			y_many,
+			label = f'{decimation}',
+			max_points = 200,
+			decimation = decimation,
+		)
+
 grafica.save_unsaved(mkdir=True)
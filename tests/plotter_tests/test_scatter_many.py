@@ -0,0 +1,38 @@
+import grafica
+import numpy as np
+
+x = np.linspace(0, 1, 299)
+waveforms = np.cumsum(np.random.randn(1000, len(x)), axis=1)/len(x)**.5
+
+for plotter in grafica.manager.plotters:
+	fig = grafica.manager.new(
+		title = 'Many lines',
+		plotter_name = plotter,
+	)
+	fig.scatter_many(
+		x,
+		waveforms,
+		alpha = .05,
+		label = f'{len(waveforms)} waveforms',
+	)
+	fig.scatter(
+		x,
+		np.mean(waveforms, axis=0),
+		color = (0,0,0),
+		label = 'Mean',
+	)
+
+	fig = grafica.manager.new(
+		title = 'Many lines, one x per line',
+		plotter_name = plotter,
+	)
+	for idx,linestyle in enumerate(['solid','dashed','dotted']):
+		fig.scatter_many(
+			x[:99] + np.arange(9)[:,None],
+			waveforms[idx*9:(idx+1)*9,:99] + idx,
+			linestyle = linestyle,
+			linewidth = 1,
+			label = f'{linestyle}',
+		)
+
+grafica.save_unsaved(mkdir=True)
@@ -0,0 +1,93 @@
+from grafica.binning import StreamingHistogram, tally_samples
+import grafica.binning
+from grafica.traces import Histogram
+import numpy as np
+import unittest
+
+class TestStreamingHistogram(unittest.TestCase):
+	
+	def setUp(self):
+		self.samples = np.concatenate([np.random.randn(9999), [float('NaN'), float('inf'), -float('inf'), 1, -1, 2]])
+		np.random.shuffle(self.samples)
+	
+	def test_fill_in_chunks(self):
+		histogram = StreamingHistogram(bins=[-1,-.5,0,.5,1])
+		for chunk in np.array_split(self.samples, 7):
+			histogram.fill(chunk)
+		samples = self.samples
+		self.assertEqual(histogram.entries, len(samples))
+		self.assertEqual(histogram.nan_count, 1)
+		self.assertEqual(histogram.inf_count, 2)
+		self.assertEqual(histogram.underflow, sum(samples<-1))
+		self.assertEqual(histogram.overflow, sum(samples>=1))
+		self.assertEqual(histogram.counts.sum() + histogram.underflow + histogram.overflow + histogram.nan_count, len(samples))
+		for idx,(lower,upper) in enumerate(zip(histogram.bin_edges[:-1], histogram.bin_edges[1:])):
+			with self.subTest(i=idx):
+				self.assertEqual(histogram.counts[idx], sum((samples>=lower)&(samples<upper)))
+	
+	def test_integer_bins(self):
+		histogram = StreamingHistogram(bins=4, range=(-1,1))
+		self.assertTrue(np.array_equal(histogram.bin_edges, [-1,-.5,0,.5,1]))
+		with self.assertRaises(ValueError):
+			StreamingHistogram(bins=4)
+		with self.assertRaises(ValueError):
+			StreamingHistogram(bins=[0,2,1])
+	
+	def test_same_as_histogram_trace(self):
+		bins = [-2,-1,-.1,.1,1,2]
+		streaming = StreamingHistogram(bins=bins)
+		for chunk in np.array_split(self.samples, 3):
+			streaming.fill(chunk)
+		for density in [False, True]:
+			with self.subTest(i=density):
+				from_samples = Histogram(self.samples, color=(0,0,0), bins=bins, density=density)
+				from_streaming = Histogram(streaming, color=(0,0,0), density=density)
+				self.assertTrue(np.array_equal(from_samples.bin_edges, from_streaming.bin_edges))
+				self.assertTrue(np.allclose(from_samples.bin_counts, from_streaming.bin_counts, equal_nan=True))
+				self.assertTrue(np.allclose(from_samples.y, from_streaming.y, equal_nan=True))
+	
+class TestTallySamples(unittest.TestCase):
+	
+	def reference_tally(self, samples, bin_edges):
+		extended_edges = np.concatenate([[-np.inf, np.nextafter(-np.inf, 0)], bin_edges, [np.nextafter(bin_edges[-1], np.inf), np.inf, np.nan]])
+		return np.bincount(np.searchsorted(extended_edges, samples, side='right'), minlength=len(extended_edges)+1)
+	
+	def test_uniform_bins(self):
+		for bin_edges in [np.linspace(-3,3,7), np.linspace(1e3,1e3+1e-3,1001), 1e5+.1*np.arange(99)]:
+			samples = np.concatenate([
+				np.random.uniform(bin_edges[0]-1, bin_edges[-1]+1, 9999),
+				bin_edges,
+				np.nextafter(bin_edges, np.inf),
+				np.nextafter(bin_edges, -np.inf),
+				[np.nan, np.inf, -np.inf, 1e308, -1e308],
+			])
+			with self.subTest(i=len(bin_edges)):
+				self.assertTrue(np.array_equal(tally_samples(samples, bin_edges), self.reference_tally(samples, bin_edges)))
+	
+	def test_integer_samples(self):
+		for samples in [np.random.randint(0, 4096, 9999).astype(np.int16), np.random.randint(-50, 50, 9999), np.random.randint(0, 2**40, 999)]:
+			for bin_edges in [np.linspace(-10, 100, 12), np.array([-1, 0, .5, 7, 3000])]:
+				with self.subTest(i=(samples.dtype, len(bin_edges))):
+					self.assertTrue(np.array_equal(tally_samples(samples, bin_edges), self.reference_tally(samples.astype(float), bin_edges)))
+	
+	def test_integers_out_of_intp(self):
+		for samples in [np.array([2**63+5], dtype=np.uint64), np.array([0, 2**64-1, 7], dtype=np.uint64)]:
+			for bin_edges in [np.array([0., 1.]), np.array([0, 8, 2.**63, 2.**64])]:
+				with self.subTest(i=(samples.tolist(), bin_edges.tolist())):
+					self.assertTrue(np.array_equal(tally_samples(samples, bin_edges), self.reference_tally(samples.astype(float), bin_edges)))
+	
+	def test_workers(self):
+		samples = np.concatenate([np.random.randn(99999), [np.nan, np.inf, -np.inf]])
+		MIN_SAMPLES_PER_WORKER = grafica.binning.MIN_SAMPLES_PER_WORKER
+		grafica.binning.MIN_SAMPLES_PER_WORKER = 1
+		try:
+			for bin_edges in [np.linspace(-3,3,33), np.array([-1,0,.1,2])]:
+				with self.subTest(i=len(bin_edges)):
+					self.assertTrue(np.array_equal(tally_samples(samples, bin_edges, workers=3), tally_samples(samples, bin_edges)))
+		finally:
+			grafica.binning.MIN_SAMPLES_PER_WORKER = MIN_SAMPLES_PER_WORKER
+		with self.assertRaises(ValueError):
+			tally_samples(samples, bin_edges, workers=0)
+	
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,139 @@
+from grafica import computation_cache
+from grafica.computation_cache import ComputationCache, fingerprint
+from grafica.traces import Histogram, KDE
+from grafica.binning import StreamingHistogram
+import numpy as np
+import tempfile
+import unittest
+from pathlib import Path
+
+class TestComputationCache(unittest.TestCase):
+
+	def setUp(self):
+		self.cache = computation_cache.enable()
+		self.samples = np.random.default_rng(0).normal(size=9999)
+
+	def tearDown(self):
+		computation_cache.disable()
+
+	def test_histogram(self):
+		for bins in ['auto', 10, np.linspace(-3, 3, 20)]:
+			with self.subTest(i=repr(bins)):
+				computation_cache.disable()
+				expected = Histogram(self.samples, color=(0,0,0), bins=bins)
+				cache = computation_cache.enable()
+				first = Histogram(self.samples, color=(0,0,0), bins=bins)
+				second = Histogram(self.samples.copy(), color=(0,0,0), bins=bins, workers=2) # Same content, another buffer.
+				self.assertEqual(cache.statistics(), {'hits': 1, 'misses': 1, 'evictions': 0, 'entries': 1, 'size': cache.size})
+				for trace in [first, second]:
+					self.assertTrue(np.array_equal(trace.x, expected.x))
+					self.assertTrue(np.array_equal(trace.y, expected.y))
+
+	def test_kde(self):
+		for engine in ['exact', 'fft']:
+			with self.subTest(i=engine):
+				computation_cache.disable()
+				expected = KDE(self.samples, color=(0,0,0), engine=engine)
+				cache = computation_cache.enable()
+				first = KDE(self.samples, color=(0,0,0), engine=engine)
+				second = KDE(self.samples, color=(0,0,0), engine=engine, max_memory=2**16)
+				self.assertEqual((cache.hits, cache.misses), (1, 1))
+				for trace in [first, second]:
+					self.assertTrue(np.array_equal(trace.x, expected.x))
+					self.assertTrue(np.array_equal(trace.y, expected.y))
+				trace.y[:] = 0 # Must not change the cache.
+				self.assertTrue(np.array_equal(KDE(self.samples, color=(0,0,0), engine=engine).y, expected.y))
+
+	def test_different_arguments(self):
+		Histogram(self.samples, color=(0,0,0))
+		Histogram(self.samples, color=(0,0,0), bins=10)
+		Histogram(self.samples[1:], color=(0,0,0))
+		KDE(self.samples, color=(0,0,0))
+		KDE(self.samples, color=(0,0,0), bw_method=0.5)
+		KDE(self.samples, color=(0,0,0), x=9)
+		KDE(self.samples, color=(0,0,0), bw_method=1)
+		KDE(self.samples, color=(0,0,0), bw_method=1.0)
+		self.assertEqual((self.cache.hits, self.cache.misses, len(self.cache)), (0, 8, 8))
+
+	def test_memmap(self):
+		with tempfile.TemporaryDirectory() as directory:
+			path = Path(directory)/'samples.npy'
+			np.save(path, self.samples)
+			first = Histogram(path, color=(0,0,0), bins=20)
+			second = Histogram(np.load(path, mmap_mode='r')[:5000], color=(0,0,0), bins=20)
+			third = Histogram(self.samples, color=(0,0,0), bins=20)
+			self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+			self.assertTrue(np.array_equal(first.y, third.y))
+			self.assertFalse(np.array_equal(first.y, second.y))
+
+	def test_hit_skips_computation(self):
+		fill = StreamingHistogram.fill
+		calls = []
+		def counted(histogram, *args, **kwargs):
+			calls.append(args)
+			return fill(histogram, *args, **kwargs)
+		StreamingHistogram.fill = counted
+		try:
+			first = Histogram(self.samples, color=(0,0,0), bins=20)
+			second = Histogram(self.samples, color=(0,0,0), bins=20)
+		finally:
+			StreamingHistogram.fill = fill
+		self.assertEqual((len(calls), self.cache.hits), (1, 1))
+		self.assertTrue(np.array_equal(first.y, second.y))
+	
+	def test_memmap_fingerprint_is_memoized(self):
+		with tempfile.TemporaryDirectory() as directory:
+			path = Path(directory)/'samples.npy'
+			np.save(path, self.samples)
+			first = fingerprint(np.load(path, mmap_mode='r'))
+			self.assertEqual(first, fingerprint(self.samples))
+			self.assertIn(first, computation_cache._memoized_fingerprints.values())
+			memoized = len(computation_cache._memoized_fingerprints)
+			self.assertEqual(fingerprint(np.load(path, mmap_mode='r')), first) # Another memmap of the same file.
+			self.assertEqual(len(computation_cache._memoized_fingerprints), memoized)
+			self.assertEqual(fingerprint(np.load(path, mmap_mode='r')[1::2]), fingerprint(self.samples[1::2]))
+			np.save(path, self.samples[:-1]) # Modified, its fingerprint is computed again.
+			self.assertEqual(fingerprint(np.load(path, mmap_mode='r')), fingerprint(self.samples[:-1]))
+			self.assertIsNone(computation_cache._memo_key(self.samples))
+			self.assertIsNone(computation_cache._memo_key(np.load(path, mmap_mode='c')))
+	
+	def test_not_cached(self):
+		Histogram(iter([self.samples[:5000], self.samples[5000:]]), color=(0,0,0), bins=np.linspace(-3, 3, 20))
+		KDE(self.samples, color=(0,0,0), bw_method=lambda kde: 0.5)
+		self.assertEqual((self.cache.hits, self.cache.misses, len(self.cache)), (0, 0, 0))
+		computation_cache.disable()
+		Histogram(self.samples, color=(0,0,0))
+		self.assertEqual(self.cache.misses, 0)
+
+	def test_eviction(self):
+		cache = ComputationCache(max_bytes=2*800)
+		for i in [0, 1, 0, 2]:
+			cache.get(i, lambda: np.zeros(100))
+		self.assertEqual(cache.statistics(), {'hits': 1, 'misses': 3, 'evictions': 1, 'entries': 2, 'size': 1600})
+		cache.get(0, lambda: np.zeros(100))
+		self.assertEqual(cache.hits, 2) # The least recently used was 1.
+		cache.get(3, lambda: np.zeros(1000)) # Larger than the cache, not kept.
+		self.assertEqual(len(cache), 2)
+		cache.clear()
+		self.assertEqual((len(cache), cache.size), (0, 0))
+
+	def test_fingerprint(self):
+		a = np.arange(10.)
+		self.assertEqual(fingerprint(a), fingerprint(a.copy()))
+		self.assertEqual(fingerprint(a), fingerprint(list(a)))
+		self.assertNotEqual(fingerprint(a), fingerprint(a.astype(np.float32)))
+		self.assertNotEqual(fingerprint(a), fingerprint(a.reshape(2, 5)))
+		self.assertNotEqual(fingerprint(a[::2]), fingerprint(a[1::2]))
+		self.assertEqual(fingerprint(('a', 1, None)), ('tuple', ('str', 'a'), ('int', 1), ('NoneType', None)))
+		self.assertEqual(len({fingerprint(1), fingerprint(1.0), fingerprint(True), fingerprint(np.float64(1))}), 4)
+		for value in [iter(a), lambda: 0, ('a', lambda: 0), ['a'], np.array([None])]:
+			self.assertIsNone(fingerprint(value))
+
+	def test_validation(self):
+		with self.assertRaises(TypeError):
+			ComputationCache(max_bytes=1.5)
+		with self.assertRaises(ValueError):
+			ComputationCache(max_bytes=-1)
+
+if __name__ == '__main__':
+	unittest.main()
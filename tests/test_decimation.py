@@ -0,0 +1,84 @@
+from grafica.decimation import decimate
+from grafica.traces import Scatter, ErrorBand
+from grafica.PlotlyFigure import PlotlyFigure
+from grafica.MatplotlibFigure import HeadlessMatplotlibFigure
+import numpy as np
+import unittest
+
+class TestDecimation(unittest.TestCase):
+	
+	def setUp(self):
+		self.x = np.linspace(0, 1, 99999)
+		self.y = np.cumsum(np.random.randn(len(self.x)))
+		self.y[[999,5555]] = [99999,-99999]
+	
+	def test_min_max_keeps_extrema(self):
+		for x in [self.x, np.random.randn(len(self.x))]:
+			for max_points in [4, 999, 2000]:
+				with self.subTest(i=(max_points, (np.diff(x)>0).all())):
+					indices = decimate(x, self.y, max_points)
+					self.assertLessEqual(len(indices), max_points)
+					self.assertTrue((np.diff(indices) > 0).all())
+					self.assertIn(999, indices)
+					self.assertIn(5555, indices)
+					self.assertIn(0, indices)
+					self.assertIn(len(x)-1, indices)
+	
+	def test_lttb(self):
+		for max_points in [4, 999, 2000]:
+			with self.subTest(i=max_points):
+				indices = decimate(self.x, self.y, max_points, method='lttb')
+				self.assertEqual(len(indices), max_points)
+				self.assertTrue((np.diff(indices) > 0).all())
+				self.assertEqual(indices[0], 0)
+				self.assertEqual(indices[-1], len(self.x)-1)
+		self.assertIn(999, decimate(self.x, self.y, 999, method='lttb'))
+	
+	def test_nan(self):
+		y = self.y.copy()
+		y[::3] = np.nan
+		for method in ['minmax','lttb']:
+			with self.subTest(i=method):
+				indices = decimate(self.x, y, 999, method=method)
+				self.assertLessEqual(len(indices), 999)
+				self.assertIn(5555, indices)
+	
+	def test_few_points(self):
+		self.assertTrue(np.array_equal(decimate([1,2,3], [1,2,3], 99), [0,1,2]))
+		for max_points, method, error in [(3,'minmax',ValueError), (99,'mean',ValueError), (99.,'minmax',TypeError)]:
+			with self.subTest(i=(max_points, method)):
+				with self.assertRaises(error):
+					decimate(self.x, self.y, max_points, method=method)
+	
+	def test_traces(self):
+		scatter = Scatter(self.x, self.y, color=(0,0,0), max_points=999)
+		self.assertLessEqual(len(scatter.x), 999)
+		self.assertEqual(len(scatter.x), len(scatter.y))
+		self.assertIs(scatter.original_x, self.x)
+		self.assertIs(scatter.original_y, self.y)
+		self.assertEqual(scatter.y.max(), self.y.max())
+		errorband = ErrorBand(self.x, self.y, self.y*0+1, self.y*0+2, color=(0,0,0), max_points=999)
+		self.assertTrue(np.array_equal(errorband.lower, np.ones(len(errorband.x))))
+		self.assertTrue(np.array_equal(errorband.higher, 2*np.ones(len(errorband.x))))
+		scatter = Scatter([1,2,3], [4,5,6], color=(0,0,0), max_points=999)
+		self.assertEqual(scatter.x, [1,2,3])
+	
+	def test_figures(self):
+		x = self.x[:9999]
+		y = self.y[:9999]
+		for max_points, trace_type, n_points in [(None, 'scattergl', 9999), (200, 'scatter', 200)]:
+			with self.subTest(i=max_points):
+				figure = PlotlyFigure()
+				figure.WEBGL_THRESHOLD = 999
+				figure.scatter(x, y, max_points=max_points)
+				trace = figure.plotly_figure.data[0]
+				self.assertEqual(trace.type, trace_type)
+				self.assertLessEqual(len(trace.x), n_points)
+				self.assertGreater(len(trace.x), n_points//2)
+				figure = HeadlessMatplotlibFigure()
+				figure.scatter(x, y, max_points=max_points)
+				figure.render()
+				self.assertEqual(len(figure.matplotlib_axes.lines[0].get_xdata()), len(trace.x))
+	
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,133 @@
+from grafica.PlotlyFigure import PlotlyFigure
+from grafica.MatplotlibFigure import MatplotlibFigure, HeadlessMatplotlibFigure
+import grafica
+import numpy as np
+import tempfile
+import unittest
+from pathlib import Path
+
+def count_calls(figure, method_name):
+	calls = []
+	method = getattr(figure, method_name)
+	def counted(*args, **kwargs):
+		calls.append(args)
+		return method(*args, **kwargs)
+	setattr(figure, method_name, counted)
+	return calls
+
+class TestDeferred(unittest.TestCase):
+	
+	def test_set_draws_layout_once(self):
+		for plotter in [PlotlyFigure, MatplotlibFigure]:
+			with self.subTest(i=plotter):
+				figure = plotter()
+				calls = count_calls(figure, 'draw_layout')
+				figure.set(title='Title', subtitle='Subtitle', xlabel='x', ylabel='y', xscale='log')
+				self.assertEqual(len(calls), 1)
+				figure.title = 'Another title'
+				self.assertEqual(len(calls), 2)
+	
+	def test_deferred(self):
+		x = np.linspace(0, 1, 9)
+		for plotter in [PlotlyFigure, MatplotlibFigure]:
+			with self.subTest(i=plotter):
+				figure = plotter()
+				layout_calls = count_calls(figure, 'draw_layout')
+				trace_calls = count_calls(figure, 'draw_traces')
+				figure.set(deferred=True, title='Title', subtitle='Subtitle')
+				for i in range(9):
+					figure.scatter(x, x*i, label=f'{i}')
+					figure.subtitle = f'Subtitle {i}'
+				self.assertEqual(len(layout_calls), 0)
+				self.assertEqual(len(trace_calls), 0)
+				self.assertEqual(len(figure.traces), 9)
+				with tempfile.TemporaryDirectory() as directory:
+					figure.save(file_name=str(Path(directory)/'figure'))
+				self.assertEqual(len(layout_calls), 1)
+				self.assertEqual(len(trace_calls), 1)
+				self.assertEqual(len(trace_calls[0][0]), 9)
+				figure.render() # Nothing left to draw.
+				self.assertEqual(len(layout_calls), 1)
+				self.assertEqual(len(trace_calls), 1)
+	
+	def test_plotly_subtitle_is_not_repeated(self):
+		figure = PlotlyFigure()
+		figure.set(title='Title', subtitle='First')
+		figure.subtitle = 'Second'
+		figure.xlabel = 'x'
+		annotations = [annotation.text for annotation in figure.plotly_figure.layout.annotations]
+		self.assertEqual(annotations, ['Second'])
+	
+	def test_manager(self):
+		figure = grafica.manager.new(deferred=True, title='Deferred')
+		self.assertTrue(figure.deferred)
+		self.assertEqual(figure.title, 'Deferred')
+		grafica.manager.figures.remove(figure)
+		grafica.manager._unsaved_figures.remove(figure)
+	
+class TestSaveAsync(unittest.TestCase):
+	
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		(Path(self.directory.name)/'expected').mkdir()
+	
+	def tearDown(self):
+		self.directory.cleanup()
+	
+	def test_snapshot_is_saved(self):
+		x = np.linspace(0, 1, 99)
+		for plotter in [PlotlyFigure, MatplotlibFigure]:
+			with self.subTest(i=plotter):
+				y = x**2
+				expected = plotter()
+				expected.set(title='Title', xlabel='x')
+				expected.scatter(x, y.copy(), label='scatter')
+				expected.histogram(y.copy())
+				expected = Path(expected.save(file_name=str(Path(self.directory.name)/'expected'/'figure')))
+				figure = plotter()
+				figure.set(title='Title', xlabel='x')
+				figure.scatter(x, y, label='scatter')
+				figure.histogram(y)
+				future = figure.save_async(file_name=str(Path(self.directory.name)/'figure'))
+				y[:] = 0 # None of this must be in the file.
+				figure.title = 'Changed'
+				figure.scatter(x, x)
+				self.assertEqual(figure.flush(), [future.result()])
+				self.assertEqual(Path(future.result()).read_bytes(), expected.read_bytes())
+	
+	def test_pyplot_not_used_in_background(self):
+		import matplotlib.pyplot as plt
+		figure = MatplotlibFigure()
+		figure.scatter([1,2,3], [3,1,2])
+		fignums = plt.get_fignums()
+		snapshot = figure._snapshot_to_save_async()
+		self.assertEqual(plt.get_fignums(), fignums) # No pyplot figure is created, so none is closed from another thread.
+		self.assertIsInstance(snapshot, HeadlessMatplotlibFigure)
+		for i in range(3):
+			figure.save_async(file_name=str(Path(self.directory.name)/f'figure_{i}'))
+		self.assertEqual(len(figure.flush()), 3)
+		self.assertEqual(plt.get_fignums(), fignums)
+		figure.close()
+	
+	def test_errors(self):
+		figure = PlotlyFigure()
+		future = figure.save_async(file_name=str(Path(self.directory.name)/'non_existent_directory'/'figure'))
+		with self.assertRaises(FileNotFoundError):
+			future.result()
+		with self.assertRaises(FileNotFoundError):
+			figure.flush()
+		self.assertEqual(figure.flush(), [])
+	
+	def test_bounded(self):
+		saver = grafica.background.BackgroundSaver(max_workers=1, max_pending=2)
+		figure = PlotlyFigure()
+		figure.scatter([1,2,3], [3,1,2])
+		futures = [figure.save_async(file_name=str(Path(self.directory.name)/f'figure_{i}'), saver=saver) for i in range(9)]
+		self.assertLessEqual(saver.pending, 2)
+		self.assertEqual(saver.flush(), 0)
+		self.assertEqual(saver.pending, 0)
+		self.assertEqual(len(list(Path(self.directory.name).glob('figure_*'))), 9)
+		self.assertTrue(all(future.done() for future in futures))
+	
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,306 @@
+from grafica.FigureManager import FigureManager
+from grafica.figure import Figure
+from grafica import background
+from grafica.plotly_html import plotlyjs_file_name
+from concurrent.futures import Future
+from plotly.offline import get_plotlyjs
+import matplotlib.pyplot as plt
+import numpy as np
+import datetime
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+class TestPlotters(unittest.TestCase):
+	
+	def test_import_is_lazy(self):
+		code = '''
+import sys
+import grafica
+heavy = [name for name in ['plotly','matplotlib','scipy'] if name in sys.modules]
+assert heavy == [], heavy
+grafica.new('matplotlib_headless').scatter([1,2],[3,4])
+assert 'matplotlib' in sys.modules and 'plotly' not in sys.modules and 'scipy' not in sys.modules
+'''
+		subprocess.run([sys.executable, '-c', code], check=True, cwd=Path(__file__).parent.parent)
+	
+	def test_lazy_plotters(self):
+		manager = FigureManager()
+		self.assertEqual(set(manager.plotters), {'plotly', 'matplotlib', 'matplotlib_headless'})
+		manager.add_plotter('grafica.MatplotlibFigure:HeadlessMatplotlibFigure', name='lazy')
+		self.assertFalse(manager.plotters.is_imported('lazy'))
+		figure = manager.new(plotter_name='lazy')
+		self.assertEqual(type(figure).__name__, 'HeadlessMatplotlibFigure')
+		self.assertTrue(manager.plotters.is_imported('lazy'))
+		manager.add_plotter('grafica.figure:nbytes', name='not_a_figure')
+		with self.assertRaises(TypeError):
+			manager.new(plotter_name='not_a_figure')
+		with self.assertRaises(ValueError):
+			manager.add_plotter('grafica.figure.Figure', name='wrong')
+		with self.assertRaises(TypeError):
+			manager.add_plotter(dict, name='wrong')
+		manager.add_plotter(Figure, name='figure')
+		self.assertIs(manager.plotters['figure'], Figure)
+	
+class TestSaving(unittest.TestCase):
+	
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.manager = FigureManager()
+		x = np.linspace(0, 1, 9)
+		for idx, plotter in enumerate(['plotly', 'matplotlib', 'plotly']):
+			figure = self.manager.new(plotter_name=plotter, title=f'Figure {idx}')
+			figure.scatter(x, x**idx, label='scatter')
+	
+	def tearDown(self):
+		self.directory.cleanup()
+	
+	def test_shared_plotlyjs(self):
+		self.manager.save_unsaved(mkdir=self.directory.name, include_plotlyjs='directory')
+		files = sorted(path.name for path in Path(self.directory.name).iterdir())
+		self.assertEqual(files, sorted(['Figure 0.html', 'Figure 1.png', 'Figure 2.html', plotlyjs_file_name()]))
+		for name in ['Figure 0.html', 'Figure 2.html']:
+			html = (Path(self.directory.name)/name).read_text()
+			self.assertIn(f'src="{plotlyjs_file_name()}"', html)
+			self.assertLess(len(html), 99999)
+		self.assertEqual(self.manager._unsaved_figures, [])
+	
+	def test_dashboard(self):
+		path = self.manager.save_dashboard(mkdir=self.directory.name)
+		self.assertEqual([_.name for _ in Path(self.directory.name).iterdir()], ['dashboard.html'])
+		html = path.read_text()
+		self.assertEqual(html.count(get_plotlyjs()[:999]), 1)
+		self.assertEqual(html.count('<img src="data:image/png;base64,'), 1)
+		for idx in range(3):
+			self.assertIn(f'<h2>Figure {idx}</h2>', html)
+			self.assertIn(f'id="figure_{idx+1}"', html)
+		self.assertEqual(self.manager._unsaved_figures, [])
+	
+	def test_dashboard_shared_plotlyjs(self):
+		path = self.manager.save_dashboard(file_name='all', mkdir=self.directory.name, include_plotlyjs='directory')
+		self.assertEqual(path.name, 'all.html')
+		self.assertTrue((Path(self.directory.name)/plotlyjs_file_name()).exists())
+		self.assertLess(path.stat().st_size, 999999)
+	
+	def test_save_async(self):
+		futures = self.manager.save_async(mkdir=self.directory.name)
+		self.assertEqual(self.manager._unsaved_figures, [])
+		for figure in self.manager.figures:
+			figure.title = 'Changed'
+		paths = self.manager.flush()
+		self.assertEqual(sorted(paths), sorted(future.result() for future in futures))
+		files = sorted(path.name for path in Path(self.directory.name).iterdir())
+		self.assertEqual(files, ['Figure 0.html', 'Figure 1.png', 'Figure 2.html'])
+	
+	def test_save_async_failures(self):
+		failed = self.manager.figures[1]
+		failed.title = 'non_existent_directory/Figure 1'
+		self.manager.save_async(mkdir=self.directory.name)
+		with self.assertRaises(RuntimeError) as context:
+			self.manager.flush()
+		self.assertIn('non_existent_directory/Figure 1', str(context.exception))
+		self.assertEqual(self.manager._unsaved_figures, [failed])
+	
+	def test_save_async_immediate_failure(self):
+		class ImmediateSaver: # Each save finishes before `submit` returns.
+			def submit(self, figure, file_name=None, **kwargs):
+				future = Future()
+				try:
+					future.set_result(figure.save(file_name=file_name, **kwargs))
+				except Exception as error:
+					future.set_exception(error)
+				return future
+		self.manager.close_after_save = True
+		failed = self.manager.figures[1]
+		failed.title = 'non_existent_directory/Figure 1'
+		self.manager.save_async(mkdir=self.directory.name, saver=ImmediateSaver())
+		self.assertEqual(self.manager._unsaved_figures, [failed])
+		self.assertEqual(self.manager.figures, [failed]) # Only the saved figures were closed.
+		self.assertIsNotNone(failed.matplotlib_figure)
+		with self.assertRaises(RuntimeError):
+			self.manager.flush()
+		self.assertEqual(self.manager._unsaved_figures, [failed])
+	
+class TestParallelSave(unittest.TestCase):
+	
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.manager = FigureManager()
+		x = np.linspace(0, 1, 99)
+		for idx in range(6):
+			figure = self.manager.new(plotter_name=['plotly','matplotlib'][idx%2], title=f'Figure {idx}', subtitle='Parallel')
+			figure.scatter(x, x**idx, label='scatter')
+			figure.histogram(np.random.randn(999), label='histogram')
+		self.figures = list(self.manager._unsaved_figures)
+	
+	def tearDown(self):
+		self.directory.cleanup()
+	
+	def test_same_as_serial(self):
+		serial = self.manager.save_unsaved(mkdir=Path(self.directory.name)/'serial')
+		self.manager._unsaved_figures = list(self.figures)
+		parallel = self.manager.save_unsaved(mkdir=Path(self.directory.name)/'parallel', workers=3)
+		self.assertEqual(len(parallel), 6)
+		self.assertEqual(self.manager._unsaved_figures, [])
+		for serial_path, parallel_path in zip(serial, parallel):
+			with self.subTest(i=Path(serial_path).name):
+				self.assertEqual(Path(serial_path).name, Path(parallel_path).name)
+				self.assertEqual(Path(serial_path).read_bytes(), Path(parallel_path).read_bytes())
+	
+	def test_failures(self):
+		self.figures[2].title = 'non_existent_directory/Figure 2'
+		for workers in [None, 2]:
+			with self.subTest(i=workers):
+				self.manager._unsaved_figures = list(self.figures)
+				with self.assertRaises(RuntimeError) as context:
+					self.manager.save_unsaved(mkdir=Path(self.directory.name)/str(workers), workers=workers)
+				self.assertIn('non_existent_directory/Figure 2', str(context.exception))
+				self.assertEqual(self.manager._unsaved_figures, [self.figures[2]])
+				self.assertEqual(len(list((Path(self.directory.name)/str(workers)).iterdir())), 5)
+	
+	def test_not_encodable(self):
+		days = [datetime.datetime(2020, 1, day+1, tzinfo=datetime.timezone.utc) for day in range(9)] # Time zones cannot be encoded, see spec._as_array.
+		self.manager.new(plotter_name='matplotlib', title='Time zone').scatter(days, np.arange(9))
+		paths = self.manager.save_unsaved(mkdir=self.directory.name, workers=2)
+		self.assertEqual(len(paths), 7)
+		self.assertTrue(all(Path(path).exists() for path in paths))
+	
+	def test_background_saves_pending(self):
+		class BlockedFigure:
+			def __init__(self):
+				self.event = threading.Event()
+			def save(self, file_name=None):
+				self.event.wait()
+			def close(self):
+				pass
+		blocked = BlockedFigure()
+		background.saver.submit(blocked)
+		with self.assertRaises(RuntimeError):
+			self.manager.save_unsaved(mkdir=self.directory.name, workers=2)
+		self.assertEqual(self.manager._unsaved_figures, self.figures)
+		blocked.event.set()
+		background.saver.flush()
+		self.assertEqual(len(self.manager.save_unsaved(mkdir=self.directory.name, workers=2)), 6)
+	
+class TestReplay(unittest.TestCase):
+	
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.manager = FigureManager()
+		self.figure = self.manager.new(plotter_name='plotly', title='Heavy', xlabel='x')
+		samples = np.random.default_rng(0).normal(size=9999)
+		self.figure.histogram(samples, label='histogram')
+		self.figure.KDE(samples, label='KDE')
+		self.figure.heatmap([1,2,3], [1,2], [[1,2,3],[4,5,6]])
+	
+	def tearDown(self):
+		self.directory.cleanup()
+	
+	def test_replay(self):
+		for plotter_name in ['matplotlib_headless', 'matplotlib', 'plotly']:
+			with self.subTest(i=plotter_name):
+				replayed = self.manager.replay(self.figure, plotter_name, subtitle='Thumbnail')
+				self.assertIs(type(replayed), self.manager.plotters[plotter_name])
+				self.assertEqual((replayed.title, replayed.xlabel, replayed.subtitle), ('Heavy', 'x', 'Thumbnail'))
+				self.assertEqual(self.figure.subtitle, None)
+				self.assertFalse(replayed.deferred)
+				for original, trace in zip(self.figure.traces, replayed.traces):
+					self.assertIs(trace, original) # Not computed again.
+				self.assertIn(replayed, self.manager._unsaved_figures)
+				path = replayed.save(file_name=str(Path(self.directory.name)/plotter_name))
+				self.assertTrue(Path(path).exists())
+		with self.assertRaises(ValueError):
+			self.manager.replay(self.figure, 'unknown')
+	
+	def test_replay_spec(self):
+		from grafica.spec import FigureSpec
+		path = FigureSpec.from_figure(self.figure).save(Path(self.directory.name)/'spec')
+		replayed = self.manager.replay(FigureSpec.load(path), 'matplotlib_headless')
+		self.assertEqual(replayed.title, 'Heavy')
+		self.assertEqual(len(replayed.traces), 3)
+	
+class TestMemory(unittest.TestCase):
+	
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.manager = FigureManager()
+	
+	def tearDown(self):
+		self.directory.cleanup()
+	
+	def new(self, plotter_name, n_points=99):
+		figure = self.manager.new(plotter_name=plotter_name, title=f'Figure {len(self.manager.figures)}')
+		figure.scatter(np.arange(n_points), np.arange(n_points)**2)
+		return figure
+	
+	def test_close_after_save(self):
+		self.manager.close_after_save = True
+		for save in ['save_unsaved', 'save_dashboard', 'save_async']:
+			with self.subTest(i=save):
+				figures = [self.new(plotter_name) for plotter_name in ['matplotlib', 'plotly']]
+				number = figures[0].matplotlib_figure.number
+				kept = self.new('matplotlib')
+				self.manager._unsaved_figures.remove(kept)
+				getattr(self.manager, save)(mkdir=self.directory.name)
+				self.manager.flush()
+				self.assertEqual(self.manager.figures, [kept])
+				self.assertNotIn(number, plt.get_fignums())
+				self.assertIsNone(figures[0].matplotlib_figure)
+				self.assertIsNone(figures[1]._plotly_figure)
+				self.assertIn(kept.matplotlib_figure.number, plt.get_fignums())
+				self.manager._drop([kept])
+	
+	def test_max_figures(self):
+		self.manager.max_figures = 2
+		figures = [self.new('matplotlib') for _ in range(3)]
+		self.assertEqual(self.manager.figures, figures) # None of them is saved.
+		self.manager.save_unsaved(mkdir=self.directory.name)
+		self.assertEqual(self.manager.figures, figures[1:])
+		self.assertIsNone(figures[0].matplotlib_figure)
+		figures[1].xlabel = 'x' # Now figures[2] is the least recently used.
+		figures.append(self.new('plotly'))
+		self.assertEqual(self.manager.figures, [figures[1], figures[3]])
+		self.manager.max_figures = 0
+		self.assertEqual(self.manager.figures, [figures[3]])
+		with self.assertRaises(ValueError):
+			self.manager.max_figures = -1
+	
+	def test_heatmap_memory_footprint(self):
+		z = np.random.default_rng(0).normal(size=(999, 999))
+		for plotter_name in ['plotly', 'matplotlib_headless']:
+			with self.subTest(i=plotter_name):
+				figure = self.manager.new(plotter_name=plotter_name)
+				figure.heatmap(np.arange(999), np.arange(999), z)
+				start = time.perf_counter()
+				footprint = figure.memory_footprint()
+				self.assertLess(time.perf_counter() - start, 1)
+				self.assertGreaterEqual(footprint, z.nbytes)
+				self.assertLessEqual(footprint, 5*z.nbytes) # The trace, the copies of the plotting package and the coordinates of the cells.
+	
+	def test_many_unsaved_figures(self):
+		self.manager.add_plotter(Figure, name='figure')
+		self.manager.max_figures = 10
+		start = time.perf_counter()
+		figures = [self.manager.new('figure') for _ in range(3000)]
+		self.assertLess(time.perf_counter() - start, 5) # It used to grow as the cube of the number of figures, taking about a minute.
+		self.assertEqual(self.manager.figures, figures)
+	
+	def test_memory_footprint(self):
+		self.assertEqual(self.manager.memory_footprint(), 0)
+		for plotter_name in ['plotly', 'matplotlib']:
+			with self.subTest(i=plotter_name):
+				figure = self.new(plotter_name, n_points=99999)
+				footprint = figure.memory_footprint()
+				self.assertGreaterEqual(footprint, 2*99999*8) # At least the arrays of the trace.
+				self.assertLessEqual(footprint, 2*99999*8*2) # Plus the copies of the plotting package, if any.
+				self.manager.save_unsaved(mkdir=self.directory.name)
+				self.manager.max_figures = 0
+				self.assertEqual(self.manager.memory_footprint(), 0)
+				self.manager.max_figures = None
+	
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,66 @@
+from grafica.MatplotlibFigure import MatplotlibFigure, HeadlessMatplotlibFigure
+from grafica.FigureManager import FigureManager
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+def draw_and_save(plotter, idx, file_name):
+	x = np.linspace(-3, 3, 99)
+	figure = plotter()
+	figure.set(title=f'Figure {idx}', subtitle='Headless', xlabel='x', ylabel='y')
+	figure.scatter(x, np.sin(idx*x), label='sin')
+	figure.errorband(x, x, x**2/9, x**2/9)
+	figure.histogram(np.random.default_rng(idx).normal(size=999), label='histogram')
+	figure.heatmap(x, x, np.add.outer(x, idx*x))
+	return figure.save(file_name=file_name)
+
+class TestHeadless(unittest.TestCase):
+	
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+	
+	def tearDown(self):
+		self.directory.cleanup()
+	
+	def test_pyplot_is_not_imported(self):
+		code = f'''
+import sys
+from grafica.MatplotlibFigure import HeadlessMatplotlibFigure
+figure = HeadlessMatplotlibFigure()
+figure.set(title='Title')
+figure.scatter([1,2,3], [3,1,2], label='scatter')
+figure.save(file_name={repr(str(Path(self.directory.name)/'figure'))})
+assert 'matplotlib.pyplot' not in sys.modules
+'''
+		subprocess.run([sys.executable, '-c', code], check=True, cwd=Path(__file__).parent.parent)
+		self.assertTrue((Path(self.directory.name)/'figure.png').exists())
+	
+	def test_same_as_pyplot(self):
+		for plotter in [MatplotlibFigure, HeadlessMatplotlibFigure]:
+			draw_and_save(plotter, 1, str(Path(self.directory.name)/plotter.__name__))
+		self.assertEqual(
+			(Path(self.directory.name)/'MatplotlibFigure.png').read_bytes(),
+			(Path(self.directory.name)/'HeadlessMatplotlibFigure.png').read_bytes(),
+		)
+	
+	def test_threads(self):
+		serial = [draw_and_save(HeadlessMatplotlibFigure, idx, str(Path(self.directory.name)/f'serial_{idx}')) for idx in range(8)]
+		with ThreadPoolExecutor(max_workers=4) as executor:
+			threads = list(executor.map(lambda idx: draw_and_save(HeadlessMatplotlibFigure, idx, str(Path(self.directory.name)/f'threads_{idx}')), range(8)))
+		for serial_path, threads_path in zip(serial, threads):
+			self.assertEqual(Path(serial_path).read_bytes(), Path(threads_path).read_bytes())
+	
+	def test_show(self):
+		with self.assertWarns(UserWarning):
+			HeadlessMatplotlibFigure().show()
+		manager = FigureManager()
+		manager.new(plotter_name='matplotlib_headless')
+		with self.assertWarns(UserWarning):
+			manager.show() # Does not fail because of the headless figure.
+	
+if __name__ == '__main__':
+	unittest.main()
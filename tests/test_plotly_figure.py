@@ -0,0 +1,90 @@
+from grafica.PlotlyFigure import PlotlyFigure
+import plotly.graph_objects as go
+import plotly.io as pio
+import numpy as np
+import unittest
+
+class TestWebGL(unittest.TestCase):
+	
+	def test_threshold(self):
+		x = np.linspace(0, 1, 99)
+		for threshold, expected in [(None, go.Scatter), (999, go.Scatter), (98, go.Scattergl), (0, go.Scattergl)]:
+			with self.subTest(i=threshold):
+				figure = PlotlyFigure()
+				figure.WEBGL_THRESHOLD = threshold
+				figure.scatter(x, x**2, marker='o', linestyle='dashed', color=(255,0,0), label='scatter')
+				figure.errorband(x, x, x*0+1, x*0+1, label='errorband')
+				self.assertEqual([type(trace) for trace in figure.plotly_figure.data], [expected]*3)
+				scatter = figure.plotly_figure.data[0]
+				self.assertEqual(scatter.marker.symbol, 'circle-open')
+				self.assertEqual(scatter.line.dash, 'dash')
+				self.assertEqual(scatter.marker.color, '#ff0000')
+				self.assertEqual(scatter.showlegend, True)
+				self.assertEqual(figure.plotly_figure.data[1].legendgroup, figure.plotly_figure.data[2].legendgroup)
+	
+class TestBulkTraces(unittest.TestCase):
+	
+	def draw(self, figure, after_each_trace=lambda: None):
+		rng = np.random.default_rng(0)
+		x = np.linspace(1, 2, 99)
+		figure.set(title='Bulk', xlabel='x', subtitle='Subtitle')
+		for draw in [
+			lambda: figure.scatter(x, x**2, label='scatter', marker='o'),
+			lambda: figure.errorband(x, x, x/9, x/8, label='errorband'),
+			lambda: figure.histogram(rng.normal(size=999), label='histogram'),
+			lambda: figure.KDE(rng.normal(size=999), label='KDE'),
+			lambda: figure.scatter_many(x, np.outer(np.arange(3), x), label='scatter_many'),
+			lambda: figure.heatmap(x, x, np.outer(x, x), zlabel='z'),
+			lambda: figure.contour(x, x, np.outer(x, x)),
+		]:
+			draw()
+			after_each_trace()
+		return figure
+	
+	def test_same_as_one_by_one(self):
+		one_by_one = PlotlyFigure()
+		self.draw(one_by_one, after_each_trace=lambda: one_by_one.plotly_figure) # Each trace is added to the go.Figure as soon as it is drawn.
+		self.assertEqual(one_by_one._trace_dicts, [])
+		bulk = self.draw(PlotlyFigure())
+		deferred = PlotlyFigure()
+		deferred.deferred = True
+		self.draw(deferred)
+		self.assertEqual(len(deferred._undrawn_traces), 7)
+		expected = pio.to_json(one_by_one.plotly_figure)
+		for figure in [bulk, deferred]:
+			self.assertEqual(pio.to_json(figure.plotly_figure), expected) # Also the deferred traces, without calling `render`.
+	
+class TestCompactHistogram(unittest.TestCase):
+	
+	def test_compact_histogram(self):
+		samples = np.random.randn(9999)
+		bin_edges = np.linspace(-2, 2, 22)
+		for marker in [None, 'o']:
+			with self.subTest(i=marker):
+				figure = PlotlyFigure()
+				figure.COMPACT_HISTOGRAM_THRESHOLD = 0
+				figure.histogram(samples, bins=bin_edges, marker=marker, label='histogram')
+				bins, outside = figure.plotly_figure.data
+				histogram = figure.traces[0]
+				self.assertEqual(bins.line.shape, 'hv')
+				self.assertTrue(np.array_equal(bins.x[1::2], (bin_edges[:-1]+bin_edges[1:])/2))
+				self.assertTrue(np.array_equal(bins.y[1::2], histogram.bin_counts[1:-1]))
+				self.assertTrue(np.array_equal(np.array(bins.customdata)[1::2], np.stack([bin_edges[:-1], bin_edges[1:]], axis=1)))
+				self.assertEqual(outside.y[1], histogram.bin_counts[0])
+				self.assertEqual(outside.y[-2], histogram.bin_counts[-1])
+				self.assertEqual(bins.showlegend, True)
+				self.assertEqual(outside.showlegend, False)
+				self.assertEqual(bins.legendgroup, outside.legendgroup)
+				if marker is None:
+					self.assertEqual(bins.mode, 'lines')
+				else:
+					self.assertEqual(bins.mode, 'lines+markers')
+					self.assertEqual(bins.marker.symbol, 'circle-open')
+					self.assertEqual(set(bins.marker.size[1::2]), {6})
+					self.assertEqual(set(bins.marker.size[0::2]), {0})
+		figure = PlotlyFigure()
+		figure.histogram(samples, bins=bin_edges)
+		self.assertEqual(len(figure.plotly_figure.data), 3) # Default is not compact for few bins.
+	
+if __name__ == '__main__':
+	unittest.main()
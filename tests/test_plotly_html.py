@@ -0,0 +1,62 @@
+from grafica.plotly_html import encode_typed_arrays, typed_array
+from grafica.PlotlyFigure import PlotlyFigure
+import numpy as np
+import base64
+import tempfile
+import unittest
+from pathlib import Path
+
+def decode(typed):
+	dtypes = {'i1':np.int8, 'u1':np.uint8, 'i2':np.int16, 'u2':np.uint16, 'i4':np.int32, 'u4':np.uint32, 'f4':np.float32, 'f8':np.float64}
+	array = np.frombuffer(base64.b64decode(typed['bdata']), dtype=np.dtype(dtypes[typed['dtype']]).newbyteorder('<'))
+	if 'shape' in typed:
+		array = array.reshape([int(_) for _ in typed['shape'].split(',')])
+	return array
+
+class TestTypedArrays(unittest.TestCase):
+	
+	def test_typed_array(self):
+		for array, dtype in [
+			(np.random.randn(99), 'f8'),
+			(np.random.randn(9,3), 'f8'),
+			(np.arange(99), 'i4'),
+			(np.arange(99, dtype=np.uint16), 'u2'),
+			(np.array([2**40, 1]), 'f8'),
+			(np.array([True, False]), 'u1'),
+			(np.array([np.nan, np.inf, 1]), 'f8'),
+			([1, 2.5, 3], 'f8'),
+		]:
+			with self.subTest(i=(np.asarray(array).dtype, dtype)):
+				typed = typed_array(array)
+				self.assertEqual(typed['dtype'], dtype)
+				self.assertTrue(np.array_equal(decode(typed), array, equal_nan=True))
+		self.assertIsNone(typed_array(['a','b']))
+	
+	def test_float32(self):
+		x = np.linspace(0, 1, 99)
+		self.assertEqual(typed_array(x, float32=True)['dtype'], 'f4')
+		self.assertEqual(typed_array(1e9 + x, float32=True)['dtype'], 'f8') # float32 cannot resolve the steps.
+		self.assertEqual(typed_array(np.array([1e300, 1]), float32=True)['dtype'], 'f8')
+		self.assertEqual(typed_array(np.array([np.nan, 1, 2]), float32=True)['dtype'], 'f4')
+	
+	def test_figure(self):
+		figure = PlotlyFigure()
+		x = np.linspace(0, 1, 99)
+		figure.scatter(x, x**2, label='scatter')
+		figure.histogram(np.random.randn(999), label='histogram')
+		figure_dict = figure.plotly_figure.to_plotly_json()
+		encoded = encode_typed_arrays(figure_dict)
+		self.assertEqual(encoded['layout'], figure_dict['layout'])
+		self.assertTrue(np.array_equal(decode(encoded['data'][0]['x']), x))
+		self.assertEqual(encoded['data'][0]['name'], 'scatter')
+		self.assertEqual(encoded['data'][2]['text'], figure_dict['data'][2]['text'])
+		with tempfile.TemporaryDirectory() as directory:
+			figure.save(file_name=str(Path(directory)/'json'))
+			figure.save(file_name=str(Path(directory)/'typed'), typed_arrays=True)
+			self.assertIn('"bdata"', (Path(directory)/'typed.html').read_text())
+			self.assertLess((Path(directory)/'typed.html').stat().st_size, (Path(directory)/'json.html').stat().st_size)
+			with self.assertRaises(ValueError):
+				figure.save(file_name=str(Path(directory)/'float32'), float32=True)
+	
+if __name__ == '__main__':
+	unittest.main()
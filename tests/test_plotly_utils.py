@@ -0,0 +1,31 @@
+from grafica.plotly_utils import utils, colors
+import plotly.io as pio
+import plotly.graph_objects as go
+from plotly.colors import qualitative
+import unittest
+
+class TestTemplate(unittest.TestCase):
+	
+	def test_import_has_no_side_effects(self):
+		self.assertEqual(pio.templates.default, 'plotly')
+		self.assertNotIn(utils.TEMPLATE_NAME, pio.templates)
+		self.assertEqual(len(pio.templates['plotly'].data.scatter), 1)
+		self.assertEqual(len(qualitative.Plotly), 10)
+		self.assertEqual(len(colors.MyColors2021), 12)
+	
+	def test_template(self):
+		template = utils.build_template()
+		self.assertIs(utils.build_template(), template)
+		self.assertIs(utils.my_template, template)
+		self.assertIsInstance(utils.my_template, go.layout.Template)
+		from grafica.plotly_utils.utils import my_template
+		self.assertIs(my_template, template)
+		self.assertEqual(len(go.Figure().update_layout(template=my_template).layout.template.data.scatter), len(utils.MARKERS))
+		self.assertEqual([scatter.marker.symbol for scatter in template.data.scatter], utils.MARKERS)
+		self.assertEqual(len(pio.templates['plotly'].data.scatter), 1)
+		figure = utils.apply_template(go.Figure())
+		self.assertEqual(len(figure.layout.template.data.scatter), len(utils.MARKERS))
+		self.assertEqual(pio.templates.default, 'plotly')
+	
+if __name__ == '__main__':
+	unittest.main()
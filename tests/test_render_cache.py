@@ -0,0 +1,151 @@
+from grafica.render_cache import RenderCache
+from grafica.FigureManager import FigureManager
+from grafica.PlotlyFigure import PlotlyFigure
+from grafica.MatplotlibFigure import HeadlessMatplotlibFigure
+from grafica.plotly_html import plotlyjs_file_name
+import numpy as np
+import datetime
+import tempfile
+import unittest
+from pathlib import Path
+
+def new_figure(plotter, power=2):
+	x = np.linspace(0, 1, 99)
+	figure = plotter()
+	figure.set(title='Cached', xlabel='x')
+	figure.scatter(x, x**power, label='scatter')
+	figure.histogram(np.random.default_rng(0).normal(size=999))
+	return figure
+
+def count_saves(figure):
+	calls = []
+	save = figure.save
+	def counted(*args, **kwargs):
+		calls.append(args)
+		return save(*args, **kwargs)
+	figure.save = counted
+	return calls
+
+class TestRenderCache(unittest.TestCase):
+	
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.cache_directory = Path(self.directory.name)/'cache'
+		self.file_name = str(Path(self.directory.name)/'figure')
+	
+	def tearDown(self):
+		self.directory.cleanup()
+	
+	def test_hit(self):
+		for plotter in [PlotlyFigure, HeadlessMatplotlibFigure]:
+			with self.subTest(i=plotter):
+				cache = RenderCache(self.cache_directory)
+				cache.clear()
+				figure = new_figure(plotter)
+				path = cache.save(figure, file_name=self.file_name)
+				content = Path(path).read_bytes()
+				modified = Path(path).stat().st_mtime_ns
+				figure = new_figure(plotter) # The same figure, in the next run.
+				calls = count_saves(figure)
+				self.assertEqual(cache.save(figure, file_name=self.file_name), path)
+				self.assertEqual(calls, [])
+				self.assertEqual(Path(path).stat().st_mtime_ns, modified) # Not written again.
+				Path(path).unlink()
+				cache = RenderCache(self.cache_directory) # Persists between runs.
+				self.assertEqual(cache.save(figure, file_name=self.file_name), path)
+				self.assertEqual(calls, [])
+				self.assertEqual(Path(path).read_bytes(), content) # Restored from the cache.
+				self.assertEqual((cache.hits, cache.misses), (1, 0))
+	
+	def test_miss(self):
+		cache = RenderCache(self.cache_directory)
+		cache.save(new_figure(PlotlyFigure), file_name=self.file_name)
+		for figure, kwargs in [(new_figure(PlotlyFigure, power=3), {}), (new_figure(PlotlyFigure), {'typed_arrays': True}), (new_figure(HeadlessMatplotlibFigure), {})]:
+			calls = count_saves(figure)
+			cache.save(figure, file_name=self.file_name, **kwargs)
+			self.assertEqual(len(calls), 1)
+		figure = new_figure(PlotlyFigure)
+		figure.subtitle = 'Changed'
+		self.assertNotEqual(cache.key(figure, self.file_name), cache.key(new_figure(PlotlyFigure), self.file_name))
+		self.assertEqual((cache.hits, cache.misses), (0, 4))
+		self.assertEqual(len(cache), 4)
+	
+	def test_eviction(self):
+		path = RenderCache(self.cache_directory).save(new_figure(HeadlessMatplotlibFigure), file_name=f'{self.file_name}_0')
+		size = Path(path).stat().st_size # The same figure saved with another name has the same size.
+		cache = RenderCache(self.cache_directory, max_bytes=2*size)
+		cache.save(new_figure(HeadlessMatplotlibFigure), file_name=f'{self.file_name}_1')
+		cache.save(new_figure(HeadlessMatplotlibFigure), file_name=f'{self.file_name}_0') # Now the least recently used is 1.
+		self.assertEqual((cache.hits, cache.evictions, cache.size), (1, 0, 2*size))
+		cache.save(new_figure(HeadlessMatplotlibFigure), file_name=f'{self.file_name}_2')
+		self.assertEqual((cache.evictions, cache.size, len(cache)), (1, 2*size, 2))
+		self.assertEqual(len(list(self.cache_directory.glob('*.png'))), 2)
+		for name, is_cached in [('0', True), ('2', True), ('1', False)]:
+			figure = new_figure(HeadlessMatplotlibFigure)
+			calls = count_saves(figure)
+			cache.save(figure, file_name=f'{self.file_name}_{name}')
+			self.assertEqual(len(calls), 0 if is_cached else 1)
+	
+	def test_index(self):
+		cache = RenderCache(self.cache_directory)
+		index_path = self.cache_directory/RenderCache.INDEX_FILE_NAME
+		with cache.batch():
+			for name in ['0', '1', '2']:
+				cache.save(new_figure(HeadlessMatplotlibFigure), file_name=f'{self.file_name}_{name}')
+				self.assertFalse(index_path.exists()) # Written only at the end of the batch.
+		index = index_path.read_text()
+		modified = index_path.stat().st_mtime_ns
+		for name in ['0', '1', '2']:
+			cache.save(new_figure(HeadlessMatplotlibFigure), file_name=f'{self.file_name}_{name}')
+		self.assertEqual((cache.hits, index_path.stat().st_mtime_ns), (3, modified)) # Hits do not write it.
+		cache = RenderCache(self.cache_directory, max_bytes=cache.size//3)
+		with cache.batch():
+			cache.save(new_figure(HeadlessMatplotlibFigure), file_name=f'{self.file_name}_3')
+			self.assertEqual((len(cache), index_path.read_text()), (4, index)) # Evicted only at the end of the batch.
+		self.assertEqual((len(cache), cache.evictions), (1, 3))
+		self.assertEqual(len(RenderCache(self.cache_directory)), 1)
+	
+	def test_plotlyjs_directory(self):
+		manager = FigureManager()
+		manager.render_cache = RenderCache(self.cache_directory)
+		directory = Path(self.directory.name)/'plots'
+		for idx in range(2):
+			manager.new(plotter_name='plotly', title='Cached').scatter([0, 1], [1, 2])
+			paths = manager.save_unsaved(mkdir=directory, include_plotlyjs='directory')
+			self.assertEqual(manager.render_cache.hits, idx)
+			self.assertEqual(sorted(path.name for path in directory.iterdir()), sorted([Path(paths[0]).name, plotlyjs_file_name()]))
+			for path in directory.iterdir(): # The second time both files are restored.
+				path.unlink()
+	
+	def test_data_types(self):
+		days = [datetime.datetime(2020, 1, 1) + datetime.timedelta(days=day) for day in range(9)]
+		aware_days = [day.replace(tzinfo=datetime.timezone.utc) for day in days]
+		for idx in range(2): # The second time everything that can be hashed is in the cache.
+			manager = FigureManager()
+			manager.render_cache = RenderCache(self.cache_directory)
+			for title, x in {'range': range(9), 'datetime': days, 'datetime with time zone': aware_days}.items():
+				figure = manager.new(plotter_name='matplotlib_headless', title=title)
+				figure.scatter(x, np.arange(9))
+			paths = manager.save_unsaved(mkdir=self.directory.name)
+			self.assertEqual(len(paths), 3)
+			self.assertTrue(all(Path(path).exists() for path in paths))
+			self.assertEqual((manager.render_cache.hits, manager.render_cache.misses), [(0, 3), (2, 1)][idx])
+			self.assertEqual(len(manager.render_cache), 2) # The figure with time zones is not cached.
+	
+	def test_manager(self):
+		for workers in [None, 2]:
+			with self.subTest(i=workers):
+				manager = FigureManager()
+				manager.render_cache = RenderCache(self.cache_directory)
+				figures = [new_figure(PlotlyFigure, power) for power in range(3)]
+				for idx, figure in enumerate(figures):
+					figure.title = f'Figure {idx}'
+				manager.figures = manager._unsaved_figures = figures
+				paths = manager.save_unsaved(mkdir=self.directory.name, workers=workers)
+				self.assertEqual([Path(path).name for path in paths], ['Figure 0.html', 'Figure 1.html', 'Figure 2.html'])
+				self.assertEqual(manager.render_cache.hits, 0 if workers is None else 3)
+				with self.assertRaises(TypeError):
+					manager.render_cache = 'cache'
+	
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,100 @@
+from grafica.traces import Histogram, KDE
+import grafica.samples
+import numpy as np
+import tempfile
+import unittest
+from pathlib import Path
+
+class TestOutOfCoreSamples(unittest.TestCase):
+	
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.samples = np.concatenate([np.random.randn(99999), [np.nan, np.inf, -np.inf]])
+		self.weights = np.random.rand(len(self.samples))
+		self.samples_path = Path(self.directory.name)/'samples.npy'
+		self.weights_path = Path(self.directory.name)/'weights.npy'
+		np.save(self.samples_path, self.samples)
+		np.save(self.weights_path, self.weights)
+		self.WINDOW_SIZE = grafica.samples.WINDOW_SIZE
+		grafica.samples.WINDOW_SIZE = 9999 # Force several windows.
+	
+	def tearDown(self):
+		grafica.samples.WINDOW_SIZE = self.WINDOW_SIZE
+		self.directory.cleanup()
+	
+	def assertSameHistogram(self, histogram, reference):
+		for attribute in ['x','y','bin_edges','bin_counts']:
+			self.assertTrue(np.array_equal(getattr(histogram, attribute), getattr(reference, attribute), equal_nan=True))
+	
+	def test_histogram(self):
+		for bins in [22, 'sturges', np.linspace(-2,2,33)]:
+			reference = Histogram(self.samples, color=(0,0,0), bins=bins)
+			for samples in [self.samples_path, str(self.samples_path), np.load(self.samples_path, mmap_mode='r')]:
+				with self.subTest(i=(bins, type(samples))):
+					self.assertSameHistogram(Histogram(samples, color=(0,0,0), bins=bins), reference)
+	
+	def test_histogram_iterator(self):
+		bins = np.linspace(-2,2,33)
+		reference = Histogram(self.samples, color=(0,0,0), bins=bins)
+		self.assertSameHistogram(Histogram(iter(np.array_split(self.samples, 7)), color=(0,0,0), bins=bins), reference)
+		with self.assertRaises(ValueError):
+			Histogram(iter(np.array_split(self.samples, 7)), color=(0,0,0), bins='auto')
+	
+	def test_kde(self):
+		finite = np.isfinite(self.samples)
+		samples = self.samples[finite]
+		np.save(self.samples_path, samples)
+		np.save(self.weights_path, self.weights[finite])
+		for bw_method in [None, 'silverman', .3]:
+			for weights in [None, self.weights[finite]]:
+				with self.subTest(i=(bw_method, weights is None)):
+					reference = KDE(samples, color=(0,0,0), bw_method=bw_method, weights=weights)
+					kde = KDE(
+						np.load(self.samples_path, mmap_mode='r'),
+						color = (0,0,0),
+						bw_method = bw_method,
+						weights = None if weights is None else self.weights_path,
+					)
+					self.assertTrue(np.array_equal(kde.x, reference.x))
+					self.assertTrue(np.allclose(kde.y, reference.y, rtol=1e-9, atol=0))
+		with self.assertRaises(ValueError):
+			KDE(iter(np.array_split(samples, 7)), color=(0,0,0))
+	
+	def test_kde_fft_engine(self):
+		samples = self.samples[np.isfinite(self.samples)]
+		np.save(self.samples_path, samples)
+		for bw_method in [None, 'silverman', .3]:
+			for source in [samples, self.samples_path]:
+				with self.subTest(i=(bw_method, type(source))):
+					reference = KDE(samples, color=(0,0,0), bw_method=bw_method)
+					kde = KDE(source, color=(0,0,0), bw_method=bw_method, engine='fft')
+					self.assertTrue(np.array_equal(kde.x, reference.x))
+					self.assertLess(np.abs(kde.y-reference.y).max(), 2.5e-4*reference.y.max())
+		rng = np.random.default_rng(0)
+		samples = np.concatenate([rng.normal(size=15000), rng.normal(5, .05, size=5000)]) # Bimodal with a narrow peak, the worst case.
+		for bw_method in [None, 'silverman', .3]:
+			for weights in [None, rng.uniform(.5, 2, len(samples))]:
+				with self.subTest(i=(bw_method, 'bimodal', weights is None)):
+					reference = KDE(samples, color=(0,0,0), x=500, bw_method=bw_method, weights=weights)
+					kde = KDE(samples, color=(0,0,0), x=500, bw_method=bw_method, weights=weights, engine='fft')
+					self.assertLess(np.abs(kde.y-reference.y).max(), 2.5e-4*reference.y.max())
+		with self.assertRaises(ValueError):
+			KDE(samples, color=(0,0,0), engine='fast')
+	
+	def test_kde_chunks_and_workers(self):
+		samples = self.samples[np.isfinite(self.samples)][:9999]
+		weights = self.weights[:9999]
+		np.save(self.samples_path, samples)
+		for source in [samples, self.samples_path]:
+			reference = KDE(source, color=(0,0,0), weights=weights)
+			for max_memory, workers, pool in [(2**20,None,'threads'), (1,None,'threads'), (2**20,3,'threads'), (2**20,2,'processes')]:
+				with self.subTest(i=(type(source), max_memory, workers, pool)):
+					kde = KDE(source, color=(0,0,0), weights=weights, max_memory=max_memory, workers=workers, pool=pool)
+					self.assertTrue(np.allclose(kde.y, reference.y, rtol=1e-12, atol=0))
+					if not isinstance(source, Path) and max_memory > 1:
+						self.assertTrue(np.array_equal(kde.y, reference.y))
+		with self.assertRaises(ValueError):
+			KDE(samples, color=(0,0,0), workers=2, pool='gpu')
+	
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,75 @@
+from grafica.PlotlyFigure import PlotlyFigure
+from grafica.MatplotlibFigure import HeadlessMatplotlibFigure
+from grafica.traces import ScatterMany
+from matplotlib.collections import LineCollection
+import numpy as np
+import tempfile
+import unittest
+from pathlib import Path
+
+class TestScatterMany(unittest.TestCase):
+	
+	def setUp(self):
+		self.x = np.linspace(0, 1, 9)
+		self.y = np.outer(np.arange(1, 5), self.x**2)
+	
+	def test_trace(self):
+		trace = ScatterMany(self.x, self.y, color=(255,0,0), label='lines')
+		self.assertIs(trace.x, self.x) # Not copied.
+		self.assertIs(trace.y, self.y)
+		self.assertEqual(trace.n_lines, 4)
+		self.assertEqual(trace.color, (1,0,0))
+		ScatterMany(np.tile(self.x, (4,1)), self.y, color=(0,0,0)) # One x per line.
+		ScatterMany(self.x, self.y.tolist(), color=(0,0,0))
+		for x, y in [(self.x, self.y[0]), (self.x[1:], self.y), (self.x[None,:], self.y), (self.x, [[1,2],[1]])]:
+			with self.subTest(i=(np.shape(x), len(y))):
+				with self.assertRaises(ValueError):
+					ScatterMany(x, y, color=(0,0,0))
+		with self.assertRaises(ValueError):
+			ScatterMany(self.x, self.y, color=(0,0,0), linestyle='wavy')
+	
+	def test_default_color(self):
+		figure = PlotlyFigure()
+		colors = figure.DEFAULT_COLORS
+		figure.scatter_many(self.x, self.y)
+		figure.scatter(self.x, self.x)
+		self.assertEqual([trace.color for trace in figure.traces], [tuple(_/255 for _ in color) for color in colors[:2]]) # A single color for all the lines.
+	
+	def test_plotly(self):
+		figure = PlotlyFigure()
+		figure.scatter_many(self.x, self.y, label='lines')
+		self.assertEqual(len(figure.plotly_figure.data), 1)
+		trace = figure.plotly_figure.data[0]
+		self.assertEqual(len(trace.x), 4*len(self.x) + 3)
+		for idx in range(4): # Each line is followed by a NaN.
+			line = slice(idx*(len(self.x)+1), idx*(len(self.x)+1) + len(self.x))
+			np.testing.assert_array_equal(trace.x[line], self.x)
+			np.testing.assert_array_equal(trace.y[line], self.y[idx])
+		self.assertTrue(np.all(np.isnan(np.asarray(trace.y, dtype=float)[len(self.x)::len(self.x)+1])))
+		self.assertEqual((trace.name, trace.showlegend), ('lines', True))
+	
+	def test_matplotlib(self):
+		figure = HeadlessMatplotlibFigure()
+		figure.scatter_many(self.x, self.y, label='lines', linestyle='dashed')
+		figure.render()
+		axes = figure.matplotlib_axes
+		self.assertEqual(len(axes.lines), 0)
+		self.assertEqual(len(axes.collections), 1)
+		collection = axes.collections[0]
+		self.assertIsInstance(collection, LineCollection)
+		self.assertEqual(len(collection.get_paths()), 4)
+		for path, y in zip(collection.get_paths(), self.y):
+			np.testing.assert_array_equal(path.vertices, np.column_stack([self.x, y]))
+		self.assertGreaterEqual(axes.get_ylim()[1], self.y.max()) # The axes are scaled to the lines.
+		self.assertEqual([text.get_text() for text in axes.get_legend().get_texts()], ['lines'])
+	
+	def test_save(self):
+		with tempfile.TemporaryDirectory() as directory:
+			for plotter in [PlotlyFigure, HeadlessMatplotlibFigure]:
+				with self.subTest(i=plotter):
+					figure = plotter()
+					figure.scatter_many(self.x, self.y, alpha=.5)
+					self.assertTrue(Path(figure.save(file_name=str(Path(directory)/plotter.__name__))).exists())
+
+if __name__ == '__main__':
+	unittest.main()
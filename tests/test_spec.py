@@ -0,0 +1,138 @@
+from grafica.spec import FigureSpec, load_npz
+from grafica.PlotlyFigure import PlotlyFigure
+from grafica.MatplotlibFigure import HeadlessMatplotlibFigure
+from grafica.FigureManager import Plotters
+from grafica.figure import Figure
+import numpy as np
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+def new_figure(plotter, **settings):
+	rng = np.random.default_rng(0)
+	x = np.linspace(1, 2, 99)
+	figure = plotter()
+	for name, value in settings.items():
+		setattr(figure, name, value)
+	figure.set(title='Spec', subtitle='Subtitle', xlabel='x', ylabel='y', yscale='log')
+	figure.scatter(x, x**2, label='scatter', marker='o')
+	figure.errorband(x, x, x/9, x/8, label='errorband')
+	figure.histogram(rng.normal(size=999), label='histogram', density=True)
+	figure.KDE(rng.normal(size=999), label='KDE')
+	figure.heatmap(x, x, np.outer(x, x), zlabel='z')
+	figure.contour(x, x, np.outer(x, x), zscale='log')
+	figure.scatter_many(x, np.outer(np.arange(1, 4), x), label='scatter_many', alpha=.5)
+	return figure
+
+class TestFigureSpec(unittest.TestCase):
+	
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		for name in ['original', 'loaded']:
+			(Path(self.directory.name)/name).mkdir()
+	
+	def tearDown(self):
+		self.directory.cleanup()
+	
+	def test_round_trip(self):
+		original = new_figure(PlotlyFigure, WEBGL_THRESHOLD=9)
+		path = FigureSpec.from_figure(original).save(Path(self.directory.name)/'spec')
+		self.assertEqual(Path(path).name, 'spec.npz')
+		for mmap in [True, False]:
+			with self.subTest(i=mmap):
+				spec = FigureSpec.load(path, mmap=mmap)
+				self.assertEqual(spec.plotter, 'grafica.PlotlyFigure:PlotlyFigure')
+				self.assertEqual(spec.settings['WEBGL_THRESHOLD'], 9)
+				self.assertEqual([type(trace) for trace in spec.traces], [type(trace) for trace in original.traces])
+				self.assertEqual(isinstance(spec.traces[0].x, np.memmap), mmap)
+				self.assertIs(spec.traces[0].x, spec.traces[0].original_x) # Stored only once.
+				self.assertEqual(spec.traces[0].color, original.traces[0].color)
+				np.testing.assert_array_equal(spec.traces[2].bin_counts, original.traces[2].bin_counts)
+				loaded = spec.build()
+				self.assertIsInstance(loaded, PlotlyFigure)
+				self.assertEqual(loaded.WEBGL_THRESHOLD, 9)
+				self.assertEqual((loaded.title, loaded.subtitle, loaded.yscale), ('Spec', 'Subtitle', 'log'))
+				self.assertEqual(
+					Path(loaded.save(file_name=str(Path(self.directory.name)/'loaded'/'figure'))).read_bytes(),
+					Path(original.save(file_name=str(Path(self.directory.name)/'original'/'figure'))).read_bytes(),
+				)
+	
+	def test_other_plotter(self):
+		path = FigureSpec.from_figure(new_figure(PlotlyFigure)).save(Path(self.directory.name)/'spec')
+		figure = FigureSpec.load(path).build(HeadlessMatplotlibFigure)
+		self.assertIsInstance(figure, HeadlessMatplotlibFigure)
+		self.assertTrue(Path(figure.save(file_name=str(Path(self.directory.name)/'figure'))).exists())
+	
+	def test_samples_are_not_saved(self):
+		samples = np.random.randn(99999)
+		figure = PlotlyFigure()
+		figure.histogram(samples, bins=9)
+		figure.KDE(samples, x=9, engine='fft')
+		path = FigureSpec.from_figure(figure).save(Path(self.directory.name)/'spec')
+		self.assertLess(Path(path).stat().st_size, 9999)
+		self.assertNotIn('_samples', vars(FigureSpec.load(path).traces[0]))
+	
+	def test_points_before_decimation_are_not_saved(self):
+		x = np.linspace(0, 1, 99999)
+		figure = PlotlyFigure()
+		figure.scatter(x, np.sin(x), max_points=99)
+		figure.errorband(x, x, x/9, x/8, max_points=99)
+		path = FigureSpec.from_figure(figure).save(Path(self.directory.name)/'spec')
+		self.assertTrue(all(array.size < 999 for name, array in load_npz(path).items() if name != 'metadata'))
+		scatter, errorband = FigureSpec.load(path).traces
+		self.assertNotIn('_original_x', vars(scatter))
+		self.assertIs(scatter.original_x, scatter.x)
+		self.assertIs(errorband.original_lower, errorband.lower)
+		np.testing.assert_array_equal(scatter.y, figure.traces[0].y)
+	
+	def test_copy(self):
+		x = np.linspace(0, 1, 9)
+		figure = PlotlyFigure()
+		figure.scatter(x, x)
+		spec = FigureSpec.from_figure(figure, copy=True)
+		x[:] = 0
+		figure.title = 'Changed'
+		self.assertEqual(spec.traces[0].x.max(), 1)
+		self.assertEqual(spec.properties.get('title'), None)
+		self.assertIs(FigureSpec.from_figure(figure).traces[0].x, x)
+	
+	def test_validation(self):
+		with self.assertRaises(TypeError):
+			FigureSpec(dict)
+		with self.assertRaises(ValueError):
+			FigureSpec(PlotlyFigure, properties={'color': 'red'})
+		with self.assertRaises(TypeError):
+			FigureSpec(PlotlyFigure, traces=[[1,2,3]])
+	
+	def test_load_only_registered_classes(self):
+		path = Path(self.directory.name)/'spec.npz'
+		FigureSpec(Figure).save(path)
+		with self.assertRaises(ValueError):
+			FigureSpec.load(path) # Figure is not registered in grafica.manager.
+		plotters = Plotters()
+		plotters['figure'] = Figure
+		self.assertIs(FigureSpec.load(path, plotters=plotters).build().__class__, Figure)
+		arrays = load_npz(FigureSpec.from_figure(new_figure(PlotlyFigure)).save(path), mmap=False)
+		metadata = json.loads(bytes(arrays.pop('metadata')).decode('utf-8'))
+		for key, value in [('plotter', 'antigravity:Figure'), ('traces', [{'class': 'antigravity:Trace', 'state': {}}]), ('traces', [{'class': 'grafica.traces:np', 'state': {}}])]:
+			with self.subTest(i=value):
+				np.savez(path, metadata=np.frombuffer(json.dumps({**metadata, key: value}).encode('utf-8'), dtype=np.uint8), **arrays)
+				with self.assertRaises(ValueError):
+					FigureSpec.load(path)
+				self.assertNotIn('antigravity', sys.modules) # Not imported.
+	
+	def test_load_npz(self):
+		path = Path(self.directory.name)/'arrays.npz'
+		arrays = {'a': np.arange(9.), 'b': np.zeros((0, 3)), 'c': np.asfortranarray(np.arange(6).reshape(2,3))}
+		np.savez(path, **arrays)
+		loaded = load_npz(path)
+		for name, array in arrays.items():
+			np.testing.assert_array_equal(loaded[name], array)
+		self.assertIsInstance(loaded['a'], np.memmap)
+		np.savez_compressed(path, **arrays)
+		np.testing.assert_array_equal(load_npz(path)['a'], arrays['a'])
+	
+if __name__ == '__main__':
+	unittest.main()